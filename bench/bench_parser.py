@@ -0,0 +1,97 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from researcher import extraction
+from fixtures import FIXTURE_DIR, fixture_names, load_fixture, load_stream_fixture, make_answer_html
+from legacy_parser import legacy_extract_elements
+from researcher.netcapture import answer_to_html, extract_stream_data
+from researcher.progress import SELECTORS, captured_result
+
+def quiet(fn, *args):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return fn(*args)
+
+def best_time(fn, *args, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        quiet(fn, *args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def available_backends():
+    return [b for b in extraction.BACKENDS if extraction.backend_available(b)]
+
+def check_fixtures(backends):
+    """Compares every backend (and the legacy parser) with the stored expected output."""
+    failures = 0
+    for name in fixture_names():
+        html = load_fixture(name)
+        with open(os.path.join(FIXTURE_DIR, name[:-5] + ".expected.json"), encoding="utf-8") as f:
+            expected = json.load(f)
+        results = {"legacy": quiet(legacy_extract_elements, html, SELECTORS["content_block"])}
+        for backend in backends:
+            results[backend] = quiet(extraction.extract_elements, html, SELECTORS["content_block"], backend)
+        for label, elements in results.items():
+            ok = elements == expected
+            failures += not ok
+            print(f"[{'✓' if ok else 'x'}] {name:<20} {label:<11} {len(elements)} elements")
+    return failures
+
+def stream_result(events, backend):
+    """What --capture network makes of a recorded stream: its elements and cited references."""
+    answer, references, _ = extract_stream_data(events)
+    result = captured_result({"html": answer_to_html(answer), "references": references})
+    return {"elements": extraction.extract_elements(result["html"], SELECTORS["content_block"], backend),
+            "references": result["references_dict"]}
+
+def check_stream_fixtures(backends):
+    """Compares what the network capture folds out of each recorded stream with the expected output."""
+    failures = 0
+    for name in fixture_names(".sse"):
+        events = load_stream_fixture(name)
+        with open(os.path.join(FIXTURE_DIR, name[:-4] + ".expected.json"), encoding="utf-8") as f:
+            expected = json.load(f)
+        for backend in backends:
+            result = quiet(stream_result, events, backend)
+            ok = result == expected
+            failures += not ok
+            print(f"[{'✓' if ok else 'x'}] {name:<20} {backend:<11} {len(result['elements'])} elements, "
+                  f"{len(result['references'])} references")
+    return failures
+
+def run_timings(backends, paragraphs, repeat):
+    corpora = [(name, load_fixture(name)) for name in fixture_names()]
+    corpora.append((f"generated-{paragraphs}p", make_answer_html(paragraphs, seed=3, references=paragraphs // 10)))
+    results = {}
+    for name, html in corpora:
+        legacy = best_time(legacy_extract_elements, html, SELECTORS["content_block"], repeat=repeat)
+        results[name] = {"bytes": len(html), "legacy": legacy}
+        print(f"\n{name} ({len(html) / 1024:.0f} KB)")
+        print(f"    {'legacy':<11} {legacy * 1000:9.2f} ms")
+        for backend in backends:
+            elapsed = best_time(extraction.extract_elements, html, SELECTORS["content_block"], backend, repeat=repeat)
+            results[name][backend] = elapsed
+            print(f"    {backend:<11} {elapsed * 1000:9.2f} ms  {legacy / elapsed:5.1f}x")
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check and time the content extraction backends.")
+    parser.add_argument("--paragraphs", type=int, default=3000, help="Size of the generated large answer.")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per measurement (best is reported).")
+    parser.add_argument("--json", type=str, help="Also write the timings to this JSON file.")
+    args = parser.parse_args()
+    backends = available_backends()
+    failures = check_fixtures(backends) + check_stream_fixtures(backends)
+    timings = run_timings(backends, args.paragraphs, args.repeat)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(timings, f, indent=2)
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,668 @@
+import argparse
+import asyncio
+import contextlib
+import fnmatch
+import functools
+import io
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from researcher import assets, exporters, extraction, metrics, progress, recording, scheduler
+from researcher.cache import ResultCache
+from researcher.checkpoint import Checkpoint
+from fixtures import FIXTURE_DIR, load_fixture, make_answer_html, make_answer_record
+from legacy_docx import legacy_write_docx
+from standin import StandinServer
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+# Answer size and streaming speed of the stand-in page for each end-to-end run. A
+# stream_fixture scenario replays a recorded text stream, read with its capture mode
+# and checked against the fixture's expected output.
+SCENARIOS = {
+    "small": {"paragraphs": 40, "references": 20, "chunk_ms": 20},
+    "large": {"paragraphs": 1000, "references": 300, "chunk_ms": 2},
+    "network": {"stream_fixture": "stream_delta.sse", "chunk_ms": 5, "capture": "network"},
+}
+
+# Waits scaled down so a run takes seconds; the idle window must still be longer
+# than the gap between streamed chunks.
+BENCH_TIMINGS = {
+    "content_appear_timeout": 30,
+    "idle_ms": 1500,
+    "slice_ms": 500,
+    "max_wait": 120,
+    "post_reload_timeout": 10,
+    "post_reload_idle_ms": 500,
+    "ready_timeout": 15,
+    "linger_ms": 0,
+}
+
+# Metrics that swing between runs on the same machine, matched by fnmatch pattern:
+# compared with a wider tolerance, or only reported (None). Loop lag is one
+# scheduling hiccup, RSS depends on the allocator, and the schedule simulation
+# draws its backoff from the unseeded global random.
+NOISY_METRICS = {
+    "*_max_loop_lag_ms": None,
+    "*_peak_rss_mb": 0.5,
+    "schedule_*": 1.0,
+}
+
+# Fewer runs per microbenchmark than this are too noisy to gate on: with --repeat 5
+# back-to-back runs on one machine already differ by more than the tolerance.
+GATE_MIN_REPEAT = 10
+
+PHASES = ["open_search_page", "enter_prompt", "wait_for_content", "extract_cited_references", "ensure_elements",
+          "write_outputs"]
+
+def quiet(fn, *args, **kwargs):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return fn(*args, **kwargs)
+
+def best_time(fn, *args, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        quiet(fn, *args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def peak_rss_mb(who=resource.RUSAGE_SELF):
+    # ru_maxrss is in KiB on Linux.
+    return resource.getrusage(who).ru_maxrss / 1024
+
+@contextlib.contextmanager
+def instrumented():
+    """Times the progress.py phases and counts protocol messages sent to the browser."""
+    from playwright._impl._connection import Connection
+
+    phases = {name: 0.0 for name in PHASES}
+    calls = {}
+    originals = {name: getattr(progress, name) for name in PHASES}
+
+    def timed(name, fn):
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await fn(*args, **kwargs)
+                finally:
+                    phases[name] += time.perf_counter() - start
+        else:
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    phases[name] += time.perf_counter() - start
+        return wrapper
+
+    send = Connection._send_message_to_server
+
+    def counting_send(self, object, method, *args, **kwargs):
+        calls[method] = calls.get(method, 0) + 1
+        return send(self, object, method, *args, **kwargs)
+
+    for name, fn in originals.items():
+        setattr(progress, name, timed(name, fn))
+    Connection._send_message_to_server = counting_send
+    try:
+        yield phases, calls
+    finally:
+        for name, fn in originals.items():
+            setattr(progress, name, fn)
+        Connection._send_message_to_server = send
+
+def run_scenario(name, spec, output_dir):
+    server = StandinServer(spec.get("paragraphs", 0), spec.get("references", 0), chunk_ms=spec["chunk_ms"],
+                           stream_fixture=spec.get("stream_fixture")).start()
+    expected = None
+    if spec.get("stream_fixture"):
+        with open(os.path.join(FIXTURE_DIR, spec["stream_fixture"][:-4] + ".expected.json"), encoding="utf-8") as f:
+            expected = json.load(f)
+    try:
+        return run_search(f"bench {name}", server.url, BENCH_TIMINGS, output_dir, spec.get("capture", "dom"), expected)
+    finally:
+        server.stop()
+
+def run_replay(replay_dir, speed, output_dir):
+    """Runs a recorded session (progress.py --record) offline as a regression fixture."""
+    recorded = recording.load_meta(replay_dir)
+    timings = dict(recorded["timings"])
+    recording.compress_timings(timings, speed)
+    progress.REPLAY["replay_dir"] = replay_dir
+    try:
+        return run_search(recorded["prompt"], recorded["site_url"], timings, output_dir)
+    finally:
+        progress.REPLAY["replay_dir"] = None
+
+def run_search(prompt_text, site_url, timings, output_dir, capture="dom", expected=None):
+    """Runs one search and measures it; with `expected`, also checks its elements and references."""
+    saved_url = progress.BOHRIUM_URL
+    saved_timings = dict(progress.TIMINGS)
+    progress.BOHRIUM_URL = site_url
+    progress.TIMINGS.update(timings)
+    progress.OUTPUT["output_dir"] = output_dir
+    try:
+        log = io.StringIO()
+        metrics.METRICS.reset()
+        with instrumented() as (phases, calls), contextlib.redirect_stdout(log):
+            start = time.perf_counter()
+            outcome = asyncio.run(progress.search_prompt(prompt_text, headless=True, capture=capture))
+            total = time.perf_counter() - start
+    finally:
+        progress.BOHRIUM_URL = saved_url
+        progress.TIMINGS.clear()
+        progress.TIMINGS.update(saved_timings)
+    filename = outcome["paths"][0] if outcome and outcome["paths"] else None
+    if not filename:
+        errors = [line for line in log.getvalue().splitlines() if line.startswith("[ERROR]")]
+        raise RuntimeError(errors[0] if errors else "no document produced")
+    if capture == "network" and "Answer captured from the network stream" not in log.getvalue():
+        raise RuntimeError("the answer stream was not recognized; the DOM fallback answered")
+    if expected is not None:
+        result = outcome["result"]
+        got = {"elements": progress.ensure_elements(result), "references": result["references_dict"]}
+        if got != expected:
+            raise RuntimeError(f"result differs from the expected output ({len(got['elements'])} elements, "
+                               f"{len(got['references'])} references; expected {len(expected['elements'])} and "
+                               f"{len(expected['references'])})")
+    return {
+        "total_ms": total * 1000,
+        "phases_ms": {phase: elapsed * 1000 for phase, elapsed in phases.items()},
+        "protocol_calls": sum(calls.values()),
+        "protocol_calls_by_method": dict(sorted(calls.items(), key=lambda item: -item[1])),
+        "peak_rss_mb": peak_rss_mb(),
+        "browser_peak_rss_mb": peak_rss_mb(resource.RUSAGE_CHILDREN),
+        "output_bytes": os.path.getsize(filename),
+        "snapshot_bytes": metrics.METRICS.counters.get("html_bytes", 0),
+    }
+
+def run_e2e(scenarios, output_dir, replays=(), replay_speed=20):
+    results = {}
+    runs = [(name, f"{name} {SCENARIOS[name]}", functools.partial(run_scenario, name, SCENARIOS[name], output_dir))
+            for name in scenarios]
+    runs.extend((f"replay_{os.path.basename(os.path.normpath(path))}", f"replay of {path}",
+                 functools.partial(run_replay, path, replay_speed, output_dir)) for path in replays)
+    for name, description, run in runs:
+        print(f"\n[*] End-to-end: {description}")
+        try:
+            result = run()
+        except Exception as e:
+            print(f"[ERROR] Scenario '{name}' failed: {e}")
+            continue
+        results[name] = result
+        print(f"    total           {result['total_ms']:9.0f} ms")
+        for phase, elapsed in result["phases_ms"].items():
+            print(f"    {phase:<26} {elapsed:9.0f} ms")
+        top = ", ".join(f"{method} {count}" for method, count in list(result["protocol_calls_by_method"].items())[:5])
+        print(f"    protocol calls  {result['protocol_calls']:9d} ({top})")
+        print(f"    snapshot HTML   {result['snapshot_bytes'] / 1024:9.0f} KB")
+        print(f"    peak RSS        {result['peak_rss_mb']:9.1f} MB (browser {result['browser_peak_rss_mb']:.1f} MB)")
+    return results
+
+def run_micro(paragraphs, repeat, output_dir):
+    """Parse and export timings for the stored fixtures and a generated large answer."""
+    results = {}
+    corpora = [("medium", load_fixture("medium.html")),
+               (f"generated-{paragraphs}p", make_answer_html(paragraphs, seed=3, references=paragraphs // 10))]
+    progress.OUTPUT["output_dir"] = output_dir
+    saved_formats = progress.OUTPUT["formats"]
+    print("\n[*] parse_and_save_content")
+    try:
+        for name, html in corpora:
+            cited = progress.extract_cited_reference_numbers(html)
+            for fmt in ("docx", "jsonl"):
+                progress.OUTPUT["formats"] = [fmt]
+                elapsed = best_time(progress.parse_and_save_content, html, name, {}, cited, repeat=repeat)
+                elements = len(quiet(extraction.extract_elements, html, progress.SELECTORS["content_block"]))
+                results[f"parse_save_{fmt}_{name}_ms"] = elapsed * 1000
+                print(f"    {name:<18} {fmt:<6} {elapsed * 1000:9.2f} ms  {len(html) / elapsed / 2**20:6.1f} MB/s  "
+                      f"{elements / elapsed:9.0f} elements/s")
+    finally:
+        progress.OUTPUT["formats"] = saved_formats
+
+    image_html = ('<div class="_img_1k32x_74"><img src="https://static.example.com/a.png" alt="a">'
+                  '<div class="_img-title_1k32x_79">Figure 1</div></div><em>Source: Journal</em>')
+    container = extraction.find_first(extraction.parse_html(image_html, "stream"), "div", extraction.IMAGE_CLASS)
+    calls = 20000
+    start = time.perf_counter()
+    for _ in range(calls):
+        extraction.extract_image_info(container)
+    per_call = (time.perf_counter() - start) / calls
+    results["extract_image_info_us"] = per_call * 1e6
+    print(f"\n[*] extract_image_info {per_call * 1e6:9.2f} us/call")
+    return results
+
+def run_images(count, delay_ms, parallel, output_dir):
+    """Downloads `count` stand-in figures one at a time, then concurrently, then from the
+    asset cache, and times a docx export that embeds them."""
+    results = {}
+    server = StandinServer(0, 0, image_delay_ms=delay_ms).prepare_images(count).start()
+    elements = [{"type": "image", "url": f"{server.url}fig/{n}.png", "caption": f"Figure {n}", "source": ""}
+                for n in range(1, count + 1)]
+    print(f"\n[*] fetch_images ({count} images, {delay_ms} ms server delay)")
+    try:
+        for name, max_parallel in (("serial", 1), ("concurrent", parallel)):
+            with tempfile.TemporaryDirectory() as store_dir:
+                store = assets.AssetStore(store_dir)
+                start = time.perf_counter()
+                attached = quiet(asyncio.run, assets.fetch_images(elements, store, max_parallel=max_parallel,
+                                                                  per_host=max_parallel))
+                elapsed = time.perf_counter() - start
+                if name == "concurrent":
+                    start = time.perf_counter()
+                    quiet(asyncio.run, assets.fetch_images(elements, store, max_parallel=max_parallel))
+                    results["images_cached_ms"] = (time.perf_counter() - start) * 1000
+                    progress.OUTPUT["output_dir"] = output_dir
+                    saved_formats = progress.OUTPUT["formats"]
+                    progress.OUTPUT["formats"] = ["docx"]
+                    try:
+                        start = time.perf_counter()
+                        quiet(progress.parse_and_save_content, "", "images", {}, [], elements)
+                        results["images_embed_docx_ms"] = (time.perf_counter() - start) * 1000
+                    finally:
+                        progress.OUTPUT["formats"] = saved_formats
+                store.close()
+            results[f"images_{name}_ms"] = elapsed * 1000
+            print(f"    {name:<18} {elapsed * 1000:9.0f} ms  ({attached}/{count} attached, {max_parallel} parallel)")
+    finally:
+        server.stop()
+    print(f"    {'asset cache':<18} {results['images_cached_ms']:9.2f} ms")
+    print(f"    {'docx embed':<18} {results['images_embed_docx_ms']:9.0f} ms")
+    return results
+
+def run_docx_scaling(paragraphs, table_rows, legacy_rows, repeat, output_dir):
+    """Times write_docx on synthetic answers of growing size (a 200-row table per 1000 paragraphs,
+    ragged rows included) and on single tables against the python-docx cell-by-cell writer."""
+    results = {}
+    path = os.path.join(output_dir, "scaling.docx")
+    print(f"\n[*] write_docx scaling (up to {paragraphs} paragraphs, {table_rows}-row tables)")
+    per_element = []
+    for n in (paragraphs // 8, paragraphs // 4, paragraphs // 2, paragraphs):
+        record = make_answer_record(n, table_rows, seed=7, ragged=True)
+        size = len(record["elements"]) + len(record["references"]) + sum(
+            len(e["rows"]) for e in record["elements"] if e["type"] == "table")
+        elapsed = best_time(exporters.write_docx, record, path, repeat=repeat)
+        per_element.append(elapsed / size)
+        results[f"docx_bulk_{n}p_ms"] = elapsed * 1000
+        print(f"    {n:>6} paragraphs  {elapsed * 1000:9.0f} ms  {elapsed / size * 1e6:7.1f} us per paragraph/row")
+    results["docx_bulk_scaling_ratio"] = per_element[-1] / per_element[0]
+    print(f"    cost per paragraph/row, largest vs smallest: {results['docx_bulk_scaling_ratio']:.2f}x (1.0 is linear)")
+
+    print(f"\n[*] write_docx single table (6 columns, legacy up to {legacy_rows} rows)")
+    rows = 25
+    while rows <= table_rows:
+        record = make_answer_record(0, rows, seed=7, tables=1)
+        elapsed = best_time(exporters.write_docx, record, path, repeat=repeat)
+        results[f"docx_table_{rows}r_ms"] = elapsed * 1000
+        line = f"    {rows:>6} rows  bulk {elapsed * 1000:9.1f} ms"
+        if rows <= legacy_rows:
+            legacy = best_time(legacy_write_docx, record, path, repeat=1)
+            results[f"docx_legacy_table_{rows}r_ms"] = legacy * 1000
+            line += f"  legacy {legacy * 1000:9.0f} ms ({legacy / elapsed:5.0f}x)"
+        print(line)
+        rows *= 2
+    return results
+
+async def export_with_lag_probe(exporter, results_to_export):
+    """Exports results concurrently while a 10 ms ticker measures how long the event loop stalls."""
+    lag = {"max": 0.0}
+    done = asyncio.Event()
+
+    async def ticker():
+        while not done.is_set():
+            start = time.perf_counter()
+            await asyncio.sleep(0.01)
+            lag["max"] = max(lag["max"], time.perf_counter() - start - 0.01)
+
+    async def export(index, result):
+        # Pages finish at different times; a short stagger keeps the hand-offs realistic.
+        await asyncio.sleep(index * 0.01)
+        return await progress.export_result(result, f"prompt {index}", exporter)
+
+    probe = asyncio.create_task(ticker())
+    start = time.perf_counter()
+    await asyncio.gather(*(export(i, result) for i, result in enumerate(results_to_export)))
+    elapsed = time.perf_counter() - start
+    done.set()
+    await probe
+    return elapsed, lag["max"]
+
+def run_export_offload(prompts, paragraphs, workers, output_dir):
+    """Exports `prompts` large answers on the event loop, then through the process pool."""
+    results = {}
+    html = make_answer_html(paragraphs, seed=5, references=paragraphs // 10)
+    batch = [{"html": html, "cited_numbers": progress.extract_cited_reference_numbers(html), "references_dict": {}}
+             for _ in range(prompts)]
+    print(f"\n[*] Export offload ({prompts} x {paragraphs} paragraphs, docx)")
+    for name, count in (("loop", 0), ("pool", workers)):
+        level = progress.log.level
+        # Workers copy the console level when they start; keep their "[✓] Document saved" lines out.
+        progress.log.setLevel("WARNING")
+        exporter = exporters.ExportSession(["docx"], output_dir, count)
+        try:
+            if count:
+                # Start the workers outside the timed run; spawning them costs an interpreter start each.
+                list(exporter.pool.map(abs, range(count)))
+            elapsed, max_lag = quiet(asyncio.run, export_with_lag_probe(exporter, batch))
+        finally:
+            exporter.close()
+            progress.log.setLevel(level)
+        results[f"export_{name}_ms"] = elapsed * 1000
+        results[f"export_{name}_max_loop_lag_ms"] = max_lag * 1000
+        print(f"    {name:<6} ({count} workers) {elapsed * 1000:9.0f} ms  max event loop stall {max_lag * 1000:7.1f} ms")
+    return results
+
+class SimulatedSite:
+    """A backend with `capacity` concurrent query slots whose latency grows with load. Queries
+    beyond capacity are rejected (a navigate failure with Retry-After), error_rate of the others
+    fail in a random later phase, and from outage_at for `outage` seconds nearly all of them fail."""
+
+    def __init__(self, capacity, latency, error_rate, outage_at, outage, seed=0):
+        self.capacity = capacity
+        self.latency = latency
+        self.error_rate = error_rate
+        self.outage_at = outage_at
+        self.outage = outage
+        self.random = random.Random(seed)
+        self.active = 0
+        self.start = time.perf_counter()
+
+    async def query(self, prompt_text):
+        now = time.perf_counter() - self.start
+        if self.outage_at <= now < self.outage_at + self.outage and self.random.random() < 0.95:
+            await asyncio.sleep(self.latency * 0.05)
+            raise scheduler.PhaseError("navigate", "HTTP 503")
+        if self.active >= self.capacity:
+            await asyncio.sleep(self.latency * 0.05)
+            raise scheduler.PhaseError("navigate", "HTTP 429", retry_after=self.latency)
+        self.active += 1
+        try:
+            await asyncio.sleep(self.latency * (0.5 + self.active / self.capacity) * self.random.uniform(0.8, 1.2))
+            if self.random.random() < self.error_rate:
+                raise scheduler.PhaseError(self.random.choice(["submit", "wait", "references"]), "simulated failure")
+            return prompt_text
+        finally:
+            self.active -= 1
+
+def scaled_scheduler(mode, concurrency, scale):
+    """The batch scheduler with its waits divided by `scale`, or what batch mode did without it:
+    fixed concurrency with no retries ("fixed"), or retried at once with no backoff ("naive_retry")."""
+    never_open = scheduler.CircuitBreaker(threshold=2)
+    if mode == "fixed":
+        policy = {phase: {"attempts": 1, "base": 0, "cap": 0} for phase in scheduler.PHASES}
+        return scheduler.Scheduler(0, 1, concurrency, policy=policy, breaker=never_open, adaptive=False)
+    if mode == "naive_retry":
+        policy = {phase: {"attempts": 4, "base": 0, "cap": 0} for phase in scheduler.PHASES}
+        return scheduler.Scheduler(0, 1, concurrency, policy=policy, breaker=never_open, adaptive=False)
+    policy = {phase: {**rule, "base": rule["base"] / scale, "cap": rule["cap"] / scale}
+              for phase, rule in scheduler.RETRY_POLICY.items()}
+    config = progress.SCHEDULE
+    breaker = scheduler.CircuitBreaker(config["breaker_threshold"], config["breaker_window"], config["breaker_min_samples"],
+                                       config["breaker_cooldown"] / scale, 900 / scale)
+    return scheduler.Scheduler(0, 1, concurrency, config["min_concurrency"], policy, breaker)
+
+async def simulate_batch(mode, prompts, concurrency, capacity, latency, error_rate, scale):
+    site = SimulatedSite(capacity, latency, error_rate, outage_at=latency * 4, outage=latency * 6)
+    sched = scaled_scheduler(mode, concurrency, scale)
+
+    async def run_one(prompt_text):
+        try:
+            await sched.run(prompt_text, site.query)
+        except scheduler.PhaseError:
+            pass
+
+    start = time.perf_counter()
+    await asyncio.gather(*(run_one(f"prompt {i}") for i in range(prompts)))
+    return time.perf_counter() - start, sched
+
+def run_scheduler_sim(prompts, concurrency, output_dir):
+    """Batch scheduling against a simulated site (no browser) that is overloaded by `concurrency`
+    pages, fails some queries and has an outage, with every wait compressed 300x."""
+    results = {}
+    capacity, latency, error_rate, scale = max(1, concurrency // 2), 0.2, 0.1, 300
+    print(f"\n[*] Batch scheduling ({prompts} prompts, {concurrency} pages, site capacity {capacity}, "
+          f"{error_rate:.0%} failures, simulated)")
+    level = progress.log.level
+    progress.log.setLevel("ERROR")
+    try:
+        for mode in ("fixed", "naive_retry", "adaptive"):
+            elapsed, sched = asyncio.run(simulate_batch(mode, prompts, concurrency, capacity, latency, error_rate, scale))
+            stats = sched.stats
+            succeeded = max(1, stats["succeeded"])
+            results[f"schedule_{mode}_ms_per_success"] = elapsed * 1000 / succeeded
+            results[f"schedule_{mode}_attempts_per_success"] = stats["attempts"] / succeeded
+            results[f"schedule_{mode}_failed"] = stats["failed"]
+            # A batch that fails fast also finishes fast, so compare successes and attempts, not elapsed time.
+            print(f"    {mode:<12} {stats['succeeded']:4d}/{prompts} succeeded in {elapsed:5.1f}s, "
+                  f"{stats['attempts'] / succeeded:5.2f} attempts per success, circuit opened {sched.breaker.opens}x, "
+                  f"final concurrency {int(sched.limit.limit)}")
+    finally:
+        progress.log.setLevel(level)
+    return results
+
+def run_throttled(prompts, concurrency, output_dir):
+    """Batch mode end to end against a stand-in that rejects loads beyond its capacity and fails
+    some page loads and answers."""
+    server = StandinServer(40, 20, chunk_ms=20, page_error_rate=0.15, answer_error_rate=0.1,
+                           capacity=max(1, concurrency // 2), load_delay_ms=300, jitter_ms=300).start()
+    saved_url = progress.BOHRIUM_URL
+    saved_timings = dict(progress.TIMINGS)
+    saved_policy = dict(scheduler.RETRY_POLICY)
+    progress.BOHRIUM_URL = server.url
+    progress.TIMINGS.update(BENCH_TIMINGS, content_appear_timeout=10)
+    progress.OUTPUT["output_dir"] = output_dir
+    # The stand-in answers in seconds, so its retries wait seconds rather than minutes.
+    scheduler.RETRY_POLICY.update({phase: {**rule, "base": rule["base"] / 20, "cap": rule["cap"] / 20}
+                                   for phase, rule in saved_policy.items()})
+    print(f"\n[*] Throttled batch ({prompts} prompts, {concurrency} pages, stand-in capacity {max(1, concurrency // 2)})")
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            summary = asyncio.run(progress.run_batch([f"bench throttled {i}" for i in range(prompts)], True, concurrency,
+                                                     60, cache=None))
+            elapsed = time.perf_counter() - start
+    finally:
+        server.stop()
+        progress.BOHRIUM_URL = saved_url
+        progress.TIMINGS.clear()
+        progress.TIMINGS.update(saved_timings)
+        scheduler.RETRY_POLICY.update(saved_policy)
+    succeeded = len(summary["succeeded"])
+    stats = summary.get("scheduler", {"attempts": 0})
+    print(f"    {succeeded}/{prompts} succeeded in {elapsed:.1f}s, {stats['attempts']} attempts; stand-in saw "
+          f"{server.httpd.stats}")
+    if not succeeded:
+        raise RuntimeError("no prompt succeeded")
+    return {"throttled_ms_per_success": elapsed * 1000 / succeeded,
+            "throttled_attempts_per_success": stats["attempts"] / succeeded}
+
+def time_command(args, repeat):
+    """Best wall time of a fresh interpreter running `args` from the repository root."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        completed = subprocess.run([sys.executable, *args], cwd=REPO_DIR, capture_output=True, text=True)
+        best = min(best, time.perf_counter() - start)
+        if completed.returncode:
+            raise RuntimeError(f"{' '.join(args)} failed: {completed.stderr.strip().splitlines()[-1:]}")
+    return best
+
+def run_startup(repeat, output_dir):
+    """Interpreter start plus imports for the paths that should not load Playwright, python-docx or
+    BeautifulSoup, next to the cost of those imports themselves, and an in-process cache hit."""
+    results = {}
+    prompt_text = "bench startup"
+    html = make_answer_html(300, seed=11, references=30)
+    cache_path = os.path.join(output_dir, "startup-cache.sqlite3")
+    runs_dir = os.path.join(output_dir, "startup-runs")
+    cached = {"html": html, "cited_numbers": progress.extract_cited_reference_numbers(html), "references_dict": {}}
+    store = ResultCache(cache_path)
+    store.put(prompt_text, cached)
+    store.close()
+    Checkpoint.for_prompt(runs_dir, prompt_text).save_snapshot(prompt_text, html, cached["cited_numbers"])
+    offline = ["--no-refstore", "--selector-cache", "", "--output-dir", os.path.join(output_dir, "startup-out")]
+    commands = [
+        ("python", ["-c", "pass"]),
+        ("import_researcher", ["-c", "import researcher"]),
+        ("import_progress", ["-c", "import researcher.progress"]),
+        ("eager_imports", ["-c", "import playwright.async_api, docx, bs4"]),
+        ("cli_help", ["-m", "researcher", "--help"]),
+        ("search_help", ["-m", "researcher", "search", "--help"]),
+        ("cache_hit_jsonl", ["-m", "researcher", prompt_text, "--cache-path", cache_path, "--no-checkpoint",
+                             "--format", "jsonl", *offline]),
+        ("cache_hit_docx", ["-m", "researcher", prompt_text, "--cache-path", cache_path, "--no-checkpoint", *offline]),
+        ("reparse_jsonl", ["-m", "researcher", "--reparse", "--runs-dir", runs_dir, "--no-cache", "--format", "jsonl",
+                           *offline]),
+    ]
+    print(f"\n[*] Startup (fresh interpreter, best of {repeat})")
+    for name, args in commands:
+        elapsed = time_command(args, repeat)
+        results[f"startup_{name}_ms"] = elapsed * 1000
+        print(f"    {name:<18} {elapsed * 1000:9.0f} ms")
+    probe = ("import sys, researcher.progress; "
+             "print(','.join(m for m in ('playwright', 'docx', 'bs4', 'lxml', 'pyarrow') if m in sys.modules))")
+    loaded = subprocess.run([sys.executable, "-c", probe], cwd=REPO_DIR, capture_output=True, text=True).stdout.strip()
+    print(f"    heavy modules loaded by 'import researcher.progress': {loaded or 'none'}")
+
+    import researcher
+
+    options = researcher.Options(cache_path=cache_path, refstore=False, checkpoint=False, formats=["jsonl"],
+                                 output_dir=os.path.join(output_dir, "startup-out"), selector_cache="")
+    quiet(researcher.search_sync, prompt_text, options)
+    elapsed = best_time(researcher.search_sync, prompt_text, options, repeat=repeat)
+    results["startup_inprocess_cache_hit_ms"] = elapsed * 1000
+    print(f"    {'in-process hit':<18} {elapsed * 1000:9.1f} ms  (researcher.search_sync, jsonl)")
+    return results
+
+def flatten(results):
+    """Metrics compared with the baseline; all of them are lower-is-better."""
+    flat = dict(results.get("micro", {}))
+    flat.update(results.get("images", {}))
+    flat.update(results.get("offload", {}))
+    flat.update(results.get("docx", {}))
+    flat.update(results.get("startup", {}))
+    flat.update(results.get("schedule", {}))
+    for name, result in results.get("e2e", {}).items():
+        flat[f"e2e_{name}_total_ms"] = result["total_ms"]
+        flat[f"e2e_{name}_protocol_calls"] = result["protocol_calls"]
+        flat[f"e2e_{name}_snapshot_bytes"] = result["snapshot_bytes"]
+        flat[f"e2e_{name}_peak_rss_mb"] = result["peak_rss_mb"]
+        flat[f"e2e_{name}_browser_peak_rss_mb"] = result["browser_peak_rss_mb"]
+        for phase, elapsed in result["phases_ms"].items():
+            flat[f"e2e_{name}_{phase}_ms"] = elapsed
+    return flat
+
+def metric_tolerance(name, tolerance):
+    for pattern, noisy in NOISY_METRICS.items():
+        if fnmatch.fnmatch(name, pattern):
+            return noisy
+    return tolerance
+
+def compare(flat, baseline, tolerance):
+    regressions = 0
+    missing = []
+    print(f"\n[*] Compared with baseline (tolerance {tolerance:.0%}, noisy metrics excepted):")
+    for name, value in flat.items():
+        if name not in baseline or not baseline[name]:
+            missing.append(name)
+            continue
+        ratio = value / baseline[name]
+        allowed = metric_tolerance(name, tolerance)
+        if allowed is None:
+            print(f"    [ ] {name:<48} {baseline[name]:10.2f} -> {value:10.2f} ({ratio:5.2f}x, not gated)")
+            continue
+        regressed = ratio > 1 + allowed
+        regressions += regressed
+        print(f"    [{'!' if regressed else '✓'}] {name:<48} {baseline[name]:10.2f} -> {value:10.2f} ({ratio:5.2f}x)")
+    if missing:
+        print(f"\n[!] {len(missing)} metrics have no baseline and were not compared: {', '.join(missing)}")
+        print("    Record them with --save-baseline on a machine that runs the measured part (e2e needs a browser).")
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the search flow against a local stand-in and the parser in isolation.")
+    parser.add_argument("--scenario", choices=list(SCENARIOS), action="append", help="End-to-end scenarios to run (default: all).")
+    parser.add_argument("--replay", type=str, action="append", default=[], metavar="DIR",
+                        help="Also run this recording (progress.py --record DIR) end to end, offline.")
+    parser.add_argument("--replay-speed", type=float, default=20, help="Time compression for --replay runs.")
+    parser.add_argument("--skip-browser", action="store_true", help="Only run the parser microbenchmarks.")
+    parser.add_argument("--paragraphs", type=int, default=3000, help="Size of the generated answer for the microbenchmarks.")
+    parser.add_argument("--repeat", type=int, default=GATE_MIN_REPEAT,
+                        help=f"Runs per microbenchmark (best is reported); below {GATE_MIN_REPEAT} the baseline "
+                             "comparison does not set the exit status.")
+    parser.add_argument("--startup-repeat", type=int, default=5,
+                        help="Fresh interpreters per startup measurement (0 skips them).")
+    parser.add_argument("--docx-paragraphs", type=int, default=10000,
+                        help="Largest answer in the docx scaling benchmark (0 skips it).")
+    parser.add_argument("--docx-table-rows", type=int, default=200, help="Rows per table in the docx scaling benchmark.")
+    parser.add_argument("--docx-legacy-rows", type=int, default=50,
+                        help="Largest table also written cell by cell through python-docx (quadratic; 0 skips it).")
+    parser.add_argument("--images", type=int, default=32, help="Figures downloaded in the image fetch benchmark (0 skips it).")
+    parser.add_argument("--image-delay-ms", type=int, default=50, help="Stand-in latency per figure.")
+    parser.add_argument("--export-workers", type=int, default=min(4, os.cpu_count() or 1),
+                        help="Worker processes in the export offload benchmark (0 skips it).")
+    parser.add_argument("--schedule-prompts", type=int, default=200,
+                        help="Prompts in the simulated batch scheduling benchmark (0 skips it).")
+    parser.add_argument("--throttled-prompts", type=int, default=8,
+                        help="Prompts run in batch mode against the fault-injecting stand-in (0 skips it).")
+    parser.add_argument("--baseline", type=str, default=BASELINE_PATH, help="Baseline JSON to compare with.")
+    parser.add_argument("--save-baseline", action="store_true", help="Store this run as the new baseline.")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown before a metric counts as regressed.")
+    parser.add_argument("--json", type=str, help="Also write the full results to this JSON file.")
+    args = parser.parse_args()
+    results = {}
+    with tempfile.TemporaryDirectory() as output_dir:
+        # Checkpoints and learned selectors stay in the temporary directory, not the user's.
+        progress.OUTPUT["runs_dir"] = os.path.join(output_dir, "runs")
+        progress.RESOLVER.path = os.path.join(output_dir, "selectors.json")
+        if not args.skip_browser:
+            scenarios = args.scenario or ([] if args.replay else list(SCENARIOS))
+            results["e2e"] = run_e2e(scenarios, output_dir, args.replay, args.replay_speed)
+            if args.throttled_prompts:
+                try:
+                    results["schedule"] = run_throttled(args.throttled_prompts, 4, output_dir)
+                except Exception as e:
+                    print(f"[ERROR] Throttled batch failed: {e}")
+        results["micro"] = run_micro(args.paragraphs, args.repeat, output_dir)
+        if args.schedule_prompts:
+            results.setdefault("schedule", {}).update(run_scheduler_sim(args.schedule_prompts, 8, output_dir))
+        if args.startup_repeat:
+            results["startup"] = run_startup(args.startup_repeat, output_dir)
+        if args.docx_paragraphs:
+            results["docx"] = run_docx_scaling(args.docx_paragraphs, args.docx_table_rows, args.docx_legacy_rows,
+                                               min(args.repeat, 3), output_dir)
+        if args.export_workers:
+            results["offload"] = run_export_offload(8, 500, args.export_workers, output_dir)
+        if args.images:
+            results["images"] = run_images(args.images, args.image_delay_ms, progress.IMAGES["max_parallel"], output_dir)
+    flat = flatten(results)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(flat, f, indent=2, sort_keys=True)
+        print(f"\n[✓] Baseline saved to {args.baseline}")
+        sys.exit(0)
+    if not os.path.exists(args.baseline):
+        print(f"\n[!] No baseline at {args.baseline}; run with --save-baseline to create one.")
+        sys.exit(0)
+    with open(args.baseline, encoding="utf-8") as f:
+        regressions = compare(flat, json.load(f), args.tolerance)
+    if regressions and args.repeat < GATE_MIN_REPEAT:
+        print(f"\n[!] --repeat {args.repeat} is below {GATE_MIN_REPEAT}: too noisy to gate on, not failing.")
+        sys.exit(0)
+    sys.exit(1 if regressions else 0)
@@ -0,0 +1,159 @@
+import json
+import os
+import random
+from html import escape
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+IMAGE_BASE = "https://static.example.com/fig/"
+
+WORDS = ("model data learning students research analysis results method impact education network "
+         "performance evidence system training outcome approach framework study review").split()
+
+def _sentence(rng, cite_max):
+    words = " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 24)))
+    cites = "".join(f"[{rng.randint(1, cite_max)}]" for _ in range(rng.randint(0, 3)))
+    return f"{words.capitalize()}{cites}."
+
+def _image(rng, n, inline, image_base):
+    caption = f'<div class="_img-title_1k32x_79">Figure {n}: {escape(_sentence(rng, 1)[:-4])}</div>' if rng.random() < 0.8 else ""
+    alt = f' alt="figure {n}"' if rng.random() < 0.5 else ""
+    div = f'<div class="_img_1k32x_74"><img src="{image_base}{n}.png"{alt}>{caption}</div>'
+    source = f"<em>Source: {escape(rng.choice(WORDS).title())} Journal</em>" if rng.random() < 0.7 else ""
+    if inline:
+        return f"<p>{escape(_sentence(rng, 1))}{div}{source}</p>"
+    return div + source
+
+def _table(rng):
+    cols = rng.randint(2, 5)
+    head = "".join(f"<th>{rng.choice(WORDS).title()}</th>" for _ in range(cols))
+    body = "".join("<tr>" + "".join(f"<td>{rng.randint(0, 999)}</td>" for _ in range(cols)) + "</tr>"
+                   for _ in range(rng.randint(2, 12)))
+    return f"<table><thead><tr>{head}</tr></thead><tbody>{body}</tbody></table>"
+
+def reference_record(index):
+    return {"index": index, "title": f"Paper title number {index + 1}", "authors": [f"Author {index}"],
+            "date": "2021-01-01", "journal": f"Journal {index}"}
+
+def _reference(index):
+    ref = reference_record(index)
+    return (f'<div data-index="{index}" data-item-index="{index}"><div class="_container_q86iu_1">'
+            f'<div class="_index_q86iu_12">{index + 1}.</div>'
+            f'<div class="_title-paragraph_1doxh_4"><p>{ref["title"]}</p></div>'
+            f'<div class="_author_name_1fn6n_38">{ref["authors"][0]}</div>'
+            f'<div class="_journal-date_q86iu_51">{ref["date"]}</div><span class="_name_niu8h_11">{ref["journal"]}</span>'
+            f'</div></div>')
+
+def make_answer_parts(paragraphs=40, seed=0, references=20, image_base=IMAGE_BASE):
+    """The answer body as top-level HTML fragments, in the order they would stream in."""
+    rng = random.Random(seed)
+    cite_max = max(1, references)
+    parts = []
+    images = 0
+    for i in range(paragraphs):
+        roll = rng.random()
+        if roll < 0.55:
+            part = f"<p>{escape(' '.join(_sentence(rng, cite_max) for _ in range(rng.randint(1, 4))))}</p>"
+        elif roll < 0.65:
+            images += 1
+            part = _image(rng, images, inline=True, image_base=image_base)
+        elif roll < 0.72:
+            images += 1
+            part = f"<p>{escape(_sentence(rng, cite_max))}</p>" + _image(rng, images, inline=False, image_base=image_base)
+        elif roll < 0.85:
+            tag = rng.choice(["ul", "ol"])
+            items = "".join(f"<li>{escape(_sentence(rng, cite_max))}</li>" for _ in range(rng.randint(2, 6)))
+            part = f"<{tag}>{items}</{tag}>"
+        elif roll < 0.92:
+            part = _table(rng)
+        elif roll < 0.95:
+            part = f"<h3>{escape(_sentence(rng, 1))}</h3>"
+        elif roll < 0.97:
+            part = f'<p style="display: none">{escape(_sentence(rng, 1))}</p>'
+        else:
+            # Repeated paragraphs are de-duplicated by the parser.
+            part = f"<p>{escape(_sentence(random.Random(seed), 1))}</p>"
+        parts.append(part + ("\n" if rng.random() < 0.5 else ""))
+    return parts
+
+def make_answer_html(paragraphs=40, seed=0, references=20):
+    """Builds a Bohrium-like answer snapshot: one content block plus a reference list."""
+    parts = ['<div class="_content_1k32x_12">']
+    parts.extend(make_answer_parts(paragraphs, seed, references))
+    parts.append("</div>")
+    parts.append('<div data-testid="virtuoso-item-list">')
+    parts.extend(_reference(i) for i in range(references))
+    parts.append("</div>")
+    return "".join(parts)
+
+def make_answer_markdown(paragraphs=40, seed=0, references=20):
+    """The answer as the markdown-ish text a network stream carries instead of HTML."""
+    rng = random.Random(seed)
+    cite_max = max(1, references)
+    lines = []
+    for _ in range(paragraphs):
+        roll = rng.random()
+        if roll < 0.6:
+            lines.append(" ".join(_sentence(rng, cite_max) for _ in range(rng.randint(1, 4))))
+        elif roll < 0.8:
+            lines.extend(f"- {_sentence(rng, cite_max)}" for _ in range(rng.randint(2, 5)))
+        elif roll < 0.9:
+            cols = rng.randint(2, 4)
+            lines.append("| " + " | ".join(rng.choice(WORDS).title() for _ in range(cols)) + " |")
+            lines.append("|" + "---|" * cols)
+            lines.extend("| " + " | ".join(str(rng.randint(0, 999)) for _ in range(cols)) + " |"
+                         for _ in range(rng.randint(2, 6)))
+        else:
+            lines.append(f"## {_sentence(rng, 1)[:-4]}")
+        lines.append("")
+    return "\n".join(lines)
+
+def make_answer_stream(paragraphs=40, seed=0, references=20, mode="delta"):
+    """The events of an answer stream: text chunks sent as deltas ({"delta": ...}) or as the
+    whole answer so far ({"answer": ...}), then the reference list and the end marker.
+    Delta streams number their references from 0 ("index"), resend streams from 1 ("number")."""
+    rng = random.Random(seed)
+    text = make_answer_markdown(paragraphs, seed, references)
+    events = []
+    end = 0
+    # Resends repeat the answer so far, so they come in fewer, larger chunks.
+    scale = 1 if mode == "delta" else 8
+    while end < len(text):
+        start, end = end, min(len(text), end + rng.randint(8, 80) * scale)
+        events.append({"delta": text[start:end]} if mode == "delta" else {"answer": text[:end]})
+    refs = [reference_record(i) for i in range(references)]
+    if mode != "delta":
+        refs = [{"number": ref.pop("index") + 1, **ref} for ref in refs]
+    events.append({"references": refs, "done": True})
+    return events
+
+def make_answer_record(paragraphs=10000, table_rows=200, seed=0, tables=None, ragged=False):
+    """An exported record without going through the parser: `paragraphs` paragraphs and list items,
+    `tables` six-column tables of `table_rows` rows spread among them (default one per 1000
+    paragraphs, at least one) and a reference per 10 paragraphs."""
+    rng = random.Random(seed)
+    elements = []
+    for _ in range(paragraphs):
+        kind = "list_item" if rng.random() < 0.2 else "paragraph"
+        elements.append({"type": kind, "text": " ".join(_sentence(rng, 50) for _ in range(rng.randint(1, 3)))})
+    tables = max(1, paragraphs // 1000) if tables is None else tables
+    for n in range(tables, 0, -1):
+        rows = [[rng.choice(WORDS).title() for _ in range(6)]]
+        rows.extend([str(rng.randint(0, 99999)) for _ in range(rng.randint(3, 6) if ragged else 6)]
+                    for _ in range(table_rows - 1))
+        elements.insert(paragraphs * n // tables, {"type": "table", "rows": rows})
+    references = [{"number": n + 1, "text": f"Author {n}. 2021-01-01. Paper title number {n + 1}. Journal {n}."}
+                  for n in range(paragraphs // 10)]
+    return {"prompt": "Synthetic answer", "created_at": "", "elements": elements,
+            "cited_numbers": [ref["number"] for ref in references], "references": references}
+
+def load_fixture(name):
+    with open(os.path.join(FIXTURE_DIR, name), encoding="utf-8") as f:
+        return f.read()
+
+def fixture_names(extension=".html"):
+    return sorted(name for name in os.listdir(FIXTURE_DIR) if name.endswith(extension))
+
+def load_stream_fixture(name):
+    """The events of a recorded answer stream (one SSE "data:" line each)."""
+    return [json.loads(line[5:]) for line in load_fixture(name).splitlines() if line.startswith("data:")]
@@ -0,0 +1,28 @@
+# The docx writer as it was before exporters.BodyWriter: every element goes
+# through the python-docx object API and every table cell through Table.cell().
+# Kept only as the baseline for the docx scaling benchmark in bench_suite.py.
+from docx import Document
+
+def legacy_add_element(doc, element):
+    kind = element["type"]
+    if kind == "paragraph":
+        doc.add_paragraph(element["text"])
+    elif kind == "list_item":
+        doc.add_paragraph(f"- {element['text']}")
+    elif kind == "table":
+        table_data = element["rows"]
+        t = doc.add_table(rows=len(table_data), cols=len(table_data[0]))
+        for row_idx, row in enumerate(table_data):
+            for col_idx, cell_text in enumerate(row):
+                t.cell(row_idx, col_idx).text = cell_text
+
+def legacy_write_docx(record, path):
+    doc = Document()
+    doc.add_heading(record["prompt"], level=1)
+    for element in record["elements"]:
+        legacy_add_element(doc, element)
+    if record["references"]:
+        doc.add_heading("References", level=2)
+        for ref in record["references"]:
+            doc.add_paragraph(f"[{ref['number']}] {ref['text']}")
+    doc.save(path)
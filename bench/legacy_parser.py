@@ -0,0 +1,126 @@
+# BeautifulSoup extraction as it was before the single-pass engine in
+# extraction.py. Kept only as the baseline for bench_parser.py; it returns the
+# same element dicts instead of writing a document.
+from bs4 import BeautifulSoup
+
+def is_visible_bs4(element):
+    style = element.get('style', '')
+    return 'display: none' not in style and 'visibility: hidden' not in style
+
+def extract_paragraph(child):
+    p_text = child.get_text(strip=True)
+    return p_text if p_text else None
+
+def extract_list(child):
+    items = []
+    for li in child.find_all("li", recursive=False):
+        li_text = li.get_text(strip=True)
+        if li_text:
+            items.append(li_text)
+    return items
+
+def extract_table(child):
+    rows = child.find_all("tr")
+    table_data = []
+    for row in rows:
+        cells = row.find_all(["td", "th"])
+        table_data.append([cell.get_text(strip=True) for cell in cells])
+    return table_data
+
+def extract_image_info(img_container):
+    """Extracts image information from container with proper handling of nested structures."""
+    images = []
+    # Handle direct img tags
+    for img in img_container.find_all("img", recursive=False):
+        img_url = img.get("src", "")
+        if not img_url:
+            continue
+        caption = ""
+        caption_div = img_container.find("div", class_="_img-title_1k32x_79")
+        if caption_div:
+            caption = caption_div.get_text(strip=True)
+        if not caption:
+            caption = img.get("alt", "")
+        source = ""
+        em_tag = img_container.find_next_sibling("em")
+        if not em_tag and img_container.parent:
+            em_tag = img_container.parent.find("em")
+        if em_tag:
+            source = em_tag.get_text(strip=True)
+        images.append((img_url, caption, source))
+    # Handle nested image containers
+    for nested in img_container.find_all("div", class_="_img_1k32x_74"):
+        img = nested.find("img")
+        if not img:
+            continue
+        img_url = img.get("src", "")
+        if not img_url:
+            continue
+        caption = ""
+        caption_div = nested.find("div", class_="_img-title_1k32x_79")
+        if caption_div:
+            caption = caption_div.get_text(strip=True)
+        if not caption:
+            caption = img.get("alt", "")
+        source = ""
+        em_tag = nested.find_next_sibling("em")
+        if not em_tag and nested.parent:
+            em_tag = nested.parent.find("em")
+        if em_tag:
+            source = em_tag.get_text(strip=True)
+        images.append((img_url, caption, source))
+    return images
+
+def select_root_blocks(soup, selectors):
+    """Returns the elements matching any selector, skipping those nested inside another match."""
+    matches = soup.select(", ".join(selectors))
+    matched_ids = {id(m) for m in matches}
+    return [m for m in matches if not any(id(parent) in matched_ids for parent in m.parents)]
+
+def legacy_extract_elements(html_content, selectors):
+    soup = BeautifulSoup(html_content, 'html.parser')
+    elements = []
+    inserted_content = set()
+
+    def add_images(images):
+        for img_url, caption, source in images:
+            if img_url and img_url not in inserted_content:
+                elements.append({"type": "image", "url": img_url, "caption": caption, "source": source})
+                inserted_content.add(img_url)
+
+    for block in select_root_blocks(soup, selectors):
+        children = list(block.children)
+        i = 0
+        while i < len(children):
+            elem = children[i]
+            if isinstance(elem, str) or not hasattr(elem, "name"):
+                i += 1
+                continue
+            if not is_visible_bs4(elem):
+                i += 1
+                continue
+            if elem.name == "p":
+                p_text = extract_paragraph(elem)
+                if p_text and p_text not in inserted_content:
+                    elements.append({"type": "paragraph", "text": p_text})
+                    inserted_content.add(p_text)
+                for img_div in elem.find_all("div", class_="_img_1k32x_74"):
+                    add_images(extract_image_info(img_div))
+                if i + 1 < len(children):
+                    next_elem = children[i + 1]
+                    if hasattr(next_elem, "name") and next_elem.name == "div" and "_img_1k32x_74" in next_elem.get("class", []):
+                        add_images(extract_image_info(next_elem))
+                        i += 1
+            elif elem.name in ["ul", "ol"]:
+                for li_text in extract_list(elem):
+                    if li_text and li_text not in inserted_content:
+                        elements.append({"type": "list_item", "text": li_text})
+                        inserted_content.add(li_text)
+            elif elem.name == "table":
+                table_data = extract_table(elem)
+                if table_data:
+                    elements.append({"type": "table", "rows": table_data})
+            elif elem.name == "div" and "_img_1k32x_74" in elem.get("class", []):
+                add_images(extract_image_info(elem))
+            i += 1
+    return elements
@@ -0,0 +1,334 @@
+import argparse
+import json
+import random
+import struct
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from fixtures import load_stream_fixture, make_answer_parts, reference_record
+
+# Mirrors the parts of the Bohrium page progress.py touches: the login modal, the
+# prompt form, an answer that streams in over server-sent events and a virtualized
+# reference list that only renders the rows in view.
+PAGE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>Bohrium stand-in</title>
+<style>
+body { font-family: sans-serif; margin: 0; padding: 16px; }
+._modal_7bdw1_1 { position: fixed; inset: 0; background: rgba(0, 0, 0, 0.4); z-index: 10; }
+._close_7bdw1_31 { position: absolute; top: 40px; right: 40px; width: 32px; height: 32px; background: #fff; cursor: pointer; }
+._virtuoso_6r4i1_26 { height: 480px; overflow-y: auto; position: relative; border: 1px solid #ccc; }
+[data-index] { height: __ROW_HEIGHT__px; overflow: hidden; }
+</style>
+</head>
+<body>
+<form id="ask">
+<textarea rows="3" cols="80"></textarea>
+<button type="submit" class="_buttons-send-wrapper_x1y2z">Send</button>
+</form>
+<div id="answer"></div>
+<script>
+const config = __CONFIG__;
+
+setTimeout(() => {
+    const modal = document.createElement('div');
+    modal.className = '_modal_7bdw1_1';
+    modal.innerHTML = '<div class="_close_7bdw1_31"></div>';
+    modal.querySelector('._close_7bdw1_31').addEventListener('click', () => modal.remove());
+    document.body.appendChild(modal);
+}, config.modalDelayMs);
+
+function renderReferences(refs) {
+    const outer = document.createElement('div');
+    outer.className = '_content_6r4i1_29';
+    outer.innerHTML = '<div class="_virtuoso_6r4i1_26"><div class="spacer"><div data-testid="virtuoso-item-list"></div></div></div>';
+    document.getElementById('answer').appendChild(outer);
+    const scroller = outer.querySelector('._virtuoso_6r4i1_26');
+    const spacer = outer.querySelector('.spacer');
+    const list = outer.querySelector('[data-testid="virtuoso-item-list"]');
+    const rowHeight = config.rowHeight;
+    spacer.style.height = (refs.length * rowHeight) + 'px';
+    list.style.position = 'absolute';
+    list.style.left = '0';
+    list.style.right = '0';
+    const escapeHtml = (text) => text.replace(/&/g, '&amp;').replace(/</g, '&lt;').replace(/>/g, '&gt;');
+    let scheduled = false;
+    const render = () => {
+        scheduled = false;
+        const first = Math.max(0, Math.floor(scroller.scrollTop / rowHeight) - config.overscan);
+        const last = Math.min(refs.length - 1, Math.ceil((scroller.scrollTop + scroller.clientHeight) / rowHeight) + config.overscan);
+        list.style.top = (first * rowHeight) + 'px';
+        const rows = [];
+        for (let i = first; i <= last; i++) {
+            const ref = refs[i];
+            rows.push(`<div data-index="${i}" data-item-index="${i}"><div class="_container_q86iu_1">` +
+                `<div class="_index_q86iu_12">${i + 1}.</div>` +
+                `<div class="_title-paragraph_1doxh_4"><p>${escapeHtml(ref.title)}</p></div>` +
+                `<div class="_author_name_1fn6n_38">${escapeHtml(ref.authors.join(', '))}</div>` +
+                `<div class="_journal-date_q86iu_51">${escapeHtml(ref.date)}</div>` +
+                `<span class="_name_niu8h_11">${escapeHtml(ref.journal)}</span></div></div>`);
+        }
+        // Virtuoso re-renders a frame after the scroll event, not synchronously.
+        setTimeout(() => { list.innerHTML = rows.join(''); }, config.renderDelayMs);
+    };
+    scroller.addEventListener('scroll', () => {
+        if (!scheduled) {
+            scheduled = true;
+            requestAnimationFrame(render);
+        }
+    });
+    render();
+}
+
+document.getElementById('ask').addEventListener('submit', async (event) => {
+    event.preventDefault();
+    const prompt = document.querySelector('textarea').value;
+    const content = document.createElement('div');
+    content.className = '_content_1k32x_12';
+    document.getElementById('answer').appendChild(content);
+    const response = await fetch('/api/answer?prompt=' + encodeURIComponent(prompt));
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let text = '';
+    while (true) {
+        const {value, done} = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, {stream: true});
+        let boundary;
+        while ((boundary = buffer.indexOf('\\n\\n')) >= 0) {
+            const line = buffer.slice(0, boundary).replace(/^data: /, '');
+            buffer = buffer.slice(boundary + 2);
+            const event = JSON.parse(line);
+            if (event.html) content.insertAdjacentHTML('beforeend', event.html);
+            // Recorded text streams: deltas, or the whole answer so far, one <p> per line.
+            if (event.delta || event.answer) {
+                text = event.answer || text + event.delta;
+                content.innerHTML = text.split('\n').filter((l) => l.trim())
+                    .map((l) => '<p>' + l.replace(/&/g, '&amp;').replace(/</g, '&lt;') + '</p>').join('');
+            }
+            if (event.references) renderReferences(event.references);
+        }
+    }
+});
+</script>
+</body>
+</html>
+"""
+
+def make_png(width, height, seed=0):
+    """A gradient PNG built without any imaging library."""
+    rows = b"".join(b"\x00" + bytes(((x + seed * 37) % 256, (y * 7) % 256, (x ^ y) % 256)[c]
+                                     for x in range(width) for c in range(3)) for y in range(height))
+
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", zlib.compress(rows)) + chunk(b"IEND", b"")
+
+class StandinHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        config = self.server.config
+        path = self.path.split("?", 1)[0]
+        if path == "/" and self.server.roll(config["page_error_rate"]):
+            self.send_overloaded(503)
+        elif path == "/":
+            body = PAGE.replace("__CONFIG__", json.dumps({
+                "modalDelayMs": config["modal_delay_ms"],
+                "rowHeight": config["row_height"],
+                "overscan": config["overscan"],
+                "renderDelayMs": config["render_delay_ms"],
+            })).replace("__ROW_HEIGHT__", str(config["row_height"])).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        elif path == "/api/answer":
+            self.stream_answer(config)
+        elif path.startswith("/fig/") and path.endswith(".png") and path[5:-4].isdigit():
+            self.send_image(config, int(path[5:-4]))
+        else:
+            self.send_error(404)
+
+    def send_image(self, config, number):
+        time.sleep(config["image_delay_ms"] / 1000)
+        images = self.server.images
+        if number not in images:
+            images[number] = make_png(config["image_width"], config["image_height"], number)
+        body = images[number]
+        self.send_response(200)
+        self.send_header("Content-Type", "image/png")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_overloaded(self, status):
+        self.server.count("rejected")
+        body = b"overloaded"
+        self.send_response(status)
+        self.send_header("Retry-After", str(self.server.config["retry_after"]))
+        self.send_header("Content-Type", "text/plain")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def stream_answer(self, config):
+        server = self.server
+        load = server.enter_stream()
+        try:
+            if config["capacity"] and load > config["capacity"]:
+                self.send_overloaded(429)
+                return
+            if server.roll(config["answer_error_rate"]):
+                # The page gets an empty stream, so no answer ever renders.
+                server.count("failed")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.end_headers()
+                self.close_connection = True
+                return
+            server.count("answered")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.end_headers()
+            # Every stream already running makes the first chunk slower, like a backend near saturation.
+            delay = config["first_chunk_ms"] + config["load_delay_ms"] * (load - 1) + server.jitter(config["jitter_ms"])
+            time.sleep(delay / 1000)
+            for event in server.events:
+                self.wfile.write(f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+                self.wfile.flush()
+                time.sleep(config["chunk_ms"] / 1000)
+            self.close_connection = True
+        finally:
+            server.leave_stream()
+
+class StandinHttpd(ThreadingHTTPServer):
+    """The HTTP server plus the fault injection state its handler threads share."""
+
+    def __init__(self, address, seed=0):
+        super().__init__(address, StandinHandler)
+        self.lock = threading.Lock()
+        self.random = random.Random(seed)
+        self.streams = 0
+        self.stats = {"answered": 0, "failed": 0, "rejected": 0}
+
+    def roll(self, rate):
+        with self.lock:
+            return self.random.random() < rate
+
+    def jitter(self, ms):
+        with self.lock:
+            return self.random.uniform(0, ms)
+
+    def count(self, outcome):
+        with self.lock:
+            self.stats[outcome] += 1
+
+    def enter_stream(self):
+        with self.lock:
+            self.streams += 1
+            return self.streams
+
+    def leave_stream(self):
+        with self.lock:
+            self.streams -= 1
+
+class StandinServer:
+    """Serves a Bohrium-like page on localhost from a background thread; the answer's
+    figures are generated PNGs served from the same host after image_delay_ms.
+
+    Faults for exercising the batch scheduler: page_error_rate of page loads get a 503
+    and answer_error_rate of answers an empty stream; with a capacity, answers beyond
+    that many concurrent streams get a 429 (both with Retry-After: retry_after), and each
+    running stream delays the next one's first chunk by load_delay_ms, plus up to jitter_ms.
+
+    With a stream_fixture (a recorded stream in bench/fixtures), the answer request replays
+    its events instead of streaming generated HTML, as the site's text streams do.
+    """
+
+    def __init__(self, paragraphs=40, references=20, seed=0, chunk_ms=20, first_chunk_ms=500, modal_delay_ms=300,
+                 row_height=64, overscan=2, render_delay_ms=30, image_delay_ms=50, image_width=320, image_height=200,
+                 host="127.0.0.1", port=0, page_error_rate=0, answer_error_rate=0, capacity=0, load_delay_ms=0,
+                 jitter_ms=0, retry_after=1, stream_fixture=None):
+        self.httpd = StandinHttpd((host, port), seed)
+        self.httpd.daemon_threads = True
+        self.httpd.config = {
+            "chunk_ms": chunk_ms,
+            "first_chunk_ms": first_chunk_ms,
+            "modal_delay_ms": modal_delay_ms,
+            "row_height": row_height,
+            "overscan": overscan,
+            "render_delay_ms": render_delay_ms,
+            "image_delay_ms": image_delay_ms,
+            "image_width": image_width,
+            "image_height": image_height,
+            "page_error_rate": page_error_rate,
+            "answer_error_rate": answer_error_rate,
+            "capacity": capacity,
+            "load_delay_ms": load_delay_ms,
+            "jitter_ms": jitter_ms,
+            "retry_after": retry_after,
+        }
+        if stream_fixture:
+            self.httpd.events = load_stream_fixture(stream_fixture)
+        else:
+            parts = make_answer_parts(paragraphs, seed, references, image_base=self.url + "fig/")
+            self.httpd.events = [{"html": part} for part in parts]
+            self.httpd.events.append({"references": [reference_record(i) for i in range(references)], "done": True})
+        self.httpd.images = {}
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def prepare_images(self, count):
+        """Generates figures 1..count up front so serving them costs only image_delay_ms."""
+        config = self.httpd.config
+        for number in range(1, count + 1):
+            self.httpd.images.setdefault(number, make_png(config["image_width"], config["image_height"], number))
+        return self
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a local Bohrium stand-in page.")
+    parser.add_argument("--port", type=int, default=8000, help="Port to listen on.")
+    parser.add_argument("--paragraphs", type=int, default=40, help="Top-level elements in the streamed answer.")
+    parser.add_argument("--references", type=int, default=20, help="Items in the reference list.")
+    parser.add_argument("--chunk-ms", type=int, default=20, help="Delay between streamed answer chunks.")
+    parser.add_argument("--page-error-rate", type=float, default=0, help="Share of page loads answered with a 503.")
+    parser.add_argument("--answer-error-rate", type=float, default=0, help="Share of answers streamed empty.")
+    parser.add_argument("--capacity", type=int, default=0, help="Concurrent answer streams before a 429 (0: unlimited).")
+    parser.add_argument("--load-delay-ms", type=int, default=0, help="Extra first-chunk delay per stream already running.")
+    parser.add_argument("--jitter-ms", type=int, default=0, help="Random extra first-chunk delay, up to this much.")
+    parser.add_argument("--stream-fixture", type=str, metavar="NAME",
+                        help="Replay this recorded stream from bench/fixtures (e.g. stream_delta.sse) as the answer.")
+    args = parser.parse_args()
+    server = StandinServer(args.paragraphs, args.references, chunk_ms=args.chunk_ms, port=args.port,
+                           page_error_rate=args.page_error_rate, answer_error_rate=args.answer_error_rate,
+                           capacity=args.capacity, load_delay_ms=args.load_delay_ms, jitter_ms=args.jitter_ms,
+                           stream_fixture=args.stream_fixture)
+    print(f"[*] Stand-in listening on {server.url} (run progress.py with BOHRIUM_URL={server.url})")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        print("[*] Stand-in stopped.")
@@ -0,0 +1,20 @@
+"""Bohrium AI research searches as a library.
+
+    import researcher
+    result = researcher.search_sync("graph neural networks for drug discovery")
+    print(result.path, len(result.references))
+
+`search()` is the coroutine for callers that already run an event loop. The
+command line is `python -m researcher` (see researcher/cli.py). Names are
+resolved on first use, so importing the package costs almost nothing;
+Playwright, python-docx and BeautifulSoup load only in the stages that need them.
+"""
+
+__all__ = ["Options", "Result", "SearchError", "search", "search_sync"]
+
+def __getattr__(name):
+    if name in __all__:
+        from researcher import api
+
+        return getattr(api, name)
+    raise AttributeError(f"module 'researcher' has no attribute '{name}'")
@@ -0,0 +1,171 @@
+import copy
+import time
+
+# Searches running now and the Options they applied; progress.py's settings as they
+# were before the first of them, restored when the last one ends.
+_applied = {"count": 0, "settings": None, "saved": None}
+
+class SearchError(Exception):
+    """No answer could be collected for the prompt (the log has the details)."""
+
+class Options:
+    """How search() runs. Each argument matches the progress.py flag of the same name; paths left
+    as None use the same defaults as the command line, and cache/refstore/checkpoint=False are the
+    --no-* flags. formats=() returns the Result without writing any file.
+
+    Options are applied to progress.py's module settings (OUTPUT, SESSION, IMAGES, TIMINGS) for
+    the duration of a search and restored afterwards. Searches running at the same time in one
+    process must use equal settings; search() raises RuntimeError otherwise.
+    """
+
+    def __init__(self, headless=True, capture="dom", block_resources=False, formats=("docx",), output_dir=".",
+                 parser="auto", cache=True, refresh=False, cache_path=None, refstore=True, refstore_path=None,
+                 fetch_images=False, assets_dir=None, checkpoint=True, runs_dir=None, storage_state=None,
+                 user_data_dir=None, selector_cache=None, timings=None):
+        self.headless = headless
+        self.capture = capture
+        self.block_resources = block_resources
+        self.formats = list(formats)
+        self.output_dir = output_dir
+        self.parser = parser
+        self.cache = cache
+        self.refresh = refresh
+        self.cache_path = cache_path
+        self.refstore = refstore
+        self.refstore_path = refstore_path
+        self.fetch_images = fetch_images
+        self.assets_dir = assets_dir
+        self.checkpoint = checkpoint
+        self.runs_dir = runs_dir
+        self.storage_state = storage_state
+        self.user_data_dir = user_data_dir
+        self.selector_cache = selector_cache
+        # The command line lingers on the finished page for a few seconds; a library call does not.
+        self.timings = {"linger_ms": 0, **(timings or {})}
+
+    def settings(self):
+        """What apply() changes, for comparing the Options of concurrent searches."""
+        return (self.parser, tuple(self.formats), self.output_dir, self.checkpoint and self.runs_dir, self.storage_state,
+                self.user_data_dir, self.selector_cache, self.assets_dir, tuple(sorted(self.timings.items())))
+
+    def apply(self):
+        from researcher import progress
+
+        progress.OUTPUT["parser_backend"] = self.parser
+        progress.OUTPUT["formats"] = self.formats
+        progress.OUTPUT["output_dir"] = self.output_dir
+        progress.OUTPUT["runs_dir"] = (self.runs_dir or progress.DEFAULT_RUNS_DIR) if self.checkpoint else None
+        progress.SESSION["storage_state"] = self.storage_state
+        progress.SESSION["user_data_dir"] = self.user_data_dir
+        if self.selector_cache is not None:
+            progress.RESOLVER.path = self.selector_cache or None
+        if self.assets_dir:
+            progress.IMAGES["dir"] = self.assets_dir
+        progress.TIMINGS.update(self.timings)
+
+    def open_stores(self):
+        """The result cache, reference store and asset store these options ask for (None where disabled)."""
+        cache = refstore = assets = None
+        if self.cache:
+            from researcher.cache import DEFAULT_CACHE_PATH, ResultCache
+
+            cache = ResultCache(self.cache_path or DEFAULT_CACHE_PATH)
+        if self.refstore:
+            from researcher.refstore import DEFAULT_REFSTORE_PATH, ReferenceStore
+
+            refstore = ReferenceStore(self.refstore_path or DEFAULT_REFSTORE_PATH)
+        if self.fetch_images:
+            from researcher import progress
+            from researcher.assets import AssetStore
+
+            assets = AssetStore(progress.IMAGES["dir"])
+        return cache, refstore, assets
+
+class Result:
+    """One answered prompt: the exported record's fields plus where it was written."""
+
+    def __init__(self, record, html, paths, cached, elapsed):
+        self.prompt = record["prompt"]
+        self.created_at = record["created_at"]
+        self.elements = record["elements"]
+        self.cited_numbers = record["cited_numbers"]
+        self.references = record["references"]
+        self.html = html
+        self.paths = paths
+        self.cached = cached
+        self.elapsed = elapsed
+
+    @property
+    def path(self):
+        """The first file written (the document when there is one), or None."""
+        return self.paths[0] if self.paths else None
+
+    def to_dict(self):
+        """The record as the jsonl exporter writes it, plus paths, cached and elapsed."""
+        return {"prompt": self.prompt, "created_at": self.created_at, "elements": self.elements,
+                "cited_numbers": self.cited_numbers, "references": self.references, "paths": self.paths,
+                "cached": self.cached, "elapsed": self.elapsed}
+
+    def __repr__(self):
+        return (f"Result(prompt={self.prompt!r}, elements={len(self.elements)}, references={len(self.references)}, "
+                f"paths={self.paths!r}, cached={self.cached})")
+
+def _enter(options):
+    from researcher import progress
+
+    if _applied["count"]:
+        if options.settings() != _applied["settings"]:
+            raise RuntimeError("a search with different Options is already running in this process")
+    else:
+        _applied["settings"] = options.settings()
+        _applied["saved"] = (copy.deepcopy([progress.OUTPUT, progress.SESSION, progress.IMAGES, progress.TIMINGS]),
+                             progress.RESOLVER.path)
+        options.apply()
+    _applied["count"] += 1
+
+def _exit():
+    from researcher import progress
+
+    _applied["count"] -= 1
+    if _applied["count"]:
+        return
+    settings, resolver_path = _applied["saved"]
+    # Restored in place: other modules hold references to these dicts.
+    for current, saved in zip([progress.OUTPUT, progress.SESSION, progress.IMAGES, progress.TIMINGS], settings):
+        current.clear()
+        current.update(saved)
+    progress.RESOLVER.path = resolver_path
+    _applied["settings"] = _applied["saved"] = None
+
+async def search(prompt_text, options=None):
+    """Answers one prompt, from the result cache when possible, and returns its Result.
+    Raises SearchError when no answer could be collected."""
+    from researcher import progress
+    from researcher.exporters import build_record
+
+    options = options or Options()
+    _enter(options)
+    start_time = time.time()
+    try:
+        cache, refstore, assets = options.open_stores()
+        try:
+            outcome = await progress.search_prompt(prompt_text, options.headless, options.capture,
+                                                   options.block_resources, cache, options.refresh, refstore, assets)
+        finally:
+            for store in (cache, refstore, assets):
+                if store:
+                    store.close()
+    finally:
+        _exit()
+    if not outcome or not outcome["result"]["html"]:
+        raise SearchError(f"no answer collected for '{prompt_text}'")
+    result = outcome["result"]
+    record = build_record(prompt_text, progress.ensure_elements(result), result["references_dict"],
+                          result["cited_numbers"])
+    return Result(record, result["html"], outcome["paths"], outcome["cached"], time.time() - start_time)
+
+def search_sync(prompt_text, options=None):
+    """search() for callers without an event loop."""
+    import asyncio
+
+    return asyncio.run(search(prompt_text, options))
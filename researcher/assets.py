@@ -0,0 +1,165 @@
+import asyncio
+import hashlib
+import os
+import sqlite3
+import time
+from urllib.parse import urlsplit
+from researcher.metrics import incr, log, span
+
+DEFAULT_ASSET_DIR = os.path.join(os.path.expanduser("~"), ".cache", "researcher-1", "assets")
+
+EXTENSIONS = {
+    "image/png": ".png",
+    "image/jpeg": ".jpg",
+    "image/gif": ".gif",
+    "image/webp": ".webp",
+    "image/bmp": ".bmp",
+    "image/tiff": ".tiff",
+    "image/svg+xml": ".svg",
+}
+
+def _extension(content_type, url):
+    ext = EXTENSIONS.get((content_type or "").split(";")[0].strip().lower())
+    if ext:
+        return ext
+    ext = os.path.splitext(urlsplit(url).path)[1].lower()
+    return ext if ext in EXTENSIONS.values() else ".bin"
+
+class AssetStore:
+    """Content-addressed image files (one per distinct body) plus an index of source URLs."""
+
+    def __init__(self, directory=DEFAULT_ASSET_DIR):
+        self.directory = directory
+        self.stats = {"hits": 0, "fetched": 0, "failed": 0, "bytes": 0}
+        os.makedirs(directory, exist_ok=True)
+        self.db = sqlite3.connect(os.path.join(directory, "index.sqlite3"))
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS assets (
+                url TEXT PRIMARY KEY,
+                path TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                fetched_at REAL NOT NULL
+            )""")
+        self.db.commit()
+
+    def lookup(self, url):
+        row = self.db.execute("SELECT path FROM assets WHERE url = ?", (url,)).fetchone()
+        if row and os.path.exists(os.path.join(self.directory, row[0])):
+            return os.path.join(self.directory, row[0])
+        return None
+
+    def put(self, url, data, content_type=None):
+        digest = hashlib.sha256(data).hexdigest()
+        relative = os.path.join(digest[:2], digest + _extension(content_type, url))
+        path = os.path.join(self.directory, relative)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        self.db.execute("INSERT OR REPLACE INTO assets VALUES (?, ?, ?, ?)", (url, relative, len(data), time.time()))
+        self.db.commit()
+        return path
+
+    def format_stats(self):
+        return (f"Images: {self.stats['fetched']} downloaded ({self.stats['bytes'] / 2**20:.1f} MB), "
+                f"{self.stats['hits']} from the asset cache, {self.stats['failed']} failed.")
+
+    def close(self):
+        self.db.close()
+
+def resized_copy(path, max_width):
+    """Returns a copy of the image no wider than max_width (needs Pillow), or the original path."""
+    if not max_width or path.endswith((".svg", ".bin")):
+        return path
+    try:
+        from PIL import Image
+    except ImportError:
+        return path
+    root, ext = os.path.splitext(path)
+    target = f"{root}.w{max_width}{ext}"
+    if os.path.exists(target):
+        return target
+    try:
+        with Image.open(path) as image:
+            if image.width <= max_width:
+                return path
+            height = max(1, round(image.height * max_width / image.width))
+            image.resize((max_width, height)).save(target)
+        return target
+    except Exception as e:
+        log.warning(f"[WARNING] Could not resize {path}: {e}")
+        return path
+
+def _urllib_get(url, timeout, max_bytes):
+    import urllib.request
+
+    request = urllib.request.Request(url, headers={"User-Agent": "Mozilla/5.0 researcher-1"})
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        data = response.read(max_bytes + 1)
+        if len(data) > max_bytes:
+            raise ValueError(f"larger than {max_bytes} bytes")
+        return data, response.headers.get("Content-Type")
+
+async def _request_get(request_context, url, timeout, max_bytes):
+    response = await request_context.get(url, timeout=timeout * 1000)
+    try:
+        if not response.ok:
+            raise ValueError(f"HTTP {response.status}")
+        data = await response.body()
+        if len(data) > max_bytes:
+            raise ValueError(f"larger than {max_bytes} bytes")
+        return data, response.headers.get("content-type")
+    finally:
+        await response.dispose()
+
+def image_urls(elements):
+    return list(dict.fromkeys(e["url"] for e in elements if e["type"] == "image" and e["url"].startswith(("http://", "https://"))))
+
+async def fetch_images(elements, store, request_context=None, max_parallel=8, per_host=4, timeout=30,
+                       max_bytes=20 * 2**20, max_width=None):
+    """Downloads the images of `elements` not yet in the store, at most max_parallel at once and
+    per_host per host, then attaches local paths. Uses the browser's request context when given
+    (sharing its cookies), else urllib in worker threads."""
+    pending = [url for url in image_urls(elements) if not store.lookup(url)]
+    store.stats["hits"] += len(image_urls(elements)) - len(pending)
+    if pending:
+        limiter = asyncio.Semaphore(max_parallel)
+        host_limiters = {}
+
+        async def fetch(url):
+            host_limiter = host_limiters.setdefault(urlsplit(url).netloc, asyncio.Semaphore(per_host))
+            # The host slot first: a saturated host must not park its queued downloads on global slots.
+            async with host_limiter, limiter:
+                try:
+                    if request_context is not None:
+                        data, content_type = await _request_get(request_context, url, timeout, max_bytes)
+                    else:
+                        data, content_type = await asyncio.to_thread(_urllib_get, url, timeout, max_bytes)
+                except Exception as e:
+                    store.stats["failed"] += 1
+                    incr("images_failed")
+                    log.warning(f"[WARNING] Failed to download image {url}: {e}")
+                    return
+            store.put(url, data, content_type)
+            store.stats["fetched"] += 1
+            store.stats["bytes"] += len(data)
+            incr("images_fetched")
+            incr("image_bytes", len(data))
+
+        log.info(f"[*] Downloading {len(pending)} images ({max_parallel} parallel, {per_host} per host)...")
+        with span("image_fetch"):
+            await asyncio.gather(*(fetch(url) for url in pending))
+    return attach_images(elements, store, max_width)
+
+def attach_images(elements, store, max_width=None):
+    """Sets element["path"] on every image already in the store; returns how many have one."""
+    attached = 0
+    for element in elements:
+        if element["type"] == "image":
+            path = store.lookup(element["url"])
+            if path:
+                element["path"] = resized_copy(path, max_width)
+                attached += 1
+    return attached
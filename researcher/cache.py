@@ -0,0 +1,93 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import time
+import unicodedata
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "researcher-1", "results.sqlite3")
+DEFAULT_TTL = 7 * 24 * 3600
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+def normalize_prompt(prompt_text):
+    """Folds case, punctuation and whitespace so trivially different prompts share a key."""
+    text = unicodedata.normalize("NFKC", prompt_text).casefold()
+    text = re.sub(r"[^\w\s]", " ", text)
+    return " ".join(text.split())
+
+def prompt_key(prompt_text):
+    return hashlib.sha256(normalize_prompt(prompt_text).encode("utf-8")).hexdigest()
+
+class ResultCache:
+    """SQLite store of captured results keyed by normalized prompt, with a TTL and LRU size bound."""
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, ttl=DEFAULT_TTL, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.db = sqlite3.connect(path)
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS results (
+                key TEXT PRIMARY KEY,
+                prompt TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )""")
+        self.db.execute("CREATE INDEX IF NOT EXISTS results_accessed_at ON results (accessed_at)")
+        self.db.commit()
+
+    def get(self, prompt_text):
+        key = prompt_key(prompt_text)
+        row = self.db.execute("SELECT payload, created_at FROM results WHERE key = ?", (key,)).fetchone()
+        now = time.time()
+        if row and now - row[1] <= self.ttl:
+            self.db.execute("UPDATE results SET accessed_at = ? WHERE key = ?", (now, key))
+            self.db.commit()
+            self.stats["hits"] += 1
+            return json.loads(row[0])
+        if row:
+            self.db.execute("DELETE FROM results WHERE key = ?", (key,))
+            self.db.commit()
+        self.stats["misses"] += 1
+        return None
+
+    def put(self, prompt_text, result):
+        """Stores a dict with the content HTML, cited_numbers and references_dict (and parsed elements, if any)."""
+        payload = json.dumps(result)
+        now = time.time()
+        self.db.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?)",
+                        (prompt_key(prompt_text), prompt_text, payload, len(payload), now, now))
+        self.db.commit()
+        self.stats["stores"] += 1
+        self.evict()
+
+    def evict(self):
+        now = time.time()
+        expired = self.db.execute("DELETE FROM results WHERE created_at < ?", (now - self.ttl,)).rowcount
+        total = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        evicted = []
+        if total > self.max_bytes:
+            for key, size in self.db.execute("SELECT key, size FROM results ORDER BY accessed_at"):
+                if total <= self.max_bytes:
+                    break
+                evicted.append((key,))
+                total -= size
+            self.db.executemany("DELETE FROM results WHERE key = ?", evicted)
+        self.db.commit()
+        self.stats["evictions"] += expired + len(evicted)
+
+    def format_stats(self):
+        lookups = self.stats["hits"] + self.stats["misses"]
+        rate = 100 * self.stats["hits"] / lookups if lookups else 0
+        return (f"Cache: {self.stats['hits']} hits, {self.stats['misses']} misses ({rate:.0f}% hit rate), "
+                f"{self.stats['stores']} stored, {self.stats['evictions']} evicted.")
+
+    def close(self):
+        self.db.close()
@@ -0,0 +1,110 @@
+import json
+import os
+import shutil
+import time
+from researcher.cache import normalize_prompt, prompt_key
+
+DEFAULT_RUNS_DIR = os.path.join(os.path.expanduser("~"), ".cache", "researcher-1", "runs")
+
+STATE_FILE = "state.json"
+SNAPSHOT_FILE = "snapshot.html"
+
+def atomic_write(path, text):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+class Checkpoint:
+    """Run directory holding the content snapshot and the progress of one prompt.
+
+    state.json has the prompt, page URL, stage (snapshot, references, exported),
+    cited numbers, the references found so far and the output files written.
+    """
+
+    def __init__(self, run_dir):
+        self.run_dir = run_dir
+        self.state_path = os.path.join(run_dir, STATE_FILE)
+        self.snapshot_path = os.path.join(run_dir, SNAPSHOT_FILE)
+        self.state = None
+
+    @classmethod
+    def for_prompt(cls, runs_dir, prompt_text):
+        checkpoint = cls(os.path.join(runs_dir, prompt_key(prompt_text)[:16]))
+        os.makedirs(checkpoint.run_dir, exist_ok=True)
+        return checkpoint
+
+    def exists(self):
+        return os.path.exists(self.state_path) and os.path.exists(self.snapshot_path)
+
+    def load(self):
+        if self.state is None:
+            with open(self.state_path, encoding="utf-8") as f:
+                self.state = json.load(f)
+        return self.state
+
+    def read_snapshot(self):
+        with open(self.snapshot_path, encoding="utf-8") as f:
+            return f.read()
+
+    def save_snapshot(self, prompt_text, html_content, cited_numbers, url=None, references=None):
+        """Writes the snapshot first, so a state file always points at complete HTML."""
+        atomic_write(self.snapshot_path, html_content)
+        self.state = {
+            "prompt": prompt_text,
+            "url": url,
+            "stage": "snapshot",
+            "cited_numbers": list(cited_numbers),
+            "references": dict(references or {}),
+            "outputs": [],
+            "created_at": time.time(),
+        }
+        self._write_state()
+
+    def update(self, **fields):
+        self.load().update(fields)
+        self._write_state()
+
+    def _write_state(self):
+        self.state["updated_at"] = time.time()
+        atomic_write(self.state_path, json.dumps(self.state, ensure_ascii=False, indent=1))
+
+    def missing_references(self):
+        state = self.load()
+        return [num for num in state["cited_numbers"] if str(num) not in state["references"]]
+
+def find_checkpoints(runs_dir, prompts=None):
+    """Checkpoints for the given prompts, or every complete one in runs_dir."""
+    if prompts:
+        checkpoints = [Checkpoint(os.path.join(runs_dir, prompt_key(p)[:16])) for p in prompts]
+    elif os.path.isdir(runs_dir):
+        checkpoints = [Checkpoint(os.path.join(runs_dir, name)) for name in sorted(os.listdir(runs_dir))]
+    else:
+        checkpoints = []
+    wanted = {normalize_prompt(p) for p in prompts or ()}
+    found = []
+    for checkpoint in checkpoints:
+        if checkpoint.exists() and (not wanted or normalize_prompt(checkpoint.load()["prompt"]) in wanted):
+            found.append(checkpoint)
+    return found
+
+def prune_checkpoints(runs_dir, max_age):
+    """Deletes run directories not updated for max_age seconds; returns how many were removed."""
+    if not os.path.isdir(runs_dir):
+        return 0
+    cutoff = time.time() - max_age
+    removed = 0
+    for name in os.listdir(runs_dir):
+        checkpoint = Checkpoint(os.path.join(runs_dir, name))
+        if not os.path.isdir(checkpoint.run_dir):
+            continue
+        try:
+            updated_at = checkpoint.load().get("updated_at", 0) if checkpoint.exists() else os.path.getmtime(checkpoint.run_dir)
+        except (OSError, ValueError):
+            updated_at = os.path.getmtime(checkpoint.run_dir)
+        if updated_at < cutoff:
+            shutil.rmtree(checkpoint.run_dir, ignore_errors=True)
+            removed += 1
+    return removed
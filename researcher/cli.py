@@ -0,0 +1,28 @@
+import importlib
+import sys
+
+# Subcommand -> module whose main(argv, prog) runs it. A module is imported only
+# when its command runs, so the overview below prints without loading any of them.
+COMMANDS = {
+    "search": ("progress", "Search one prompt or a prompts file, or rebuild outputs from checkpoints (default)."),
+    "serve": ("service", "Keep warm pages and serve searches over a local HTTP API."),
+    "queue": ("worker", "Queue prompts, work through them with worker processes and show queue status."),
+}
+
+def usage():
+    lines = ["usage: researcher [search] PROMPT [options]", "       researcher {serve,queue} ...", "",
+             "Run Bohrium AI searches and save the answers.", "", "commands:"]
+    lines.extend(f"  {name:<8} {summary}" for name, (_, summary) in COMMANDS.items())
+    lines.extend(["", "Run 'researcher COMMAND --help' for the options of a command."])
+    return "\n".join(lines)
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if not argv or argv[0] in ("-h", "--help"):
+        print(usage())
+        return
+    command = "search"
+    if argv[0] in COMMANDS:
+        command = argv.pop(0)
+    module = importlib.import_module(f"researcher.{COMMANDS[command][0]}")
+    module.main(argv, prog=f"researcher {command}")
@@ -0,0 +1,442 @@
+import asyncio
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from datetime import datetime
+from html import escape
+from researcher import metrics
+from researcher.metrics import log, observe_span, span
+
+REFERENCE_FIELDS = ("title", "authors", "date", "journal", "doi")
+
+# Formats python-docx can embed; anything else stays a text paragraph with the URL.
+EMBEDDABLE_IMAGES = (".png", ".jpg", ".jpeg", ".gif", ".bmp", ".tiff")
+MAX_IMAGE_WIDTH_INCHES = 6
+
+def format_reference(ref):
+    if isinstance(ref, str):
+        return ref
+    authors = ", ".join(ref["authors"])
+    return f"{authors}. {ref['date']}. {ref['title']}. {ref['journal']}."
+
+def reference_record(number, ref):
+    """One cited reference with its fields kept apart; older cached entries only have the text."""
+    record = {"number": int(number)}
+    if isinstance(ref, str):
+        record.update({field: [] if field == "authors" else "" for field in REFERENCE_FIELDS})
+    else:
+        record.update({field: ref.get(field, [] if field == "authors" else "") for field in REFERENCE_FIELDS})
+    record["text"] = format_reference(ref)
+    return record
+
+def build_record(prompt_text, elements, references_dict, cited_numbers):
+    return {
+        "prompt": prompt_text,
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "elements": elements,
+        "cited_numbers": list(cited_numbers),
+        "references": [reference_record(num, references_dict[str(num)]) for num in cited_numbers
+                       if str(num) in references_dict],
+    }
+
+# --- Per-prompt documents ---
+
+def image_paragraph_text(image):
+    image_info = f"Image URL: {image['url']}"
+    if image["caption"]:
+        image_info += f"\nCaption: {image['caption']}"
+    if image["source"]:
+        image_info += f"\nSource: {image['source']}"
+    return image_info
+
+# Characters WordprocessingML cannot hold; python-docx refuses them, so they are dropped.
+INVALID_XML_CHARS = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff\ud800-\udfff]")
+RUN_BREAKS = re.compile(r"([\t\r\n])")
+
+# Body elements are built as WordprocessingML text and parsed this many at a time.
+XML_BATCH = 2000
+
+def run_xml(text):
+    """The <w:r> python-docx writes for `text`: tabs and line breaks become <w:tab/> and <w:br/>."""
+    parts = []
+    for piece in RUN_BREAKS.split(INVALID_XML_CHARS.sub("", text)):
+        if piece == "\t":
+            parts.append("<w:tab/>")
+        elif piece in ("\r", "\n"):
+            parts.append("<w:br/>")
+        elif piece:
+            space = ' xml:space="preserve"' if piece.strip() != piece else ""
+            parts.append(f"<w:t{space}>{escape(piece, quote=False)}</w:t>")
+    return f"<w:r>{''.join(parts)}</w:r>" if parts else ""
+
+def paragraph_xml(text):
+    return f"<w:p>{run_xml(text)}</w:p>"
+
+def table_xml(rows, block_width):
+    """A table as doc.add_table() lays it out, sized to the longest row; short rows get empty cells.
+    None when no row has a cell."""
+    from docx.shared import Emu
+
+    cols = max((len(row) for row in rows), default=0)
+    if not cols:
+        return None
+    width = Emu(block_width // cols).twips
+    cell_start = f'<w:tc><w:tcPr><w:tcW w:type="dxa" w:w="{width}"/></w:tcPr><w:p>'
+    parts = ['<w:tbl><w:tblPr><w:tblW w:type="auto" w:w="0"/>'
+             '<w:tblLook w:firstColumn="1" w:firstRow="1" w:lastColumn="0" w:lastRow="0" w:noHBand="0" '
+             'w:noVBand="1" w:val="04A0"/></w:tblPr><w:tblGrid>',
+             f'<w:gridCol w:w="{width}"/>' * cols, "</w:tblGrid>"]
+    for row in rows:
+        parts.append("<w:tr>")
+        for cell_text in list(row) + [""] * (cols - len(row)):
+            parts.extend((cell_start, run_xml(cell_text), "</w:p></w:tc>"))
+        parts.append("</w:tr>")
+    parts.append("</w:tbl>")
+    return "".join(parts)
+
+def element_xml(element, block_width):
+    """WordprocessingML for a text or table element; None for images, which go through add_picture."""
+    kind = element["type"]
+    if kind == "paragraph":
+        log.debug(f"    [+] Inserted paragraph: {element['text'][:60]}...")
+        return paragraph_xml(element["text"])
+    if kind == "list_item":
+        log.debug(f"    [+] Inserted list item: {element['text'][:60]}...")
+        return paragraph_xml(f"- {element['text']}")
+    if kind == "table":
+        log.debug("    [+] Inserted table.")
+        # An empty table is skipped ("" is nothing to add; None would mean an image).
+        return table_xml(element["rows"], block_width) or ""
+    if kind == "image":
+        if element.get("path", "").lower().endswith(EMBEDDABLE_IMAGES):
+            return None
+        log.debug(f"    [+] Inserted image: {element['url']}")
+        return paragraph_xml(image_paragraph_text(element))
+    return ""
+
+class BodyWriter:
+    """Appends body elements to a python-docx Document in bulk.
+
+    doc.add_paragraph() and doc.add_table() build every element node by node,
+    and Table.cell() walks the whole table on each call, so large answers
+    took quadratic time. Here elements are rendered to WordprocessingML text
+    and parsed in batches; images still go through doc.add_picture(), after
+    flushing what came before them so the order is kept.
+    """
+
+    def __init__(self, doc):
+        self.doc = doc
+        self.block_width = doc._block_width
+        self.pending = []
+
+    def add(self, element):
+        xml = element_xml(element, self.block_width)
+        if xml is None:
+            self.flush()
+            add_picture(self.doc, element)
+            log.debug(f"    [+] Inserted image: {element['url']}")
+            return
+        if xml:
+            self.pending.append(xml)
+            if len(self.pending) >= XML_BATCH:
+                self.flush()
+
+    def add_paragraph(self, text):
+        self.pending.append(paragraph_xml(text))
+
+    def flush(self):
+        if not self.pending:
+            return
+        from docx.oxml import parse_xml
+        from docx.oxml.ns import nsdecls
+
+        fragment = parse_xml(f"<w:body {nsdecls('w')}>{''.join(self.pending)}</w:body>")
+        self.pending = []
+        body = self.doc.element.body
+        anchor = body.sectPr
+        for child in list(fragment):
+            if anchor is not None:
+                anchor.addprevious(child)
+            else:
+                body.append(child)
+
+def add_picture(doc, image):
+    """Embeds a downloaded image, no wider than the text column, with its caption below."""
+    from docx.shared import Inches
+
+    try:
+        shape = doc.add_picture(image["path"])
+    except Exception as e:
+        log.warning(f"    [WARNING] Could not embed {image['path']}: {e}")
+        doc.add_paragraph(image_paragraph_text(image))
+        return
+    max_width = Inches(MAX_IMAGE_WIDTH_INCHES)
+    if shape.width > max_width:
+        shape.height = int(shape.height * max_width / shape.width)
+        shape.width = max_width
+    caption = [text for text in (image["caption"], image["source"] and f"Source: {image['source']}") if text]
+    doc.add_paragraph("\n".join(caption + [f"Image URL: {image['url']}"]))
+
+def write_docx(record, path):
+    from docx import Document
+
+    doc = Document()
+    doc.add_heading(record["prompt"], level=1)
+    body = BodyWriter(doc)
+    for element in record["elements"]:
+        try:
+            body.add(element)
+        except Exception as e:
+            log.error(f"    [ERROR] Failed to insert {element['type']}: {e}")
+    body.flush()
+    if record["references"]:
+        doc.add_heading("References", level=2)
+        for ref in record["references"]:
+            body.add_paragraph(f"[{ref['number']}] {ref['text']}")
+        body.flush()
+        log.info(f"[*] Added {len(record['references'])} cited references to document.")
+    doc.save(path)
+
+def _markdown_cell(text):
+    return text.replace("|", "\\|").replace("\n", " ")
+
+def markdown_lines(element, base_dir=None):
+    kind = element["type"]
+    if kind == "paragraph":
+        return [element["text"], ""]
+    if kind == "list_item":
+        return [f"- {element['text']}"]
+    if kind == "table":
+        width = max((len(row) for row in element["rows"]), default=0)
+        if not width:
+            return []
+        rows = [[_markdown_cell(cell) for cell in row] + [""] * (width - len(row)) for row in element["rows"]]
+        lines = ["| " + " | ".join(rows[0]) + " |", "|" + " --- |" * width]
+        lines.extend("| " + " | ".join(row) + " |" for row in rows[1:])
+        return [""] + lines + [""]
+    if kind == "image":
+        target = element["url"]
+        if element.get("path") and base_dir is not None:
+            target = os.path.relpath(element["path"], base_dir).replace(os.sep, "/")
+        lines = [f"![{element['caption']}]({target})"]
+        if element["source"]:
+            lines.append(f"*{element['source']}*")
+        return lines + [""]
+    return []
+
+def write_markdown(record, path):
+    lines = [f"# {record['prompt']}", ""]
+    for element in record["elements"]:
+        lines.extend(markdown_lines(element, os.path.dirname(os.path.abspath(path))))
+    if record["references"]:
+        lines.extend(["", "## References", ""])
+        lines.extend(f"[{ref['number']}] {ref['text']}  " for ref in record["references"])
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines).rstrip() + "\n")
+
+# --- Run-wide collections (one file for every prompt of a run) ---
+
+class JsonlWriter:
+    """Appends one JSON object per result."""
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "a", encoding="utf-8")
+
+    def write(self, record):
+        self.file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+class ParquetWriter:
+    """Buffers results and writes them as Parquet row groups (needs pyarrow)."""
+
+    def __init__(self, path, row_group_size=256):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self.pa = pa
+        self.path = path
+        self.row_group_size = row_group_size
+        self.buffer = []
+        self.schema = pa.schema([
+            ("prompt", pa.string()),
+            ("created_at", pa.string()),
+            ("elements", pa.list_(pa.struct([
+                ("type", pa.string()),
+                ("text", pa.string()),
+                ("rows", pa.list_(pa.list_(pa.string()))),
+                ("url", pa.string()),
+                ("caption", pa.string()),
+                ("source", pa.string()),
+                ("path", pa.string()),
+            ]))),
+            ("cited_numbers", pa.list_(pa.int32())),
+            ("references", pa.list_(pa.struct([
+                ("number", pa.int32()),
+                ("title", pa.string()),
+                ("authors", pa.list_(pa.string())),
+                ("date", pa.string()),
+                ("journal", pa.string()),
+                ("doi", pa.string()),
+                ("text", pa.string()),
+            ]))),
+        ])
+        self.writer = pq.ParquetWriter(path, self.schema)
+
+    def write(self, record):
+        self.buffer.append(record)
+        if len(self.buffer) >= self.row_group_size:
+            self.flush()
+
+    def flush(self):
+        if self.buffer:
+            self.writer.write_table(self.pa.Table.from_pylist(self.buffer, schema=self.schema))
+            self.buffer = []
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+
+DOCUMENT_FORMATS = {"docx": (".docx", write_docx), "markdown": (".md", write_markdown)}
+COLLECTION_FORMATS = {"jsonl": (".jsonl", JsonlWriter), "parquet": (".parquet", ParquetWriter)}
+FORMATS = list(DOCUMENT_FORMATS) + list(COLLECTION_FORMATS)
+
+def output_stem(kind):
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    return f"bohrium_ai_{kind}_{timestamp}_{uuid.uuid4().hex[:6]}"
+
+def write_document(fmt, record, output_dir, stem):
+    extension, write = DOCUMENT_FORMATS[fmt]
+    path = os.path.join(output_dir, stem + extension)
+    write(record, path)
+    log.info(f"[✓] Document saved as '{path}'")
+    return path
+
+def export_job(prompt_text, elements, references_dict, cited_numbers, formats, output_dir, html_content=None,
+               selectors=None, backend="auto"):
+    """Runs in a pool worker: parses the snapshot when no elements are given and writes the
+    per-prompt documents. Returns the record, the paths written and the seconds per phase."""
+    timings = {}
+    if elements is None:
+        from researcher.extraction import extract_elements
+
+        start = time.perf_counter()
+        elements = extract_elements(html_content, selectors, backend)
+        timings["parse"] = time.perf_counter() - start
+    record = build_record(prompt_text, elements, references_dict, cited_numbers)
+    stem = output_stem("response")
+    paths = []
+    for fmt in formats:
+        if fmt not in DOCUMENT_FORMATS:
+            continue
+        start = time.perf_counter()
+        try:
+            paths.append(write_document(fmt, record, output_dir, stem))
+        except Exception as e:
+            log.error(f"[ERROR] Failed to write {fmt} output: {e}")
+        timings[f"export_{fmt}"] = time.perf_counter() - start
+    return record, paths, timings
+
+class ExportSession:
+    """Writes every result of a run in the selected formats.
+
+    Documents get one file per prompt; jsonl and parquet collect the whole run
+    into a single file that is opened on the first result. With workers > 0,
+    write_async parses and builds the documents in a process pool, admitting at
+    most max_pending results at a time (default twice the workers).
+    """
+
+    def __init__(self, formats=("docx",), output_dir=".", workers=0, max_pending=None):
+        self.formats = [f for f in dict.fromkeys(formats) if f in FORMATS]
+        self.output_dir = output_dir
+        self.collections = {}
+        self.collection_stem = output_stem("results")
+        # Collections are shared by every result, which may be written from several threads.
+        self.collection_lock = threading.Lock()
+        self.pool = None
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+        if workers:
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+
+            # spawn, not fork: the parent runs the Playwright driver's threads and event loop.
+            self.pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"),
+                                            initializer=metrics.setup_logging, initargs=(log.level,))
+            self.pending = asyncio.Semaphore(max_pending or 2 * workers)
+
+    def _collection(self, fmt):
+        if fmt not in self.collections:
+            extension, writer_class = COLLECTION_FORMATS[fmt]
+            self.collections[fmt] = writer_class(os.path.join(self.output_dir, self.collection_stem + extension))
+        return self.collections[fmt]
+
+    def write(self, prompt_text, elements, references_dict, cited_numbers):
+        """Exports one result; returns the paths written to (documents first)."""
+        record = build_record(prompt_text, elements, references_dict, cited_numbers)
+        stem = output_stem("response")
+        paths = []
+        for fmt in list(self.formats):
+            try:
+                with span(f"export_{fmt}"):
+                    if fmt in DOCUMENT_FORMATS:
+                        path = write_document(fmt, record, self.output_dir, stem)
+                    else:
+                        path = self._add_to_collection(fmt, record)
+                paths.append(path)
+            except ImportError as e:
+                log.error(f"[ERROR] {fmt} output is unavailable ({e}); skipping it.")
+                self.formats.remove(fmt)
+            except Exception as e:
+                log.error(f"[ERROR] Failed to write {fmt} output: {e}")
+        return paths
+
+    def _add_to_collection(self, fmt, record):
+        with self.collection_lock:
+            writer = self._collection(fmt)
+            writer.write(record)
+        log.info(f"[✓] Result added to '{writer.path}'")
+        return writer.path
+
+    async def write_async(self, prompt_text, elements, references_dict, cited_numbers, html_content=None,
+                          selectors=None, backend="auto"):
+        """Exports one result through the worker pool (parsing html_content there when elements
+        is None); waits for a free slot first, so snapshots never pile up in memory."""
+        async with self.pending:
+            try:
+                record, paths, timings = await asyncio.get_running_loop().run_in_executor(
+                    self.pool, export_job, prompt_text, elements, references_dict, cited_numbers,
+                    [f for f in self.formats if f in DOCUMENT_FORMATS], self.output_dir, html_content, selectors,
+                    backend)
+            except Exception as e:
+                log.error(f"[ERROR] Export worker failed: {e}")
+                return []
+        for name, seconds in timings.items():
+            observe_span(name, seconds)
+        for fmt in [f for f in self.formats if f in COLLECTION_FORMATS]:
+            try:
+                with span(f"export_{fmt}"):
+                    paths.append(self._add_to_collection(fmt, record))
+            except ImportError as e:
+                log.error(f"[ERROR] {fmt} output is unavailable ({e}); skipping it.")
+                self.formats.remove(fmt)
+            except Exception as e:
+                log.error(f"[ERROR] Failed to write {fmt} output: {e}")
+        return paths
+
+    def close(self):
+        if self.pool:
+            self.pool.shutdown()
+            self.pool = None
+        for fmt, writer in self.collections.items():
+            try:
+                writer.close()
+            except Exception as e:
+                log.error(f"[ERROR] Failed to finish {fmt} output: {e}")
+        self.collections = {}
@@ -0,0 +1,495 @@
+import hashlib
+import re
+from html.parser import HTMLParser
+from researcher.metrics import log
+
+IMAGE_CLASS = "_img_1k32x_74"
+CAPTION_CLASS = "_img-title_1k32x_79"
+
+# Fastest first; "auto" picks the first one that is installed.
+BACKEND_PREFERENCE = ["selectolax", "lxml", "stream"]
+BACKENDS = BACKEND_PREFERENCE + ["bs4"]
+
+# Text inside these elements is not part of get_text(), matching BeautifulSoup.
+SKIP_TEXT_TAGS = frozenset(["script", "style", "template", "rt", "rp"])
+
+VOID_TAGS = frozenset(["area", "base", "br", "col", "embed", "hr", "img", "input", "keygen", "link", "menuitem",
+                       "meta", "param", "source", "track", "wbr", "basefont", "bgsound", "command", "frame",
+                       "image", "isindex", "nextid", "spacer"])
+
+class Node:
+    """Minimal element used by every backend; children are Nodes and plain strings."""
+    __slots__ = ("tag", "attrs", "classes", "children", "parent")
+
+    def __init__(self, tag, attrs, parent=None):
+        self.tag = tag
+        self.attrs = attrs
+        self.classes = attrs.get("class", "").split()
+        self.children = []
+        self.parent = parent
+
+class Comment(str):
+    pass
+
+def iter_descendants(node):
+    """Yields the element descendants of node in document order."""
+    stack = [iter(node.children)]
+    while stack:
+        for child in stack[-1]:
+            if isinstance(child, Node):
+                yield child
+                stack.append(iter(child.children))
+                break
+        else:
+            stack.pop()
+
+def get_text(node):
+    """Equivalent of BeautifulSoup's get_text(strip=True)."""
+    parts = []
+    stack = [iter(node.children)]
+    while stack:
+        for child in stack[-1]:
+            if isinstance(child, Node):
+                if child.tag not in SKIP_TEXT_TAGS:
+                    stack.append(iter(child.children))
+                    break
+            elif not isinstance(child, Comment):
+                text = child.strip()
+                if text:
+                    parts.append(text)
+        else:
+            stack.pop()
+    return "".join(parts)
+
+def find_first(node, tag, cls=None):
+    for child in iter_descendants(node):
+        if child.tag == tag and (cls is None or cls in child.classes):
+            return child
+    return None
+
+def find_next_sibling(node, tag):
+    siblings = node.parent.children
+    for sibling in siblings[siblings.index(node) + 1:]:
+        if isinstance(sibling, Node) and sibling.tag == tag:
+            return sibling
+    return None
+
+def is_visible(node):
+    style = node.attrs.get("style", "")
+    return "display: none" not in style and "visibility: hidden" not in style
+
+# --- Backends: each turns HTML into a Node tree rooted at a synthetic "body". ---
+
+class _TreeBuilder(HTMLParser):
+    """Builds Nodes from html.parser events with BeautifulSoup's html.parser nesting rules."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.root = Node("body", {})
+        self.stack = [self.root]
+        self.open_counts = {}
+        self.already_closed_void = []
+
+    def _append_text(self, text, cls=str):
+        children = self.stack[-1].children
+        if cls is str and children and type(children[-1]) is str:
+            children[-1] += text
+        else:
+            children.append(cls(text))
+
+    def handle_starttag(self, tag, attrs, closing=False):
+        attr_dict = {name: value if value is not None else "" for name, value in attrs}
+        node = Node(tag, attr_dict, self.stack[-1])
+        self.stack[-1].children.append(node)
+        self.stack.append(node)
+        self.open_counts[tag] = self.open_counts.get(tag, 0) + 1
+        if tag in VOID_TAGS and not closing:
+            self._pop_to(tag)
+            self.already_closed_void.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs, closing=True)
+        self._pop_to(tag)
+
+    def handle_endtag(self, tag):
+        if tag in self.already_closed_void:
+            self.already_closed_void.remove(tag)
+        else:
+            self._pop_to(tag)
+
+    def _pop_to(self, tag):
+        while len(self.stack) > 1 and self.open_counts.get(tag):
+            node = self.stack.pop()
+            self.open_counts[node.tag] -= 1
+            if node.tag == tag:
+                break
+
+    def handle_data(self, data):
+        self._append_text(data)
+
+    def handle_comment(self, data):
+        self._append_text(data, Comment)
+
+def _parse_stream(html_content):
+    builder = _TreeBuilder()
+    builder.feed(html_content)
+    builder.close()
+    return builder.root
+
+# C parsers close <p> when a block element starts inside it, as browsers do when
+# parsing. The answer DOM is built by script and does nest blocks in <p>, so the
+# tag is renamed to one without implicit-close rules and renamed back afterwards.
+_P_TAG = re.compile(r"<(/?)p(?=[\s/>])", re.IGNORECASE)
+
+def _protect_p(html_content):
+    return _P_TAG.sub(r"<\1x-p", html_content)
+
+def _parse_lxml(html_content):
+    import lxml.html
+    from lxml import etree
+
+    root = Node("body", {})
+    if not html_content.strip():
+        return root
+    body = lxml.html.document_fromstring(_protect_p(html_content)).find("body")
+    if body is None:
+        return root
+
+    def convert(element, node):
+        if element.text:
+            node.children.append(element.text)
+        for child in element:
+            if isinstance(child.tag, str):
+                tag = "p" if child.tag == "x-p" else child.tag
+                child_node = Node(tag, dict(child.attrib), node)
+                node.children.append(child_node)
+                convert(child, child_node)
+            elif child.tag is etree.Comment:
+                node.children.append(Comment(child.text or ""))
+            if child.tail:
+                node.children.append(child.tail)
+
+    convert(body, root)
+    return root
+
+def _parse_selectolax(html_content):
+    from selectolax.lexbor import LexborHTMLParser
+
+    root = Node("body", {})
+    body = LexborHTMLParser(_protect_p(html_content)).body
+    if body is None:
+        return root
+
+    def convert(element, node):
+        for child in element.iter(include_text=True):
+            tag = child.tag
+            if tag == "-text":
+                node.children.append(child.text_content or "")
+            elif tag == "-comment":
+                node.children.append(Comment(child.comment_content or ""))
+            elif not tag.startswith(("-", "_")):
+                attrs = {name: value if value is not None else "" for name, value in child.attributes.items()}
+                child_node = Node("p" if tag == "x-p" else tag, attrs, node)
+                node.children.append(child_node)
+                convert(child, child_node)
+
+    convert(body, root)
+    return root
+
+def _parse_bs4(html_content):
+    from bs4 import BeautifulSoup
+    from bs4.element import Comment as SoupComment, NavigableString, Tag
+
+    root = Node("body", {})
+
+    def convert(element, node):
+        for child in element.children:
+            if isinstance(child, Tag):
+                attrs = {name: " ".join(value) if isinstance(value, list) else value for name, value in child.attrs.items()}
+                child_node = Node(child.name, attrs, node)
+                node.children.append(child_node)
+                convert(child, child_node)
+            elif isinstance(child, SoupComment):
+                node.children.append(Comment(child))
+            elif isinstance(child, NavigableString):
+                node.children.append(str(child))
+
+    convert(BeautifulSoup(html_content, "html.parser"), root)
+    return root
+
+PARSERS = {"stream": _parse_stream, "lxml": _parse_lxml, "selectolax": _parse_selectolax, "bs4": _parse_bs4}
+
+def backend_available(name):
+    if name in ("stream", "bs4"):
+        return True
+    try:
+        if name == "lxml":
+            import lxml.html  # noqa: F401
+        elif name == "selectolax":
+            from selectolax.lexbor import LexborHTMLParser  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+def resolve_backend(name="auto"):
+    if name == "auto":
+        return next(b for b in BACKEND_PREFERENCE if backend_available(b))
+    if name not in PARSERS:
+        raise ValueError(f"unknown parser backend '{name}', expected one of {BACKENDS} or 'auto'")
+    if not backend_available(name):
+        log.warning(f"[WARNING] Parser backend '{name}' is not installed, using 'stream'.")
+        return "stream"
+    return name
+
+def parse_html(html_content, backend="auto"):
+    return PARSERS[resolve_backend(backend)](html_content)
+
+# --- Selector matching for the content_block selectors. ---
+
+_COMPOUND = re.compile(r"""
+    (?P<tag>[a-zA-Z][\w-]*|\*)?
+    (?P<rest>(?:\.[\w-]+|\#[\w-]+|\[\s*[\w-]+\s*(?:[~^$*]?=\s*(?:'[^']*'|"[^"]*"|[^\]\s]+)\s*)?\])*)
+    """, re.VERBOSE)
+_PART = re.compile(r"""\.(?P<cls>[\w-]+)|\#(?P<id>[\w-]+)|\[\s*(?P<attr>[\w-]+)\s*(?:(?P<op>[~^$*]?=)\s*(?P<value>'[^']*'|"[^"]*"|[^\]\s]+)\s*)?\]""")
+
+def _compile_compound(text):
+    match = _COMPOUND.fullmatch(text)
+    if not text or not match:
+        raise ValueError(f"unsupported selector '{text}'")
+    tag = match.group("tag")
+    checks = []
+    for part in _PART.finditer(match.group("rest")):
+        if part.group("cls"):
+            checks.append(("class", part.group("cls")))
+        elif part.group("id"):
+            checks.append(("=", "id", part.group("id")))
+        else:
+            value = part.group("value")
+            if value and value[0] in "'\"":
+                value = value[1:-1]
+            checks.append((part.group("op") or "has", part.group("attr"), value))
+    return (None if tag in (None, "*") else tag.lower()), checks
+
+def _matches_compound(node, compound):
+    tag, checks = compound
+    if tag and node.tag != tag:
+        return False
+    for check in checks:
+        if check[0] == "class":
+            if check[1] not in node.classes:
+                return False
+            continue
+        op, name, value = check
+        actual = node.attrs.get(name)
+        if actual is None:
+            return False
+        if (op == "=" and actual != value or op == "*=" and value not in actual
+                or op == "^=" and not actual.startswith(value) or op == "$=" and not actual.endswith(value)
+                or op == "~=" and value not in actual.split()):
+            return False
+    return True
+
+def compile_selector(selector):
+    """Compiles a comma-separated list of compound selectors joined by descendant/child combinators."""
+    compiled = []
+    for alternative in selector.split(","):
+        tokens = re.sub(r"\s*>\s*", " > ", alternative.strip()).split()
+        if not tokens or tokens[0] == ">" or tokens[-1] == ">":
+            raise ValueError(f"unsupported selector '{alternative}'")
+        steps = []
+        combinator = None
+        for token in tokens:
+            if token == ">":
+                combinator = ">"
+                continue
+            steps.append((combinator, _compile_compound(token)))
+            combinator = " "
+        compiled.append(steps)
+    return compiled
+
+def _matches_steps(node, steps, index):
+    if not _matches_compound(node, steps[index][1]):
+        return False
+    if index == 0:
+        return True
+    combinator = steps[index][0]
+    parent = node.parent
+    if combinator == ">":
+        return parent is not None and parent.parent is not None and _matches_steps(parent, steps, index - 1)
+    while parent is not None and parent.parent is not None:
+        if _matches_steps(parent, steps, index - 1):
+            return True
+        parent = parent.parent
+    return False
+
+def matches(node, compiled):
+    return any(_matches_steps(node, steps, len(steps) - 1) for steps in compiled)
+
+def select_roots(root, selectors):
+    """Returns nodes matching any selector that are not nested inside another match, in document order."""
+    compiled = compile_selector(", ".join(selectors))
+    roots = []
+    stack = [iter(root.children)]
+    while stack:
+        for child in stack[-1]:
+            if isinstance(child, Node):
+                if matches(child, compiled):
+                    roots.append(child)
+                else:
+                    stack.append(iter(child.children))
+                    break
+        else:
+            stack.pop()
+    return roots
+
+# --- Element extraction. ---
+
+def _image(img, container):
+    caption_node = find_first(container, "div", CAPTION_CLASS)
+    caption = get_text(caption_node) if caption_node else ""
+    if not caption:
+        caption = img.attrs.get("alt", "")
+    em = find_next_sibling(container, "em")
+    if not em and container.parent:
+        em = find_first(container.parent, "em")
+    return {"type": "image", "url": img.attrs["src"], "caption": caption, "source": get_text(em) if em else ""}
+
+def extract_image_info(img_container):
+    """Image elements for an image container: its direct <img>s, then any nested image containers."""
+    images = []
+    for img in img_container.children:
+        if isinstance(img, Node) and img.tag == "img" and img.attrs.get("src"):
+            images.append(_image(img, img_container))
+    for nested in iter_descendants(img_container):
+        if nested.tag == "div" and IMAGE_CLASS in nested.classes:
+            img = find_first(nested, "img")
+            if img and img.attrs.get("src"):
+                images.append(_image(img, nested))
+    return images
+
+def block_elements(block):
+    """Elements of one content block in order, before cross-block de-duplication."""
+    elements = []
+    children = block.children
+    i = 0
+    while i < len(children):
+        elem = children[i]
+        if not isinstance(elem, Node) or not is_visible(elem):
+            i += 1
+            continue
+        tag = elem.tag
+        if tag == "p":
+            elements.append({"type": "paragraph", "text": get_text(elem)})
+            for img_div in iter_descendants(elem):
+                if img_div.tag == "div" and IMAGE_CLASS in img_div.classes:
+                    elements.extend(extract_image_info(img_div))
+            if i + 1 < len(children):
+                next_elem = children[i + 1]
+                if isinstance(next_elem, Node) and next_elem.tag == "div" and IMAGE_CLASS in next_elem.classes:
+                    elements.extend(extract_image_info(next_elem))
+                    i += 1
+        elif tag in ("ul", "ol"):
+            for li in elem.children:
+                if isinstance(li, Node) and li.tag == "li":
+                    elements.append({"type": "list_item", "text": get_text(li)})
+        elif tag == "table":
+            rows = [[get_text(cell) for cell in iter_descendants(row) if cell.tag in ("td", "th")]
+                    for row in iter_descendants(elem) if row.tag == "tr"]
+            if rows:
+                elements.append({"type": "table", "rows": rows})
+        elif tag == "div" and IMAGE_CLASS in elem.classes:
+            elements.extend(extract_image_info(elem))
+        i += 1
+    return elements
+
+def dedupe_elements(elements):
+    """Drops empty and repeated paragraphs, list items and image URLs (tables are kept)."""
+    seen = set()
+    unique = []
+    for element in elements:
+        kind = element["type"]
+        if kind == "table":
+            unique.append(element)
+            continue
+        key = element["url"] if kind == "image" else element["text"]
+        if key and key not in seen:
+            seen.add(key)
+            unique.append(element)
+    return unique
+
+def extract_elements(html_content, selectors, backend="auto"):
+    """Parses the content snapshot into a de-duplicated list of typed element dicts."""
+    blocks = select_roots(parse_html(html_content, backend), selectors)
+    log.info(f"[*] Found {len(blocks)} content blocks in HTML.")
+    elements = []
+    for block in blocks:
+        elements.extend(block_elements(block))
+    return dedupe_elements(elements)
+
+def block_fingerprint(block_html):
+    return hashlib.blake2b(block_html.encode("utf-8"), digest_size=16).hexdigest()
+
+class IncrementalExtractor:
+    """Parses content blocks as soon as they stop changing between snapshots.
+
+    Snapshots are lists of (fingerprint, outerHTML) pairs, as returned by the
+    page; outerHTML is None for blocks whose fingerprint is already held, so
+    only changed blocks cross the wire. Plain HTML strings are fingerprinted
+    here instead. A block is parsed again only when its fingerprint changes.
+    """
+
+    def __init__(self, backend="auto"):
+        self.backend = resolve_backend(backend)
+        self.previous = set()
+        self.parsed = {}
+        self.html = {}
+        self.order = []
+        self.stats = {"parsed_early": 0, "parsed_late": 0, "reused": 0}
+
+    def _parse_block(self, block_html):
+        root = PARSERS[self.backend](block_html)
+        block = next((child for child in root.children if isinstance(child, Node)), None)
+        return block_elements(block) if block else []
+
+    def known(self):
+        """Fingerprints whose HTML is held, for the page to skip."""
+        return list(self.html)
+
+    def _receive(self, blocks):
+        pairs = [(block_fingerprint(block), block) if isinstance(block, str) else tuple(block) for block in blocks]
+        self.html = {fingerprint: self.html[fingerprint] if block_html is None else block_html
+                     for fingerprint, block_html in pairs}
+        self.order = [fingerprint for fingerprint, _ in pairs]
+        return self.order
+
+    def combined_html(self):
+        """The latest snapshot's blocks joined in document order."""
+        return "".join(self.html[fingerprint] for fingerprint in self.order)
+
+    def update(self, blocks, parse=True):
+        """Takes a snapshot and parses the blocks unchanged since the last one (with parse=False
+        only the HTML is kept, for a caller that parses it elsewhere)."""
+        fingerprints = self._receive(blocks)
+        if not parse:
+            return
+        for fingerprint in fingerprints:
+            if fingerprint in self.previous and fingerprint not in self.parsed:
+                self.parsed[fingerprint] = self._parse_block(self.html[fingerprint])
+                self.stats["parsed_early"] += 1
+        current = set(fingerprints)
+        self.parsed = {fp: elements for fp, elements in self.parsed.items() if fp in current}
+        self.previous = current
+
+    def assemble(self, blocks):
+        """Returns the de-duplicated elements of the final snapshot, parsing only blocks not seen stable."""
+        elements = []
+        for fingerprint in self._receive(blocks):
+            if fingerprint in self.parsed:
+                self.stats["reused"] += 1
+            else:
+                self.parsed[fingerprint] = self._parse_block(self.html[fingerprint])
+                self.stats["parsed_late"] += 1
+            elements.extend(self.parsed[fingerprint])
+        log.info(f"[*] Assembled {len(self.order)} content blocks: {self.stats['reused']} parsed while waiting, "
+                 f"{self.stats['parsed_late']} parsed after completion.")
+        return dedupe_elements(elements)
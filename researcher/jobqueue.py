@@ -0,0 +1,159 @@
+import json
+import os
+import socket
+import sqlite3
+import time
+from researcher.cache import prompt_key
+
+DEFAULT_QUEUE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "researcher-1", "queue.sqlite3")
+DEFAULT_LEASE = 300
+DEFAULT_MAX_ATTEMPTS = 3
+# Seconds before a failed job is offered again: RETRY_DELAY, doubled per attempt, capped.
+RETRY_DELAY = 30
+MAX_RETRY_DELAY = 600
+
+def worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+class JobQueue:
+    """SQLite queue of prompts shared by worker processes.
+
+    A worker claims the highest-priority job that is queued (or whose lease
+    expired) and must renew its lease with heartbeat() until it completes or
+    fails the job. Failed jobs are retried after a backoff until they have
+    used max_attempts; an expired lease counts as a failed attempt.
+
+    Claims are exclusive as far as SQLite's file locking is, which holds on one
+    host but not reliably on network filesystems such as NFS. Lease expiry also
+    compares time.time() across workers, so hosts sharing a queue file need
+    working POSIX locks and synchronized clocks, or jobs can be leased twice.
+    """
+
+    def __init__(self, path=DEFAULT_QUEUE_PATH, lease=DEFAULT_LEASE):
+        self.path = path
+        self.lease = lease
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Autocommit, so claims can take the write lock up front with BEGIN IMMEDIATE.
+        # Workers renew leases from a thread so a held lock does not stall their event loop;
+        # calls are still made one at a time.
+        self.db = sqlite3.connect(path, timeout=60, isolation_level=None, check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                key TEXT NOT NULL UNIQUE,
+                prompt TEXT NOT NULL,
+                priority INTEGER NOT NULL DEFAULT 0,
+                state TEXT NOT NULL DEFAULT 'queued',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                max_attempts INTEGER NOT NULL,
+                worker TEXT,
+                lease_until REAL,
+                available_at REAL NOT NULL,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL,
+                output TEXT,
+                error TEXT,
+                metrics TEXT
+            )""")
+        self.db.execute("CREATE INDEX IF NOT EXISTS jobs_claim ON jobs (state, priority DESC, id)")
+
+    def enqueue(self, prompts, priority=0, max_attempts=DEFAULT_MAX_ATTEMPTS):
+        """Adds prompts not already in the queue; returns how many were added."""
+        now = time.time()
+        added = 0
+        for prompt_text in prompts:
+            added += self.db.execute(
+                "INSERT OR IGNORE INTO jobs (key, prompt, priority, max_attempts, available_at, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)", (prompt_key(prompt_text), prompt_text, priority, max_attempts, now, now)
+            ).rowcount
+        return added
+
+    def claim(self, worker):
+        """Leases the next job to `worker`; returns it as a dict, or None when nothing is due."""
+        now = time.time()
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            # Leases that ran out used up an attempt; jobs out of attempts fail here.
+            self.db.execute("UPDATE jobs SET state = 'failed', finished_at = ?, error = 'lease expired', worker = NULL "
+                            "WHERE state = 'leased' AND lease_until < ? AND attempts >= max_attempts", (now, now))
+            row = self.db.execute(
+                "SELECT * FROM jobs WHERE (state = 'queued' AND available_at <= ?) OR (state = 'leased' AND lease_until < ?) "
+                "ORDER BY priority DESC, id LIMIT 1", (now, now)).fetchone()
+            if row:
+                self.db.execute("UPDATE jobs SET state = 'leased', worker = ?, lease_until = ?, attempts = attempts + 1, "
+                                "started_at = ? WHERE id = ?", (worker, now + self.lease, now, row["id"]))
+                row = self.db.execute("SELECT * FROM jobs WHERE id = ?", (row["id"],)).fetchone()
+            self.db.execute("COMMIT")
+        except BaseException:
+            self.db.execute("ROLLBACK")
+            raise
+        return dict(row) if row else None
+
+    def heartbeat(self, job_id, worker):
+        """Extends the lease; returns False if the job is no longer leased to this worker."""
+        return self.db.execute("UPDATE jobs SET lease_until = ? WHERE id = ? AND worker = ? AND state = 'leased'",
+                               (time.time() + self.lease, job_id, worker)).rowcount == 1
+
+    def complete(self, job_id, worker, output, metrics=None):
+        return self.db.execute(
+            "UPDATE jobs SET state = 'done', finished_at = ?, output = ?, error = NULL, metrics = ?, lease_until = NULL "
+            "WHERE id = ? AND worker = ? AND state = 'leased'",
+            (time.time(), output, json.dumps(metrics) if metrics else None, job_id, worker)).rowcount == 1
+
+    def fail(self, job_id, worker, error, metrics=None, retry=True):
+        """Requeues the job after a backoff, or marks it failed once it has no attempts left
+        (or right away without retry, for errors that would repeat)."""
+        now = time.time()
+        row = self.db.execute("SELECT attempts, max_attempts FROM jobs WHERE id = ? AND worker = ? AND state = 'leased'",
+                              (job_id, worker)).fetchone()
+        if not row:
+            return False
+        encoded = json.dumps(metrics) if metrics else None
+        if not retry or row["attempts"] >= row["max_attempts"]:
+            self.db.execute("UPDATE jobs SET state = 'failed', finished_at = ?, error = ?, metrics = ?, lease_until = NULL "
+                            "WHERE id = ?", (now, error, encoded, job_id))
+        else:
+            delay = min(MAX_RETRY_DELAY, RETRY_DELAY * 2 ** (row["attempts"] - 1))
+            self.db.execute("UPDATE jobs SET state = 'queued', worker = NULL, lease_until = NULL, available_at = ?, "
+                            "error = ?, metrics = ? WHERE id = ?", (now + delay, error, encoded, job_id))
+        return True
+
+    def requeue(self, states=("failed",)):
+        """Gives jobs in the given states a fresh set of attempts; returns how many."""
+        marks = ", ".join("?" for _ in states)
+        return self.db.execute(f"UPDATE jobs SET state = 'queued', attempts = 0, worker = NULL, lease_until = NULL, "
+                               f"available_at = ?, error = NULL WHERE state IN ({marks})",
+                               (time.time(), *states)).rowcount
+
+    def status(self, window=3600):
+        """Queue depth by state, active workers and throughput over the last `window` seconds."""
+        now = time.time()
+        counts = {state: 0 for state in ("queued", "leased", "done", "failed")}
+        for row in self.db.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state"):
+            counts[row[0]] = row[1]
+        finished = self.db.execute(
+            "SELECT COUNT(*), AVG(finished_at - started_at) FROM jobs WHERE state = 'done' AND finished_at >= ?",
+            (now - window,)).fetchone()
+        oldest = self.db.execute("SELECT MIN(created_at) FROM jobs WHERE state = 'queued'").fetchone()[0]
+        workers = [dict(row) for row in self.db.execute(
+            "SELECT worker, prompt, attempts, started_at, lease_until FROM jobs WHERE state = 'leased' AND lease_until >= ? "
+            "ORDER BY started_at", (now,))]
+        failures = [dict(row) for row in self.db.execute(
+            "SELECT prompt, attempts, error FROM jobs WHERE state = 'failed' ORDER BY finished_at DESC LIMIT 10")]
+        return {
+            "counts": counts,
+            "window": window,
+            "done_in_window": finished[0],
+            "per_hour": finished[0] * 3600 / window,
+            "avg_seconds": finished[1],
+            "oldest_queued_age": now - oldest if oldest else None,
+            "workers": workers,
+            "recent_failures": failures,
+        }
+
+    def close(self):
+        self.db.close()
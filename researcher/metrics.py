@@ -0,0 +1,199 @@
+import contextlib
+import contextvars
+import json
+import logging
+import os
+import sys
+import time
+
+# Console output keeps its "[*]", "[ERROR]", ... prefixes; the level decides what is shown.
+log = logging.getLogger("researcher")
+# One JSON object per line: a record per finished span plus a summary per run.
+metrics_log = logging.getLogger("researcher.metrics")
+metrics_log.propagate = False
+
+LOG_LEVELS = ["DEBUG", "INFO", "WARNING", "ERROR"]
+
+_prompt = contextvars.ContextVar("prompt", default=None)
+
+class _StdoutHandler(logging.StreamHandler):
+    """Writes to whatever sys.stdout is when a message is logged, so redirect_stdout still works."""
+
+    @property
+    def stream(self):
+        return sys.stdout
+
+    @stream.setter
+    def stream(self, value):
+        pass
+
+def setup_logging(level="INFO", metrics_path=None):
+    """Sends console messages to stdout and, if metrics_path is set, JSON metric lines there ("-" for stderr)."""
+    handler = _StdoutHandler()
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    log.handlers = [handler]
+    log.setLevel(level)
+    log.propagate = False
+    metrics_log.handlers = []
+    if metrics_path:
+        metrics_handler = logging.StreamHandler(sys.stderr) if metrics_path == "-" else logging.FileHandler(metrics_path)
+        metrics_handler.setFormatter(logging.Formatter("%(message)s"))
+        metrics_log.addHandler(metrics_handler)
+        metrics_log.setLevel(logging.INFO)
+
+def _label_value(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+class Metrics:
+    """Span timings (count, total, max per name), counters and info labels for a run or batch."""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.spans = {}
+        self.counters = {}
+        self.info = {}
+        self.started_at = time.time()
+
+    def observe(self, name, seconds):
+        stats = self.spans.setdefault(name, {"count": 0, "total": 0.0, "max": 0.0})
+        stats["count"] += 1
+        stats["total"] += seconds
+        stats["max"] = max(stats["max"], seconds)
+
+    def incr(self, name, value=1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def snapshot(self):
+        return {
+            "spans": {name: dict(stats) for name, stats in self.spans.items()},
+            "counters": dict(self.counters),
+            "info": {name: dict(labels) for name, labels in self.info.items()},
+            "elapsed": time.time() - self.started_at,
+        }
+
+    def to_prometheus(self):
+        lines = [
+            "# HELP researcher_phase_seconds Time spent in each phase.",
+            "# TYPE researcher_phase_seconds summary",
+        ]
+        for name, stats in sorted(self.spans.items()):
+            lines.append(f'researcher_phase_seconds_sum{{phase="{name}"}} {stats["total"]:.6f}')
+            lines.append(f'researcher_phase_seconds_count{{phase="{name}"}} {stats["count"]}')
+        lines.extend(["# HELP researcher_phase_max_seconds Slowest occurrence of each phase.",
+                      "# TYPE researcher_phase_max_seconds gauge"])
+        for name, stats in sorted(self.spans.items()):
+            lines.append(f'researcher_phase_max_seconds{{phase="{name}"}} {stats["max"]:.6f}')
+        for name, value in sorted(self.counters.items()):
+            lines.append(f"# TYPE researcher_{name}_total counter")
+            lines.append(f"researcher_{name}_total {value}")
+        for name, labels in sorted(self.info.items()):
+            rendered = ",".join(f'{key}="{_label_value(value)}"' for key, value in labels.items())
+            lines.append(f"# TYPE researcher_{name}_info gauge")
+            lines.append(f"researcher_{name}_info{{{rendered}}} 1")
+        lines.extend(["# TYPE researcher_run_started_seconds gauge", f"researcher_run_started_seconds {self.started_at:.3f}"])
+        return "\n".join(lines) + "\n"
+
+METRICS = Metrics()
+
+def emit(event, **fields):
+    if metrics_log.handlers:
+        record = {"ts": round(time.time(), 3), "event": event}
+        if _prompt.get() is not None:
+            record["prompt"] = _prompt.get()
+        record.update(fields)
+        metrics_log.info(json.dumps(record, ensure_ascii=False))
+
+def incr(name, value=1):
+    METRICS.incr(name, value)
+
+def set_info(name, **labels):
+    """Records a string fact about the run (exported as a Prometheus info gauge)."""
+    METRICS.info[name] = labels
+    emit("info", name=name, **labels)
+
+@contextlib.contextmanager
+def span(name, **fields):
+    """Times the block as phase `name`; works around awaits as well."""
+    start = time.perf_counter()
+    status = "ok"
+    try:
+        yield
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        observe_span(name, time.perf_counter() - start, status, **fields)
+
+def observe_span(name, seconds, status="ok", **fields):
+    """Records a phase timed elsewhere, e.g. in an export worker process."""
+    METRICS.observe(name, seconds)
+    emit("span", name=name, seconds=round(seconds, 4), status=status, **fields)
+
+@contextlib.contextmanager
+def prompt_scope(prompt_text):
+    """Tags the metric lines emitted inside the block (and its tasks) with the prompt."""
+    token = _prompt.set(prompt_text)
+    try:
+        yield
+    finally:
+        _prompt.reset(token)
+
+def snapshot_delta(before, after):
+    """What a piece of work added to the totals, given METRICS.snapshot() before and after it."""
+    spans = {}
+    for name, stats in after["spans"].items():
+        previous = before["spans"].get(name, {"count": 0, "total": 0.0})
+        if stats["count"] != previous["count"]:
+            spans[name] = {"count": stats["count"] - previous["count"], "total": round(stats["total"] - previous["total"], 4)}
+    counters = {name: value - before["counters"].get(name, 0) for name, value in after["counters"].items()
+                if value != before["counters"].get(name, 0)}
+    return {"seconds": round(after["elapsed"] - before["elapsed"], 3), "spans": spans, "counters": counters}
+
+def write_textfile(path):
+    """Writes the Prometheus text exposition atomically, as node_exporter's textfile collector expects."""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(METRICS.to_prometheus())
+    os.replace(tmp_path, path)
+
+def format_summary():
+    parts = [f"{name} {stats['total']:.1f}s" + (f" ({stats['count']}x)" if stats["count"] > 1 else "")
+             for name, stats in METRICS.spans.items()]
+    counters = [f"{name}={value}" for name, value in METRICS.counters.items()]
+    return "Phases: " + (", ".join(parts) or "none") + ". Counters: " + (", ".join(counters) or "none") + "."
+
+def finish_run(textfile_path=None):
+    """Emits the run summary line and, if asked, the Prometheus textfile."""
+    emit("run_summary", **METRICS.snapshot())
+    if textfile_path:
+        try:
+            write_textfile(textfile_path)
+            log.info(f"[*] Metrics written to {textfile_path}")
+        except OSError as e:
+            log.error(f"[ERROR] Failed to write metrics textfile: {e}")
+
+_protocol_counter_installed = False
+
+def install_protocol_counter():
+    """Counts messages sent to the browser driver (one per CDP round trip or event subscription)."""
+    global _protocol_counter_installed
+    if _protocol_counter_installed:
+        return
+    try:
+        from playwright._impl._connection import Connection
+    except ImportError:
+        return
+    send = Connection._send_message_to_server
+
+    def counting_send(self, *args, **kwargs):
+        METRICS.incr("cdp_calls")
+        return send(self, *args, **kwargs)
+
+    Connection._send_message_to_server = counting_send
+    _protocol_counter_installed = True
+
+# Until a script configures logging, behave like the plain prints this replaced.
+if not log.handlers:
+    setup_logging()
@@ -0,0 +1,276 @@
+import asyncio
+import json
+import re
+from html import escape
+
+# Field names tried, in order, when looking for the answer text, the reference
+# list and the end-of-stream marker inside captured JSON events.
+STREAM_FIELDS = {
+    "answer": ["answer", "content", "delta", "text"],
+    "references": ["references", "refs", "citations", "sources", "papers"],
+    "done": ["done", "finished", "finish", "is_end", "end"],
+    "ref_number": ["index", "number", "num", "idx"],
+    "ref_title": ["title", "name"],
+    "ref_authors": ["authors", "author", "author_list"],
+    "ref_date": ["date", "publish_date", "publication_date", "year"],
+    "ref_journal": ["journal", "venue", "publication", "source"],
+    "ref_doi": ["doi", "DOI"],
+}
+
+# Only streamed responses can carry the answer; plain JSON responses are only
+# searched for reference lists.
+STREAM_CONTENT_TYPES = ("text/event-stream", "application/x-ndjson")
+JSON_CONTENT_TYPES = ("application/json",)
+
+# Class of the wrapper emitted around captured answers, so the DOM parser treats
+# them like a rendered answer block.
+ANSWER_BLOCK_CLASS = "_content_1k32x_12"
+
+def parse_stream_payload(body):
+    """Returns the JSON events contained in an SSE, NDJSON or plain JSON body."""
+    text = body.decode("utf-8", "replace") if isinstance(body, bytes) else body
+    stripped = text.strip()
+    if stripped.startswith(("{", "[")):
+        try:
+            data = json.loads(stripped)
+            return data if isinstance(data, list) else [data]
+        except ValueError:
+            pass
+    events = []
+    for line in text.splitlines():
+        line = line.strip()
+        if line.startswith("data:"):
+            line = line[5:].strip()
+        if not line or line == "[DONE]" or not line.startswith(("{", "[")):
+            continue
+        try:
+            data = json.loads(line)
+        except ValueError:
+            continue
+        events.extend(data if isinstance(data, list) else [data])
+    return events
+
+def _first(mapping, names):
+    for name in names:
+        value = mapping.get(name)
+        if value not in (None, "", []):
+            return value
+    return None
+
+def _first_named(mapping, names):
+    for name in names:
+        value = mapping.get(name)
+        if value not in (None, "", []):
+            return name, value
+    return None, None
+
+def _walk(value):
+    yield value
+    if isinstance(value, dict):
+        for child in value.values():
+            yield from _walk(child)
+    elif isinstance(value, list):
+        for child in value:
+            yield from _walk(child)
+
+def _normalize_authors(value):
+    if isinstance(value, str):
+        return [a.strip() for a in value.split(",") if a.strip()]
+    authors = []
+    for author in value or []:
+        if isinstance(author, dict):
+            author = _first(author, ["name", "full_name", "display_name"]) or ""
+        if author:
+            authors.append(str(author))
+    return authors
+
+def normalize_reference(raw, position, shift=0):
+    number = _first(raw, STREAM_FIELDS["ref_number"])
+    return {
+        "number": str(int(number) + shift if shift else number) if number is not None else str(position + 1),
+        "title": str(_first(raw, STREAM_FIELDS["ref_title"]) or ""),
+        "authors": _normalize_authors(_first(raw, STREAM_FIELDS["ref_authors"])),
+        "date": str(_first(raw, STREAM_FIELDS["ref_date"]) or ""),
+        "journal": str(_first(raw, STREAM_FIELDS["ref_journal"]) or ""),
+        "doi": str(_first(raw, STREAM_FIELDS["ref_doi"]) or ""),
+    }
+
+def normalize_references(refs):
+    """Normalizes a reference list. Indices counted from 0 are shifted by one, since the
+    answer's [n] markers count from 1."""
+    shift = 0
+    try:
+        if min(int(n) for n in (_first(raw, STREAM_FIELDS["ref_number"]) for raw in refs) if n is not None) == 0:
+            shift = 1
+    except (TypeError, ValueError):
+        pass
+    return [normalize_reference(raw, position, shift) for position, raw in enumerate(refs)]
+
+def is_done(event):
+    return any(isinstance(node, dict) and any(node.get(name) is True for name in STREAM_FIELDS["done"])
+               for node in _walk(event))
+
+class AnswerFolder:
+    """Folds streamed events into the answer text, one event at a time.
+
+    Some streams resend the whole answer so far, others only the delta. A "delta"
+    field, or the first chunk that does not extend the answer, settles that for the
+    whole stream; until then each chunk is taken as a resend, and only the lengths
+    of the chunks are kept, since each one is a prefix of the current answer.
+    """
+
+    def __init__(self):
+        self.answer = ""
+        self.deltas = None
+        self.lengths = []
+        self.finished = False
+
+    def add(self, event):
+        if is_done(event):
+            self.finished = True
+        if not isinstance(event, dict):
+            return
+        name, chunk = _first_named(event, STREAM_FIELDS["answer"])
+        if isinstance(chunk, dict):
+            name, chunk = _first_named(chunk, STREAM_FIELDS["answer"])
+        if not isinstance(chunk, str):
+            return
+        if self.deltas is None:
+            if name != "delta" and chunk.startswith(self.answer):
+                self.lengths.append(len(chunk))
+                self.answer = chunk
+                return
+            self.deltas = True
+            self.answer = "".join(self.answer[:length] for length in self.lengths)
+            self.lengths = None
+        self.answer += chunk
+
+def extract_stream_data(stream_events, json_events=()):
+    """Folds captured events into (answer_text, references, finished)."""
+    references = {}
+    folder = AnswerFolder()
+    for event in json_events:
+        if is_done(event):
+            folder.finished = True
+    for event in stream_events:
+        folder.add(event)
+    for event in list(json_events) + list(stream_events):
+        for node in _walk(event):
+            if not isinstance(node, dict):
+                continue
+            refs = _first(node, STREAM_FIELDS["references"])
+            if isinstance(refs, list) and refs and all(isinstance(r, dict) for r in refs):
+                for ref in normalize_references(refs):
+                    if ref["title"]:
+                        references[ref["number"]] = ref
+    return folder.answer, references, folder.finished
+
+def answer_to_html(answer):
+    """Renders a markdown-ish answer as the HTML structure the DOM parser expects."""
+    parts = [f'<div class="{ANSWER_BLOCK_CLASS}">']
+    list_items = []
+    table_rows = []
+
+    def flush():
+        if list_items:
+            parts.append("<ul>" + "".join(f"<li>{escape(item)}</li>" for item in list_items) + "</ul>")
+            list_items.clear()
+        if table_rows:
+            rows = "".join("<tr>" + "".join(f"<td>{escape(cell)}</td>" for cell in row) + "</tr>" for row in table_rows)
+            parts.append(f"<table>{rows}</table>")
+            table_rows.clear()
+
+    for line in answer.splitlines():
+        line = line.strip()
+        if line.startswith("|") and line.endswith("|"):
+            cells = [cell.strip() for cell in line.strip("|").split("|")]
+            if not all(re.fullmatch(r":?-{3,}:?", cell) for cell in cells):
+                table_rows.append(cells)
+            continue
+        if table_rows:
+            flush()
+        list_match = re.match(r"^(?:[-*+]|\d+\.)\s+(.*)", line)
+        if list_match:
+            list_items.append(list_match.group(1))
+            continue
+        flush()
+        if line:
+            parts.append(f"<p>{escape(line.lstrip('#').strip())}</p>")
+    flush()
+    parts.append("</div>")
+    return "".join(parts)
+
+class StreamCapture:
+    """Collects answer and reference payloads from a page's network traffic."""
+
+    def __init__(self, page, grace_ms=1500):
+        self.page = page
+        self.grace_ms = grace_ms
+        self.stream_events = []
+        self.json_events = []
+        self.folder = AnswerFolder()
+        self.tasks = set()
+        self.stream_closed = asyncio.Event()
+        page.on("response", self._on_response)
+        page.on("websocket", self._on_websocket)
+
+    def detach(self):
+        self.page.remove_listener("response", self._on_response)
+        self.page.remove_listener("websocket", self._on_websocket)
+        for task in list(self.tasks):
+            task.cancel()
+
+    def _on_response(self, response):
+        if response.request.resource_type not in ("fetch", "xhr", "eventsource"):
+            return
+        content_type = response.headers.get("content-type", "")
+        if not content_type.startswith(STREAM_CONTENT_TYPES + JSON_CONTENT_TYPES):
+            return
+        task = asyncio.ensure_future(self._read_response(response, content_type.startswith(STREAM_CONTENT_TYPES)))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def _read_response(self, response, streamed):
+        try:
+            # body() resolves once the response, including an SSE stream, has closed.
+            body = await response.body()
+        except Exception:
+            return
+        events = parse_stream_payload(body)
+        if streamed:
+            self._add_stream_events(events)
+            self._check_closed(force=bool(events))
+        else:
+            self.json_events.extend(events)
+
+    def _on_websocket(self, websocket):
+        websocket.on("framereceived", self._on_frame)
+        websocket.on("close", lambda _: self._check_closed(force=True))
+
+    def _on_frame(self, payload):
+        events = parse_stream_payload(payload)
+        if events:
+            self._add_stream_events(events)
+            self._check_closed()
+
+    def _add_stream_events(self, events):
+        self.stream_events.extend(events)
+        for event in events:
+            self.folder.add(event)
+
+    def _check_closed(self, force=False):
+        if self.folder.answer and (self.folder.finished or force):
+            self.stream_closed.set()
+
+    async def wait(self):
+        """Waits for a recognized answer stream to close and returns the captured result."""
+        await self.stream_closed.wait()
+        # References frequently arrive in a separate request right after the answer.
+        await asyncio.sleep(self.grace_ms / 1000)
+        return self.result()
+
+    def result(self):
+        answer, references, _ = extract_stream_data(self.stream_events, self.json_events)
+        if not answer:
+            return None
+        return {"html": answer_to_html(answer), "references": references}
@@ -0,0 +1,1443 @@
+import asyncio
+import os
+import time
+import weakref
+import argparse
+import re
+from researcher.netcapture import StreamCapture
+from researcher.cache import DEFAULT_CACHE_PATH, DEFAULT_MAX_BYTES, DEFAULT_TTL, ResultCache
+from researcher.refstore import DEFAULT_REFSTORE_PATH, ReferenceStore, citation_identities
+from researcher.extraction import BACKENDS, IncrementalExtractor, extract_elements
+from researcher.exporters import FORMATS, REFERENCE_FIELDS, ExportSession, format_reference
+from researcher.checkpoint import DEFAULT_RUNS_DIR, Checkpoint, find_checkpoints, prune_checkpoints
+from researcher.assets import DEFAULT_ASSET_DIR, AssetStore, attach_images, fetch_images
+from researcher.selector_cache import DEFAULT_SELECTOR_CACHE_PATH, SelectorResolver
+from researcher.scheduler import RETRY_POLICY, CircuitBreaker, PhaseError, Scheduler, SiteError, failure_phase, parse_retry_after
+from researcher import recording
+from researcher import metrics
+from researcher.metrics import LOG_LEVELS, incr, log, prompt_scope, span
+
+SELECTORS = {
+    "modal": "div._modal_7bdw1_1",
+    "close_btn": "div._close_7bdw1_31",
+    "prompt_textarea": "textarea",
+    "submit_btn": "button[type='submit'][class*='_buttons-send-wrapper_']",
+    "content_block": [
+        "div._content_1k32x_12",
+        "div._container_q86iu_1",
+        "div[data-testid='virtuoso-item-list'] > div",
+        "div._content_6r4i1_29 div._container_q86iu_1"
+    ],
+    "reference_scroller": "div._virtuoso_6r4i1_26",
+    "reference_block": [
+        "div[data-index] div._container_q86iu_1",
+        "div[data-item-index] div._container_q86iu_1",
+        "div._container_q86iu_1",
+        "div[data-testid='virtuoso-item-list'] > div",
+        "div._content_6r4i1_29 div._container_q86iu_1"
+    ],
+    "reference_index": "div._index_q86iu_12",
+    "reference_title": "div._title-paragraph_1doxh_4 p",
+    "reference_author": "div._author_name_1fn6n_38",
+    "reference_journal": "span._name_niu8h_11",
+    "reference_date": "div._journal-date_q86iu_51",
+    "loading_spinner": None,
+    "answer_done": None,
+}
+
+# The fallback lists are narrowed to the candidates that match on the current
+# site build (see selector_cache.py); other code keeps reading SELECTORS.
+RESOLVER = SelectorResolver(SELECTORS, ("content_block", "reference_block"))
+
+# Waits are in seconds unless the key ends in _ms.
+TIMINGS = {
+    "content_appear_timeout": 120,
+    "idle_ms": 8000,
+    "slice_ms": 5000,
+    "max_wait": 600,
+    "post_reload_timeout": 30,
+    "post_reload_idle_ms": 2000,
+    "reference_settle_ms": 150,
+    "reference_max_settle_ms": 2000,
+    "ready_timeout": 30,
+    "linger_ms": 3000,
+}
+
+# Returns [fingerprint, outerHTML] for every node matching one of the selectors
+# exactly once, in document order, leaving out matches nested inside another match.
+# The fingerprint is a 64-bit hash of the block's outerHTML plus its text length;
+# it is cached per block until a mutation touches the block, and outerHTML is sent
+# back (as null otherwise) only for fingerprints not in `known`.
+SNAPSHOT_JS = """
+({selectors, known}) => {
+    const combined = selectors.join(',');
+    let state = window.__blockFingerprints;
+    if (!state) {
+        state = window.__blockFingerprints = {cache: new WeakMap()};
+        const invalidate = (records) => {
+            for (const record of records) {
+                for (let node = record.target; node; node = node.parentNode) state.cache.delete(node);
+            }
+        };
+        state.observer = new MutationObserver(invalidate);
+        state.observer.observe(document.documentElement, {childList: true, subtree: true, characterData: true, attributes: true});
+        state.invalidate = invalidate;
+    }
+    state.invalidate(state.observer.takeRecords());
+    const fingerprint = (node) => {
+        const html = node.outerHTML;
+        let h1 = 0x811c9dc5, h2 = 5381;
+        for (let i = 0; i < html.length; i++) {
+            const c = html.charCodeAt(i);
+            h1 = Math.imul(h1 ^ c, 0x01000193);
+            h2 = (Math.imul(h2, 33) + c) | 0;
+        }
+        const hex = (h) => (h >>> 0).toString(16).padStart(8, '0');
+        return hex(h1) + hex(h2) + ':' + node.textContent.length;
+    };
+    const held = new Set(known);
+    const blocks = [];
+    for (const node of document.querySelectorAll(combined)) {
+        const parent = node.parentElement;
+        if (parent && parent.closest(combined)) continue;
+        let fp = state.cache.get(node);
+        if (!fp) {
+            fp = fingerprint(node);
+            state.cache.set(node, fp);
+        }
+        blocks.push([fp, held.has(fp) ? null : node.outerHTML]);
+    }
+    return blocks;
+}
+"""
+
+# Optionally scrolls the reference list to the item at targetIndex (estimating its
+# offset from the rendered items' heights) or by one viewport, waits for the list
+# to stop re-rendering, then reads every rendered reference in one pass.
+HARVEST_REFS_JS = """
+async ({blockSelectors, fields, scrollerSelector, targetIndex, advance, settleMs, maxSettleMs}) => {
+    const combined = blockSelectors.join(',');
+    const scroller = (scrollerSelector && document.querySelector(scrollerSelector)) || document.scrollingElement;
+    const viewTop = () => scroller === document.scrollingElement ? 0 : scroller.getBoundingClientRect().top;
+    const positionOf = (node) => {
+        const item = node.closest('[data-index], [data-item-index]');
+        if (!item) return null;
+        const value = item.getAttribute('data-index') ?? item.getAttribute('data-item-index');
+        return value === null || value === '' ? null : Number(value);
+    };
+    const renderedItems = () => [...scroller.querySelectorAll('[data-index], [data-item-index]')]
+        .map((node) => ({node, position: positionOf(node)}))
+        .filter((item) => Number.isFinite(item.position))
+        .sort((a, b) => a.position - b.position);
+    const settle = () => new Promise((resolve) => {
+        let finished = false;
+        let idleTimer = null;
+        const observer = new MutationObserver(() => {
+            clearTimeout(idleTimer);
+            idleTimer = setTimeout(done, settleMs);
+        });
+        const hardTimer = setTimeout(done, maxSettleMs);
+        function done() {
+            if (finished) return;
+            finished = true;
+            observer.disconnect();
+            clearTimeout(idleTimer);
+            clearTimeout(hardTimer);
+            requestAnimationFrame(() => requestAnimationFrame(resolve));
+        }
+        observer.observe(scroller, {childList: true, subtree: true, characterData: true});
+        idleTimer = setTimeout(done, settleMs);
+    });
+    const jumpTo = (target) => {
+        const items = renderedItems();
+        const hit = items.find((item) => item.position === target);
+        if (hit) {
+            hit.node.scrollIntoView({block: 'center'});
+            return;
+        }
+        if (!items.length) {
+            scroller.scrollTop += scroller.clientHeight;
+            return;
+        }
+        const first = items[0];
+        const last = items[items.length - 1];
+        const firstRect = first.node.getBoundingClientRect();
+        const span = last.position - first.position + 1;
+        const itemHeight = (last.node.getBoundingClientRect().bottom - firstRect.top) / span || scroller.clientHeight;
+        scroller.scrollTop += firstRect.top - viewTop() + (target - first.position) * itemHeight;
+    };
+    if (targetIndex !== null) {
+        for (let attempt = 0; attempt < 4; attempt++) {
+            jumpTo(targetIndex);
+            await settle();
+            if (renderedItems().some((item) => item.position === targetIndex)) break;
+        }
+    } else if (advance) {
+        scroller.scrollTop += Math.max(1, Math.floor(scroller.clientHeight * 0.9));
+        await settle();
+    }
+    const textOf = (root, selector) => {
+        const node = root.querySelector(selector);
+        return node ? node.innerText : '';
+    };
+    const refs = [];
+    for (const root of document.querySelectorAll(combined)) {
+        if (root.parentElement && root.parentElement.closest(combined)) continue;
+        refs.push({
+            position: positionOf(root),
+            number: textOf(root, fields.index),
+            title: textOf(root, fields.title),
+            authors: [...root.querySelectorAll(fields.author)].map((node) => node.innerText),
+            date: textOf(root, fields.date),
+            journal: textOf(root, fields.journal),
+            doi: (() => {
+                const link = root.querySelector('a[href*="doi.org/"]');
+                const match = (link ? link.href : root.innerText).match(/10\\.\\d{4,9}\\/[^\\s"<>]+/);
+                return match ? match[0] : '';
+            })(),
+        });
+    }
+    const positions = renderedItems().map((item) => item.position);
+    return {
+        refs,
+        first: positions.length ? positions[0] : null,
+        last: positions.length ? positions[positions.length - 1] : null,
+        atEnd: scroller.scrollTop + scroller.clientHeight >= scroller.scrollHeight - 1,
+    };
+}
+"""
+
+# Resolves once the answer blocks have not mutated for idleMs, the optional
+# "generation finished" element appears, or sliceMs elapses. The observer is
+# installed once per document and survives across calls.
+QUIESCENCE_JS = """
+async ({selectors, doneSelector, idleMs, sliceMs}) => {
+    const combined = selectors.join(',');
+    let state = window.__answerQuiescence;
+    if (!state) {
+        state = window.__answerQuiescence = {lastMutation: Date.now(), mutations: 0, listeners: new Set()};
+        const touchesAnswer = (record) => {
+            const node = record.target.nodeType === 1 ? record.target : record.target.parentElement;
+            if (node && node.closest(state.combined)) return true;
+            for (const added of record.addedNodes) {
+                if (added.nodeType === 1 && (added.matches(state.combined) || added.querySelector(state.combined))) return true;
+            }
+            return false;
+        };
+        new MutationObserver((records) => {
+            const relevant = records.filter(touchesAnswer).length;
+            if (!relevant) return;
+            state.lastMutation = Date.now();
+            state.mutations += relevant;
+            state.listeners.forEach((listener) => listener());
+        }).observe(document.documentElement, {childList: true, subtree: true, characterData: true});
+    }
+    // The selectors may be narrowed between calls; the observer always uses the latest.
+    state.combined = combined;
+    const deadline = Date.now() + sliceMs;
+    return await new Promise((resolve) => {
+        let timer = null;
+        const finish = (status) => {
+            clearTimeout(timer);
+            state.listeners.delete(check);
+            resolve({
+                status,
+                blocks: document.querySelectorAll(combined).length,
+                mutations: state.mutations,
+                idle_ms: Date.now() - state.lastMutation,
+            });
+        };
+        function check() {
+            const now = Date.now();
+            if (doneSelector && document.querySelector(doneSelector)) return finish('done');
+            const idle = now - state.lastMutation;
+            if (idle >= idleMs && document.querySelector(combined)) return finish('idle');
+            if (now >= deadline) return finish('pending');
+            const untilIdle = idle >= idleMs ? Infinity : idleMs - idle;
+            clearTimeout(timer);
+            timer = setTimeout(check, Math.max(10, Math.min(untilIdle, deadline - now)));
+        }
+        state.listeners.add(check);
+        check();
+    });
+}
+"""
+
+BOHRIUM_URL = os.environ.get("BOHRIUM_URL", "https://www.bohrium.com/en-US")
+
+# formats: any of exporters.FORMATS; docx and markdown write one file per prompt,
+# jsonl and parquet one file per run. runs_dir: where each prompt's snapshot and
+# progress are checkpointed (None disables checkpoints). export_workers: processes
+# that parse and build documents in batch and service mode, off the event loop
+# (0 exports on the loop itself).
+OUTPUT = {
+    "parser_backend": "auto",
+    "formats": ["docx"],
+    "output_dir": ".",
+    "runs_dir": DEFAULT_RUNS_DIR,
+    "export_workers": 0,
+}
+
+# storage_state: JSON file with cookies and localStorage, loaded into every new
+# context and rewritten after a successful run. user_data_dir: a persistent
+# browser profile used instead (a single context shared by all pages).
+SESSION = {
+    "storage_state": None,
+    "user_data_dir": None,
+}
+
+# record_dir: save a single-prompt run's traffic (HAR with bodies) and final DOM
+# there. replay_dir: serve every request from such a recording instead of the
+# network (see recording.py).
+REPLAY = {
+    "record_dir": None,
+    "replay_dir": None,
+}
+
+# Answer images downloaded into the content-addressed asset store (--fetch-images)
+# and embedded in the documents: at most max_parallel downloads at once and
+# per_host to one host; images wider than max_width pixels are embedded resized.
+IMAGES = {
+    "dir": DEFAULT_ASSET_DIR,
+    "max_parallel": 8,
+    "per_host": 4,
+    "timeout": 30,
+    "max_width": 1600,
+}
+
+# Batch-mode pacing (see scheduler.py). rate_per_minute: average query submissions
+# (0: unpaced), with bursts of up to burst. Concurrency starts at --concurrency and,
+# when adaptive, is halved on failures or slow answers and grows back towards it,
+# down to min_concurrency. The circuit opens when breaker_threshold of the last
+# breaker_window queries failed, pausing every page for breaker_cooldown seconds.
+# retries: retry failed queries as RETRY_POLICY says for the phase they failed in.
+# A 429 or 5xx on the answer request fails the wait at once, so it can be retried;
+# answer_url_pattern (a regex) picks that request, otherwise it is the first POST or
+# event-stream request after the submit click.
+SCHEDULE = {
+    "rate_per_minute": 0,
+    "burst": 2,
+    "adaptive": True,
+    "min_concurrency": 1,
+    "retries": True,
+    "breaker_threshold": 0.5,
+    "breaker_window": 20,
+    "breaker_min_samples": 6,
+    "breaker_cooldown": 60,
+    "answer_url_pattern": None,
+}
+
+# Requests aborted when resource blocking is enabled. Allowlisted URL fragments
+# always go through; estimated_bytes is used to report what blocking saved.
+BLOCKING = {
+    "resource_types": ["image", "font", "media"],
+    "url_patterns": [
+        "google-analytics.com", "googletagmanager.com", "doubleclick.net", "hotjar.com",
+        "clarity.ms", "sentry.io", "facebook.net", "hm.baidu.com", "sensorsdata",
+    ],
+    "allowlist": ["bohrium.com/api", "bohrium.dp.tech"],
+    "estimated_bytes": {"image": 60000, "font": 40000, "media": 500000, "other": 20000},
+}
+
+async def install_request_blocking(context, config=BLOCKING):
+    """Aborts unneeded requests on a context and returns the live stats dict."""
+    stats = {"blocked": 0, "allowed": 0, "blocked_by_type": {}, "bytes_saved_est": 0, "bytes_loaded": 0}
+
+    async def handle_route(route):
+        request = route.request
+        url = request.url
+        blocked = not any(fragment in url for fragment in config["allowlist"]) and (
+            request.resource_type in config["resource_types"]
+            or any(pattern in url for pattern in config["url_patterns"]))
+        if not blocked:
+            stats["allowed"] += 1
+            await route.fallback()
+            return
+        kind = request.resource_type if request.resource_type in config["estimated_bytes"] else "other"
+        stats["blocked"] += 1
+        stats["blocked_by_type"][kind] = stats["blocked_by_type"].get(kind, 0) + 1
+        stats["bytes_saved_est"] += config["estimated_bytes"][kind]
+        await route.abort("blockedbyclient")
+
+    def count_response(response):
+        length = response.headers.get("content-length", "")
+        if length.isdigit():
+            stats["bytes_loaded"] += int(length)
+
+    context.on("response", count_response)
+    await context.route("**/*", handle_route)
+    return stats
+
+def format_blocking_stats(stats):
+    by_type = ", ".join(f"{kind}: {count}" for kind, count in sorted(stats["blocked_by_type"].items()))
+    return (f"Blocked {stats['blocked']} of {stats['blocked'] + stats['allowed']} requests ({by_type or 'none'}), "
+            f"~{stats['bytes_saved_est'] // 1024} KB saved, {stats['bytes_loaded'] // 1024} KB loaded.")
+
+def merge_blocking_stats(all_stats):
+    merged = {"blocked": 0, "allowed": 0, "blocked_by_type": {}, "bytes_saved_est": 0, "bytes_loaded": 0}
+    for stats in all_stats:
+        for key in ("blocked", "allowed", "bytes_saved_est", "bytes_loaded"):
+            merged[key] += stats[key]
+        for kind, count in stats["blocked_by_type"].items():
+            merged["blocked_by_type"][kind] = merged["blocked_by_type"].get(kind, 0) + count
+    return merged
+
+def extract_cited_reference_numbers(html_content):
+    numbers = re.findall(r'\[(\d+)\]', html_content)
+    return sorted(set(int(n) for n in numbers))
+
+def parse_and_save_content(html_content, prompt_text, references_dict, cited_numbers, elements=None, exporter=None):
+    """Exports the answer in OUTPUT["formats"]; returns the first path written."""
+    paths = write_outputs(html_content, prompt_text, references_dict, cited_numbers, elements, exporter)
+    return paths[0] if paths else None
+
+def write_outputs(html_content, prompt_text, references_dict, cited_numbers, elements=None, exporter=None):
+    """Exports the answer in OUTPUT["formats"]; returns every path written (empty on failure)."""
+    log.info("[*] Parsing final content...")
+    try:
+        if elements is None:
+            with span("parse"):
+                elements = extract_elements(html_content, SELECTORS["content_block"], OUTPUT["parser_backend"])
+        session = exporter or ExportSession(OUTPUT["formats"], OUTPUT["output_dir"])
+        try:
+            paths = session.write(prompt_text, elements, references_dict, cited_numbers)
+        finally:
+            if not exporter:
+                session.close()
+        return paths
+    except Exception as e:
+        log.error(f"[ERROR] Exception during parsing and saving content: {e}")
+        return []
+
+async def probe_selectors(page, role):
+    try:
+        await RESOLVER.ensure(page, role)
+    except Exception as e:
+        log.warning(f"[WARNING] Could not probe {role} selectors: {e}")
+
+async def snapshot_blocks(page, known=(), final=False):
+    """Returns [fingerprint, outerHTML] per content block, with outerHTML None for the known fingerprints.
+    The final snapshot checks that the resolved selectors still find every block."""
+    blocks = await page.evaluate(SNAPSHOT_JS, {"selectors": RESOLVER.get("content_block"), "known": list(known)})
+    if (final or not blocks) and await RESOLVER.verify(page, "content_block"):
+        blocks = await page.evaluate(SNAPSHOT_JS, {"selectors": RESOLVER.get("content_block"), "known": list(known)})
+    changed = [block_html for _, block_html in blocks if block_html is not None]
+    incr("snapshots")
+    incr("blocks_fetched", len(changed))
+    incr("html_bytes", sum(len(block_html) for block_html in changed))
+    return blocks
+
+async def close_modal(page):
+    try:
+        modal = await page.query_selector(SELECTORS["modal"])
+        if modal:
+            log.info("[!] Login popup detected.")
+            close_btn = await modal.query_selector(SELECTORS["close_btn"])
+            if close_btn:
+                await close_btn.click()
+                log.info("[!] Login popup closed.")
+                await page.wait_for_selector(SELECTORS["modal"], state="detached", timeout=7000)
+    except Exception as e:
+        log.warning(f"[WARNING] Could not close modal: {e}")
+
+_pages_with_modal_handler = weakref.WeakSet()
+
+async def install_modal_handler(page):
+    """Closes the login popup whenever it shows up before one of our actions on the page."""
+    if page in _pages_with_modal_handler:
+        return
+
+    async def dismiss(modal):
+        log.info("[!] Login popup detected.")
+        await modal.locator(SELECTORS["close_btn"]).first.click()
+        log.info("[!] Login popup closed.")
+
+    await page.add_locator_handler(page.locator(SELECTORS["modal"]).first, dismiss)
+    _pages_with_modal_handler.add(page)
+
+async def wait_until_ready(page):
+    """Waits until the prompt textarea is visible and editable and no login popup covers it."""
+    with span("page_ready"):
+        await install_modal_handler(page)
+        textarea = page.locator(SELECTORS["prompt_textarea"]).first
+        await textarea.wait_for(state="visible", timeout=TIMINGS["ready_timeout"] * 1000)
+        if await page.locator(SELECTORS["modal"]).first.is_visible():
+            await close_modal(page)
+        if not await textarea.is_editable():
+            await page.wait_for_function("(selector) => { const t = document.querySelector(selector); "
+                                         "return t && !t.disabled && !t.readOnly; }",
+                                         arg=SELECTORS["prompt_textarea"], timeout=TIMINGS["ready_timeout"] * 1000)
+
+async def enter_prompt(page, prompt_text, before_submit=None):
+    with span("enter_prompt"):
+        try:
+            log.info("[*] Waiting for prompt textarea...")
+            await page.wait_for_selector(SELECTORS["prompt_textarea"], timeout=15000)
+            await page.fill(SELECTORS["prompt_textarea"], prompt_text)
+            log.info(f"[*] Prompt entered: '{prompt_text}'")
+            await page.wait_for_selector(SELECTORS["submit_btn"], timeout=15000)
+            submit_btn = await page.query_selector(SELECTORS["submit_btn"])
+            await submit_btn.scroll_into_view_if_needed()
+            log.info("[*] Clicking submit button...")
+            if before_submit:
+                before_submit()
+            await submit_btn.click()
+            log.info("[*] Query submitted.")
+        except Exception as e:
+            log.error(f"[ERROR] Failed to enter prompt: {e}")
+            raise
+
+async def wait_for_quiescence(page, idle_ms, max_wait, on_slice=None):
+    start_time = time.time()
+    result = {"status": "pending", "blocks": 0, "mutations": 0, "idle_ms": 0}
+    while time.time() - start_time < max_wait:
+        remaining_ms = int((max_wait - (time.time() - start_time)) * 1000)
+        result = await page.evaluate(QUIESCENCE_JS, {
+            "selectors": RESOLVER.get("content_block"),
+            "doneSelector": SELECTORS["answer_done"],
+            "idleMs": idle_ms,
+            "sliceMs": max(1, min(TIMINGS["slice_ms"], remaining_ms)),
+        })
+        incr("polls")
+        log.info(f"[ ] {int(time.time() - start_time)}s: {result['blocks']} content blocks, "
+                 f"{result['mutations']} mutations, idle for {result['idle_ms'] / 1000:.1f}s.")
+        if not result["blocks"] and await RESOLVER.verify(page, "content_block"):
+            continue
+        if result["status"] != "pending":
+            break
+        if on_slice:
+            await on_slice()
+        try:
+            incr("scroll_attempts")
+            await page.evaluate("window.scrollBy(0, window.innerHeight);")
+        except Exception as e:
+            log.warning(f"[WARNING] Failed to scroll: {e}")
+    return result
+
+async def wait_for_content(page, reload="auto", on_slice=None):
+    with span("wait_for_content"):
+        return await _wait_for_content(page, reload, on_slice)
+
+async def _wait_for_content(page, reload, on_slice):
+    log.info("[*] Waiting for the answer to start streaming...")
+    try:
+        await page.wait_for_selector(", ".join(SELECTORS["content_block"]), timeout=TIMINGS["content_appear_timeout"] * 1000)
+    except Exception as e:
+        # Nothing is streaming, so waiting out max_wait would only delay the reload.
+        log.warning(f"[WARNING] No content block appeared: {e}")
+        result = {"status": "missing", "blocks": 0}
+    else:
+        try:
+            result = await wait_for_quiescence(page, TIMINGS["idle_ms"], TIMINGS["max_wait"], on_slice)
+        except Exception as e:
+            log.error(f"[ERROR] An error occurred while waiting for content: {e}")
+            result = {"status": "error", "blocks": 0}
+    if result["status"] == "done":
+        log.info("[✓] Answer finished signal detected.")
+    elif result["status"] == "idle":
+        log.info(f"[✓] Answer stopped changing for {TIMINGS['idle_ms'] / 1000:.1f}s.")
+    elif result["status"] == "pending":
+        log.info("[!] Max wait reached.")
+    needs_reload = result["status"] not in ("done", "idle") or not result["blocks"]
+    if reload == "always" or (reload == "auto" and needs_reload):
+        with span("reload"):
+            result = await reload_and_settle(page, result)
+    return result
+
+async def reload_and_settle(page, result):
+    log.info("[*] Reloading page to recover the final content...")
+    try:
+        await page.reload()
+        log.info("[*] Page reloaded.")
+    except Exception as e:
+        log.error(f"[ERROR] Failed to reload page: {e}")
+    if SELECTORS["loading_spinner"]:
+        try:
+            await page.wait_for_selector(SELECTORS["loading_spinner"], state="detached", timeout=10000)
+        except Exception as e:
+            log.warning(f"[WARNING] Loading spinner not found after refresh: {e}")
+    try:
+        await page.wait_for_selector(", ".join(SELECTORS["content_block"]), timeout=TIMINGS["post_reload_timeout"] * 1000)
+        result = await wait_for_quiescence(page, TIMINGS["post_reload_idle_ms"], TIMINGS["post_reload_timeout"])
+    except Exception as e:
+        log.warning(f"[WARNING] Content did not settle after reload: {e}")
+    return result
+
+def next_reference_target(missing, offset, first, last):
+    """Picks the list position of the missing reference closest to the rendered window."""
+    outside = [num - offset for num in missing if not first <= num - offset <= last]
+    if not outside:
+        return None
+    return max(0, min(outside, key=lambda pos: first - pos if pos < first else pos - last))
+
+async def extract_cited_references(page, cited_numbers, refstore=None, on_progress=None):
+    """Harvests the cited references; on_progress(references) is called whenever new ones are found."""
+    with span("extract_cited_references"):
+        return await _extract_cited_references(page, cited_numbers, refstore, on_progress)
+
+async def _extract_cited_references(page, cited_numbers, refstore, on_progress):
+    log.info("[*] Extracting cited references...")
+    references_dict = {}
+    harvested = []
+    wanted = set(cited_numbers)
+    # Virtuoso's data-index is zero-based while references start at [1];
+    # the offset is re-learned from every rendered item.
+    offset = 1
+    target = None
+    advance = False
+    steps = 0
+    max_steps = len(wanted) * 2 + 10
+    consecutive_no_new = 0
+    max_consecutive_no_new = 5
+    fields = {name: SELECTORS[f"reference_{name}"] for name in ("index", "title", "author", "journal", "date")}
+    while wanted and steps < max_steps and consecutive_no_new < max_consecutive_no_new:
+        try:
+            harvest = await page.evaluate(HARVEST_REFS_JS, {
+                "blockSelectors": RESOLVER.get("reference_block"),
+                "fields": fields,
+                "scrollerSelector": SELECTORS["reference_scroller"],
+                "targetIndex": target,
+                "advance": advance,
+                "settleMs": TIMINGS["reference_settle_ms"],
+                "maxSettleMs": TIMINGS["reference_max_settle_ms"],
+            })
+        except Exception as e:
+            log.error(f"[ERROR] Failed to harvest references: {e}")
+            break
+        steps += 1
+        incr("reference_steps")
+        if not harvest["refs"] and await RESOLVER.verify(page, "reference_block"):
+            continue
+        if harvest["refs"] and not RESOLVER.resolved("reference_block"):
+            await probe_selectors(page, "reference_block")
+        new_refs = 0
+        for ref in harvest["refs"]:
+            ref_num = (ref["number"] or "").replace('.', '').strip()
+            if not ref_num.isdigit():
+                continue
+            ref_num_int = int(ref_num)
+            if ref["position"] is not None:
+                offset = ref_num_int - ref["position"]
+            if ref_num_int not in wanted or ref_num in references_dict:
+                continue
+            references_dict[ref_num] = {field: ref[field] for field in REFERENCE_FIELDS}
+            harvested.append(ref)
+            new_refs += 1
+            incr("references_found")
+            log.debug(f"    [+] Extracted cited reference [{ref_num}]: {format_reference(ref)}")
+        if new_refs and on_progress:
+            on_progress(references_dict)
+        missing = sorted(wanted.difference(int(n) for n in references_dict))
+        if not missing:
+            log.info("[*] All cited references extracted.")
+            break
+        consecutive_no_new = 0 if new_refs else consecutive_no_new + 1
+        if harvest["first"] is None:
+            # Not a virtualized list: page through it one viewport at a time.
+            if harvest["atEnd"]:
+                break
+            target, advance = None, True
+        else:
+            target = next_reference_target(missing, offset, harvest["first"], harvest["last"])
+            advance = False
+            if target is None:
+                break
+    missing = sorted(wanted.difference(int(n) for n in references_dict))
+    if missing:
+        log.warning(f"[WARNING] Could not find cited references {missing} after {steps} steps.")
+    if refstore and harvested:
+        refstore.upsert_many(harvested)
+    return references_dict
+
+def resolve_known_references(refstore, html_content, cited_numbers, identities=None):
+    """Returns the cited references whose identity is already in the store; identities, when
+    given, are the answer's citation_identities."""
+    if identities is None:
+        identities = citation_identities(html_content, OUTPUT["parser_backend"])
+    identities = {num: identity for num, identity in identities.items() if int(num) in cited_numbers}
+    known = refstore.resolve(identities)
+    if known:
+        log.info(f"[*] Resolved {len(known)}/{len(cited_numbers)} cited references from the reference store.")
+    return known
+
+async def wait_for_answer(page, stream_capture, on_slice=None):
+    """Races the network capture against the DOM wait; returns the capture result if it wins."""
+    capture_task = asyncio.ensure_future(stream_capture.wait())
+    dom_task = asyncio.ensure_future(wait_for_content(page, on_slice=on_slice))
+    try:
+        done, _ = await asyncio.wait({capture_task, dom_task}, return_when=asyncio.FIRST_COMPLETED)
+        if capture_task in done and capture_task.result():
+            dom_task.cancel()
+            return capture_task.result()
+        # The stream was not recognized: keep the DOM wait that is already running.
+        await dom_task
+        return None
+    finally:
+        for task in (capture_task, dom_task):
+            if not task.done():
+                task.cancel()
+
+async def open_search_page(page):
+    log.info("[*] Navigating to Bohrium AI...")
+    with span("goto"):
+        response = await page.goto(BOHRIUM_URL, timeout=60000, wait_until="domcontentloaded")
+    if response and response.status >= 400:
+        raise SiteError(response.status, parse_retry_after(response.headers.get("retry-after")))
+    await wait_until_ready(page)
+    try:
+        await RESOLVER.load_build(page)
+    except Exception as e:
+        log.warning(f"[WARNING] Could not identify the site build: {e}")
+
+class AnswerErrors:
+    """Watches the answer request of a query for the site refusing or failing it (429 or
+    5xx), which leaves the page without blocks. The answer request is the first one after
+    arm() matching url_pattern, or without a pattern the first POST or event-stream request
+    that is not analytics; its first response settles it."""
+
+    def __init__(self, page, url_pattern=None):
+        self.page = page
+        self.url_pattern = re.compile(url_pattern) if url_pattern else None
+        self.armed = False
+        self.request = None
+        self.error = None
+        self.seen = asyncio.Event()
+        page.on("request", self._on_request)
+        page.on("response", self._on_response)
+
+    def arm(self):
+        self.armed = True
+
+    def detach(self):
+        self.page.remove_listener("request", self._on_request)
+        self.page.remove_listener("response", self._on_response)
+
+    def _on_request(self, request):
+        if not self.armed or self.request or request.resource_type not in ("fetch", "xhr", "eventsource"):
+            return
+        if self.url_pattern:
+            if self.url_pattern.search(request.url):
+                self.request = request
+        elif ((request.method == "POST" or request.resource_type == "eventsource")
+              and not any(pattern in request.url for pattern in BLOCKING["url_patterns"])):
+            self.request = request
+
+    def _on_response(self, response):
+        if self.error or response.request is not self.request:
+            return
+        if response.status != 429 and response.status < 500:
+            return
+        self.error = SiteError(response.status, parse_retry_after(response.headers.get("retry-after")))
+        log.warning(f"[!] The answer request {response.url} answered HTTP {response.status}.")
+        self.seen.set()
+
+    async def guard(self, awaitable):
+        """Awaits `awaitable`, raising the SiteError as soon as one is seen."""
+        task = asyncio.ensure_future(awaitable)
+        watcher = asyncio.ensure_future(self.seen.wait())
+        try:
+            done, _ = await asyncio.wait({task, watcher}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for pending in (task, watcher):
+                if not pending.done():
+                    pending.cancel()
+        if task in done:
+            return task.result()
+        raise self.error
+
+async def guard(answer_errors, awaitable):
+    return await (answer_errors.guard(awaitable) if answer_errors else awaitable)
+
+async def parse_elements(html_content, pool=None):
+    """Parses the answer, in the export pool when there is one so the event loop stays free."""
+    with span("parse"):
+        if not pool:
+            return extract_elements(html_content, SELECTORS["content_block"], OUTPUT["parser_backend"])
+        return await asyncio.get_running_loop().run_in_executor(pool, extract_elements, html_content,
+                                                                SELECTORS["content_block"], OUTPUT["parser_backend"])
+
+def captured_result(captured):
+    """Turns a StreamCapture result into a result: its HTML, cited numbers and the cited references."""
+    cited_numbers = extract_cited_reference_numbers(captured["html"])
+    references_dict = {num: {field: ref[field] for field in REFERENCE_FIELDS}
+                       for num, ref in captured["references"].items()
+                       if num.isdigit() and int(num) in cited_numbers}
+    return {"html": captured["html"], "cited_numbers": cited_numbers, "references_dict": references_dict}
+
+def start_image_fetch(assets, elements, request_context=None):
+    """Starts downloading the answer's images in the background; returns the task or None."""
+    if not assets or not elements:
+        return None
+    return asyncio.create_task(fetch_images(elements, assets, request_context, IMAGES["max_parallel"], IMAGES["per_host"],
+                                            IMAGES["timeout"], max_width=IMAGES["max_width"]))
+
+async def finish_image_fetch(task):
+    if task:
+        try:
+            await task
+        except Exception as e:
+            log.warning(f"[WARNING] Image download failed: {e}")
+
+def record_checkpoint(checkpoint, method, *args, **kwargs):
+    if not checkpoint:
+        return
+    try:
+        getattr(checkpoint, method)(*args, **kwargs)
+    except Exception as e:
+        log.warning(f"[WARNING] Failed to write checkpoint: {e}")
+
+async def collect_result(page, prompt_text, capture="dom", navigate=True, refstore=None, checkpoint=None, assets=None,
+                         fail_fast=False, pool=None):
+    """Runs one query on the page and returns its content HTML, cited numbers and references.
+    With an asset store, the answer's images download while the references are harvested.
+    fail_fast (for callers that retry) ends the wait as soon as the answer request fails.
+    With an export pool, nothing is parsed on the event loop: the elements are left to the
+    export worker, or parsed in the pool when the images need them."""
+    stream_capture = None
+    answer_errors = None
+    image_task = None
+    extractor = IncrementalExtractor(OUTPUT["parser_backend"])
+
+    async def parse_stable_blocks():
+        try:
+            extractor.update(await snapshot_blocks(page, extractor.known()), parse=not pool)
+        except Exception as e:
+            log.warning(f"[WARNING] Incremental parse skipped: {e}")
+
+    try:
+        if navigate:
+            with failure_phase("navigate"):
+                await open_search_page(page)
+            log.info("[*] Page loaded.")
+        if capture == "network":
+            stream_capture = StreamCapture(page)
+        if fail_fast:
+            answer_errors = AnswerErrors(page, SCHEDULE["answer_url_pattern"])
+        with failure_phase("submit"):
+            await enter_prompt(page, prompt_text, answer_errors.arm if answer_errors else None)
+        if stream_capture:
+            with failure_phase("wait"):
+                captured = await guard(answer_errors, wait_for_answer(page, stream_capture, parse_stable_blocks))
+            if captured:
+                log.info(f"[✓] Answer captured from the network stream with {len(captured['references'])} references.")
+                if refstore and captured["references"]:
+                    refstore.upsert_many(captured["references"].values())
+                result = captured_result(captured)
+                record_checkpoint(checkpoint, "save_snapshot", prompt_text, result["html"], result["cited_numbers"],
+                                  page.url, result["references_dict"])
+                if assets:
+                    result["elements"] = await parse_elements(captured["html"], pool)
+                    await finish_image_fetch(start_image_fetch(assets, result["elements"], page.context.request))
+                return result
+            log.info("[!] Answer stream not recognized; falling back to DOM extraction.")
+        else:
+            with failure_phase("wait"):
+                await guard(answer_errors, wait_for_content(page, on_slice=parse_stable_blocks))
+        log.info("[*] Collecting main content for reference scan...")
+        await probe_selectors(page, "content_block")
+        try:
+            blocks = await snapshot_blocks(page, extractor.known(), final=True)
+            changed = sum(block_html is not None for _, block_html in blocks)
+            log.info(f"[*] Snapshot captured {len(blocks)} content blocks ({changed} changed since the last poll).")
+        except Exception as e:
+            log.error(f"[ERROR] Failed to extract refreshed content: {e}")
+            blocks = []
+        if pool:
+            extractor.update(blocks, parse=False)
+            combined_html_after_refresh = extractor.combined_html()
+            elements = await parse_elements(combined_html_after_refresh, pool) if assets else None
+        else:
+            with span("parse"):
+                elements = extractor.assemble(blocks)
+            combined_html_after_refresh = extractor.combined_html()
+        image_task = start_image_fetch(assets, elements, page.context.request)
+        cited_numbers = extract_cited_reference_numbers(combined_html_after_refresh)
+        log.info(f"[*] Cited reference numbers in content: {cited_numbers}")
+        references_dict = {}
+        if refstore:
+            identities = await asyncio.to_thread(citation_identities, combined_html_after_refresh,
+                                                 OUTPUT["parser_backend"])
+            references_dict = resolve_known_references(refstore, combined_html_after_refresh, cited_numbers, identities)
+        record_checkpoint(checkpoint, "save_snapshot", prompt_text, combined_html_after_refresh, cited_numbers, page.url,
+                          references_dict)
+        remaining = [num for num in cited_numbers if str(num) not in references_dict]
+
+        def checkpoint_references(found):
+            record_checkpoint(checkpoint, "update", references={**references_dict, **found})
+
+        with failure_phase("references"):
+            references_dict.update(await extract_cited_references(page, remaining, refstore, checkpoint_references))
+        record_checkpoint(checkpoint, "update", stage="references", references=references_dict)
+        await finish_image_fetch(image_task)
+        image_task = None
+        return {"html": combined_html_after_refresh, "cited_numbers": cited_numbers, "references_dict": references_dict,
+                "elements": elements}
+    finally:
+        if image_task:
+            image_task.cancel()
+        if stream_capture:
+            stream_capture.detach()
+        if answer_errors:
+            answer_errors.detach()
+
+def ensure_elements(result):
+    """Parses the result's HTML unless it already carries its elements; returns them."""
+    if result.get("elements") is None:
+        with span("parse"):
+            result["elements"] = extract_elements(result["html"], SELECTORS["content_block"], OUTPUT["parser_backend"])
+    return result["elements"]
+
+def save_result(result, prompt_text, exporter=None):
+    paths = write_outputs(result["html"], prompt_text, result["references_dict"], result["cited_numbers"],
+                          result.get("elements"), exporter)
+    return paths[0] if paths else None
+
+async def export_result(result, prompt_text, exporter=None):
+    """Exports the result, through the exporter's worker pool when it has one; returns the paths written."""
+    if not exporter or not exporter.pool:
+        ensure_elements(result)
+        return write_outputs(result["html"], prompt_text, result["references_dict"], result["cited_numbers"],
+                             result.get("elements"), exporter)
+    log.info("[*] Handing final content to an export worker...")
+    return await exporter.write_async(prompt_text, result.get("elements"), result["references_dict"],
+                                      result["cited_numbers"], result["html"], SELECTORS["content_block"],
+                                      OUTPUT["parser_backend"])
+
+def cached_result(cache, prompt_text, assets=None):
+    """The cached result for the prompt, or None on a miss. Images are attached only if they
+    are already in the asset store."""
+    result = cache.get(prompt_text)
+    if not result:
+        return None
+    log.info(f"[✓] Cache hit for '{prompt_text}', skipping the browser.")
+    incr("cache_hits")
+    if assets and result.get("elements"):
+        attach_images(result["elements"], assets, IMAGES["max_width"])
+    return result
+
+async def export_cached_result(cache, prompt_text, exporter=None, assets=None):
+    """save_cached_result for callers on an event loop: the documents are built in the exporter's
+    pool, or in a thread without one. Returns the filename, or None on a miss."""
+    result = cached_result(cache, prompt_text, assets)
+    if not result:
+        return None
+    with prompt_scope(prompt_text):
+        if exporter and exporter.pool:
+            paths = await export_result(result, prompt_text, exporter)
+            return paths[0] if paths else None
+        return await asyncio.to_thread(save_result, result, prompt_text, exporter)
+
+def save_cached_result(cache, prompt_text, exporter=None, assets=None):
+    """Writes the document straight from the cache; returns its filename, or None on a miss."""
+    result = cached_result(cache, prompt_text, assets)
+    if not result:
+        return None
+    with prompt_scope(prompt_text):
+        return save_result(result, prompt_text, exporter)
+
+async def search_on_page(page, prompt_text, capture="dom", navigate=True, cache=None, refstore=None, exporter=None,
+                         assets=None):
+    _, paths = await run_search(page, prompt_text, capture, navigate, cache, refstore, exporter, assets)
+    return paths[0] if paths else None
+
+async def run_search(page, prompt_text, capture="dom", navigate=True, cache=None, refstore=None, exporter=None,
+                     assets=None, fail_fast=False):
+    """Runs one query on the page, caches and exports it; returns the result and the paths written."""
+    with prompt_scope(prompt_text), span("search"):
+        checkpoint = None
+        if OUTPUT["runs_dir"]:
+            try:
+                checkpoint = Checkpoint.for_prompt(OUTPUT["runs_dir"], prompt_text)
+            except OSError as e:
+                log.warning(f"[WARNING] Checkpoints disabled for this prompt: {e}")
+        result = await collect_result(page, prompt_text, capture, navigate, refstore, checkpoint, assets, fail_fast,
+                                      exporter.pool if exporter else None)
+        if cache and result["html"]:
+            cache.put(prompt_text, result)
+        paths = await export_result(result, prompt_text, exporter)
+        if paths:
+            record_checkpoint(checkpoint, "update", stage="exported", outputs=paths)
+        return result, paths
+
+async def launch_browser(p, headless):
+    """Returns the object to create contexts from and close at the end: a Browser, or the
+    persistent BrowserContext when SESSION["user_data_dir"] is set."""
+    metrics.install_protocol_counter()
+    with span("browser_launch"):
+        if SESSION["user_data_dir"]:
+            return await p.chromium.launch_persistent_context(SESSION["user_data_dir"], headless=headless)
+        return await p.chromium.launch(headless=headless)
+
+async def open_context(browser):
+    if not hasattr(browser, "new_context"):
+        return browser
+    options = {}
+    if SESSION["storage_state"] and os.path.exists(SESSION["storage_state"]):
+        options["storage_state"] = SESSION["storage_state"]
+    if REPLAY["record_dir"]:
+        options.update(recording.context_options(REPLAY["record_dir"]))
+    context = await browser.new_context(**options)
+    if REPLAY["replay_dir"]:
+        await recording.start_replay(context, REPLAY["replay_dir"])
+    return context
+
+async def save_storage_state(context):
+    if not SESSION["storage_state"]:
+        return
+    try:
+        tmp_path = SESSION["storage_state"] + ".tmp"
+        await context.storage_state(path=tmp_path)
+        os.replace(tmp_path, SESSION["storage_state"])
+        log.info(f"[*] Session state saved to {SESSION['storage_state']}")
+    except Exception as e:
+        log.warning(f"[WARNING] Could not save session state: {e}")
+
+async def run_bohrium_search(prompt_text, headless, capture="dom", block_resources=False, cache=None, refresh=False,
+                             refstore=None, assets=None):
+    outcome = await search_prompt(prompt_text, headless, capture, block_resources, cache, refresh, refstore, assets)
+    return outcome["paths"][0] if outcome and outcome["paths"] else None
+
+async def search_prompt(prompt_text, headless, capture="dom", block_resources=False, cache=None, refresh=False,
+                        refstore=None, assets=None, exporter=None, raise_errors=False):
+    """Answers one prompt from the cache or a fresh browser. Returns {"result", "paths", "cached"},
+    or None when the search failed (with raise_errors, the error is raised instead, a PhaseError
+    when it happened during the query). Playwright is only imported once the cache has missed."""
+    if cache and not refresh:
+        result = cached_result(cache, prompt_text, assets)
+        log.info(f"[*] {cache.format_stats()}")
+        if result:
+            with prompt_scope(prompt_text):
+                ensure_elements(result)
+                paths = write_outputs(result["html"], prompt_text, result["references_dict"], result["cited_numbers"],
+                                      result.get("elements"), exporter)
+            if paths or not OUTPUT["formats"]:
+                return {"result": result, "paths": paths, "cached": True}
+    from playwright.async_api import async_playwright
+
+    async with async_playwright() as p:
+        log.info("[*] Launching browser...")
+        blocking_stats = None
+        try:
+            browser = await launch_browser(p, headless)
+            context = await open_context(browser)
+            if block_resources:
+                blocking_stats = await install_request_blocking(context)
+            page = await context.new_page()
+        except Exception as e:
+            log.error(f"[ERROR] Failed to launch browser: {e}")
+            if raise_errors:
+                raise
+            return
+        try:
+            result, paths = await run_search(page, prompt_text, capture, cache=cache, refstore=refstore, exporter=exporter,
+                                             assets=assets)
+            if paths:
+                await save_storage_state(context)
+            if REPLAY["record_dir"]:
+                await recording.save_dom(page, REPLAY["record_dir"], prompt_text, BOHRIUM_URL, TIMINGS,
+                                         paths[0] if paths else None)
+            if TIMINGS["linger_ms"]:
+                await page.wait_for_timeout(TIMINGS["linger_ms"])
+            return {"result": result, "paths": paths, "cached": False}
+        except Exception as e:
+            log.error(f"[ERROR] Exception occurred: {e}")
+            if raise_errors:
+                raise
+        finally:
+            if blocking_stats:
+                log.info(f"[*] {format_blocking_stats(blocking_stats)}")
+            log.info("[*] Closing browser...")
+            try:
+                if REPLAY["record_dir"] and context is not browser:
+                    # The HAR is only written when its context closes.
+                    await context.close()
+                await browser.close()
+            except Exception as e:
+                log.error(f"[ERROR] Failed to close browser: {e}")
+
+def read_prompts_file(path):
+    prompts = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                prompts.append(line)
+    return prompts
+
+async def replace_page(context, page):
+    try:
+        await page.close()
+    except Exception:
+        pass
+    return await context.new_page()
+
+def make_scheduler(concurrency, config=SCHEDULE):
+    policy = RETRY_POLICY
+    if not config["retries"]:
+        policy = {phase: {**rule, "attempts": 1} for phase, rule in RETRY_POLICY.items()}
+    breaker = CircuitBreaker(config["breaker_threshold"], config["breaker_window"], config["breaker_min_samples"],
+                             config["breaker_cooldown"])
+    return Scheduler(config["rate_per_minute"], config["burst"], concurrency, config["min_concurrency"], policy, breaker,
+                     config["adaptive"])
+
+async def run_batch(prompts, headless, concurrency=3, prompt_timeout=900, capture="dom", block_resources=False,
+                    cache=None, refresh=False, refstore=None, assets=None):
+    """Runs prompts over one shared browser with a pool of `concurrency` contexts, paced, retried
+    and throttled as SCHEDULE says."""
+    exporter = ExportSession(OUTPUT["formats"], OUTPUT["output_dir"], OUTPUT["export_workers"])
+    try:
+        return await _run_batch(prompts, headless, concurrency, prompt_timeout, capture, block_resources, cache,
+                                refresh, refstore, exporter, assets)
+    finally:
+        exporter.close()
+
+async def _run_batch(prompts, headless, concurrency, prompt_timeout, capture, block_resources, cache, refresh, refstore,
+                     exporter, assets):
+    summary = {"succeeded": [], "failed": []}
+    if cache and not refresh:
+        misses = []
+        for prompt_text in prompts:
+            filename = save_cached_result(cache, prompt_text, exporter, assets)
+            if filename:
+                summary["succeeded"].append((prompt_text, filename))
+            else:
+                misses.append(prompt_text)
+        log.info(f"[*] {cache.format_stats()}")
+        prompts = misses
+    if not prompts:
+        return summary
+    concurrency = max(1, min(concurrency, len(prompts)))
+    from playwright.async_api import async_playwright
+
+    async with async_playwright() as p:
+        log.info(f"[*] Launching browser for {len(prompts)} prompts ({concurrency} concurrent pages)...")
+        try:
+            browser = await launch_browser(p, headless)
+        except Exception as e:
+            log.error(f"[ERROR] Failed to launch browser: {e}")
+            summary["failed"] = [(prompt, f"browser launch failed: {e}") for prompt in prompts]
+            return summary
+        pool = asyncio.Queue()
+        blocking_stats = []
+        start_time = time.time()
+        scheduler = make_scheduler(concurrency)
+
+        async def attempt(prompt_text):
+            context, page = await pool.get()
+            try:
+                result, paths = await asyncio.wait_for(run_search(page, prompt_text, capture, cache=cache, refstore=refstore,
+                                                                  exporter=exporter, assets=assets,
+                                                                  fail_fast=SCHEDULE["retries"]),
+                                                       timeout=prompt_timeout)
+            except asyncio.TimeoutError:
+                page = await replace_page(context, page)
+                raise PhaseError("wait", f"timed out after {prompt_timeout}s")
+            except Exception:
+                page = await replace_page(context, page)
+                raise
+            finally:
+                pool.put_nowait((context, page))
+            if not result["html"]:
+                raise PhaseError("wait", "no answer content")
+            if not paths:
+                raise PhaseError("parse", "no document produced")
+            return paths[0]
+
+        async def run_one(prompt_text):
+            try:
+                filename = await scheduler.run(prompt_text, attempt)
+                summary["succeeded"].append((prompt_text, filename))
+                incr("prompts_succeeded")
+            except Exception as e:
+                log.error(f"[ERROR] Prompt failed: '{prompt_text}': {e}")
+                summary["failed"].append((prompt_text, str(e)))
+                incr("prompts_failed")
+
+        try:
+            contexts = []
+            for _ in range(concurrency):
+                context = await open_context(browser)
+                if block_resources and context not in contexts:
+                    blocking_stats.append(await install_request_blocking(context))
+                contexts.append(context)
+                pool.put_nowait((context, await context.new_page()))
+            await asyncio.gather(*(run_one(prompt) for prompt in prompts))
+            if summary["succeeded"]:
+                await save_storage_state(contexts[0])
+        except Exception as e:
+            log.error(f"[ERROR] Batch aborted: {e}")
+        finally:
+            log.info("[*] Closing browser...")
+            try:
+                await browser.close()
+            except Exception as e:
+                log.error(f"[ERROR] Failed to close browser: {e}")
+        elapsed = time.time() - start_time
+        log.info(f"[✓] Batch finished in {elapsed:.1f}s: {len(summary['succeeded'])} succeeded, {len(summary['failed'])} failed.")
+        for prompt_text, error in summary["failed"]:
+            log.info(f"    [-] '{prompt_text}': {error}")
+        log.info(f"[*] {scheduler.format_stats()}")
+        summary["scheduler"] = scheduler.stats
+        if blocking_stats:
+            summary["blocking"] = merge_blocking_stats(blocking_stats)
+            log.info(f"[*] {format_blocking_stats(summary['blocking'])}")
+        return summary
+
+def reparse_checkpoints(checkpoints, refstore=None, assets=None):
+    """Rebuilds the outputs of checkpointed runs from their saved snapshots, without a browser
+    (images missing from the asset store are downloaded directly)."""
+    exporter = ExportSession(OUTPUT["formats"], OUTPUT["output_dir"])
+    summary = {"succeeded": [], "failed": []}
+    try:
+        for checkpoint in checkpoints:
+            state = checkpoint.load()
+            prompt_text = state["prompt"]
+            with prompt_scope(prompt_text), span("reparse"):
+                try:
+                    html_content = checkpoint.read_snapshot()
+                except OSError as e:
+                    log.error(f"[ERROR] Cannot read snapshot for '{prompt_text}': {e}")
+                    summary["failed"].append((prompt_text, str(e)))
+                    continue
+                references_dict = dict(state["references"])
+                missing = checkpoint.missing_references()
+                if refstore and missing:
+                    references_dict.update(resolve_known_references(refstore, html_content, missing))
+                    record_checkpoint(checkpoint, "update", references=references_dict)
+                log.info(f"[*] Re-parsing '{prompt_text}' from {checkpoint.run_dir} "
+                         f"({len(references_dict)}/{len(state['cited_numbers'])} references).")
+                result = {"html": html_content, "cited_numbers": state["cited_numbers"], "references_dict": references_dict}
+                if assets:
+                    with span("parse"):
+                        result["elements"] = extract_elements(html_content, SELECTORS["content_block"],
+                                                              OUTPUT["parser_backend"])
+                    try:
+                        asyncio.run(fetch_images(result["elements"], assets, None, IMAGES["max_parallel"],
+                                                 IMAGES["per_host"], IMAGES["timeout"], max_width=IMAGES["max_width"]))
+                    except Exception as e:
+                        log.warning(f"[WARNING] Image download failed: {e}")
+                filename = save_result(result, prompt_text, exporter)
+                if filename:
+                    record_checkpoint(checkpoint, "update", stage="exported", outputs=[filename])
+                    summary["succeeded"].append((prompt_text, filename))
+                else:
+                    summary["failed"].append((prompt_text, "no document produced"))
+    finally:
+        exporter.close()
+    log.info(f"[✓] Re-parsed {len(summary['succeeded'])} runs, {len(summary['failed'])} failed.")
+    return summary
+
+async def harvest_missing_references(checkpoints, headless, refstore=None):
+    """Re-opens the saved answer pages only to scrape the cited references still missing."""
+    pending = [c for c in checkpoints if c.missing_references() and c.load().get("url")]
+    if not pending:
+        log.info("[*] No checkpointed run is missing references.")
+        return
+    from playwright.async_api import async_playwright
+
+    async with async_playwright() as p:
+        log.info(f"[*] Launching browser to harvest missing references for {len(pending)} runs...")
+        try:
+            browser = await launch_browser(p, headless)
+            context = await open_context(browser)
+            page = await context.new_page()
+        except Exception as e:
+            log.error(f"[ERROR] Failed to launch browser: {e}")
+            return
+        try:
+            for checkpoint in pending:
+                state = checkpoint.load()
+                missing = checkpoint.missing_references()
+                with prompt_scope(state["prompt"]):
+                    log.info(f"[*] Harvesting {len(missing)} missing references for '{state['prompt']}'...")
+                    try:
+                        with span("goto"):
+                            await page.goto(state["url"], timeout=60000, wait_until="domcontentloaded")
+                        await install_modal_handler(page)
+                        await page.wait_for_selector(", ".join(SELECTORS["content_block"]),
+                                                     timeout=TIMINGS["post_reload_timeout"] * 1000)
+                        await wait_for_quiescence(page, TIMINGS["post_reload_idle_ms"], TIMINGS["post_reload_timeout"])
+                    except Exception as e:
+                        log.error(f"[ERROR] Could not reopen {state['url']}: {e}")
+                        continue
+
+                    def checkpoint_references(found):
+                        record_checkpoint(checkpoint, "update", references={**state["references"], **found})
+
+                    found = await extract_cited_references(page, missing, refstore, checkpoint_references)
+                    record_checkpoint(checkpoint, "update", references={**state["references"], **found})
+        finally:
+            log.info("[*] Closing browser...")
+            try:
+                await browser.close()
+            except Exception as e:
+                log.error(f"[ERROR] Failed to close browser: {e}")
+
+def build_parser(prog=None):
+    parser = argparse.ArgumentParser(prog=prog, description="Run a search on Bohrium AI and save the results.")
+    parser.add_argument("prompt", type=str, nargs="?", help="The search prompt to use.")
+    parser.add_argument("--headless", action="store_true", help="Run the browser in headless mode.")
+    parser.add_argument("--prompts-file", type=str, help="Run every prompt in this file (one per line) in batch mode.")
+    parser.add_argument("--concurrency", type=int, default=3, help="Number of pages to run concurrently in batch mode.")
+    parser.add_argument("--timeout", type=int, default=900, help="Per-prompt timeout in seconds in batch mode.")
+    parser.add_argument("--rate", type=float, default=SCHEDULE["rate_per_minute"],
+                        help="Average queries submitted per minute in batch mode (0: unpaced).")
+    parser.add_argument("--burst", type=int, default=SCHEDULE["burst"], help="Queries that may be submitted at once under --rate.")
+    parser.add_argument("--fixed-concurrency", action="store_true",
+                        help="Keep --concurrency pages busy instead of backing off when queries fail or slow down.")
+    parser.add_argument("--no-retry", action="store_true", help="Do not retry failed queries in batch mode.")
+    parser.add_argument("--breaker-cooldown", type=float, default=SCHEDULE["breaker_cooldown"],
+                        help="Seconds every page pauses when most recent queries failed (doubles while the site keeps failing).")
+    parser.add_argument("--capture", choices=["dom", "network"], default="dom",
+                        help="Read the answer from the rendered page (dom) or from its network stream (network), falling back to the DOM.")
+    parser.add_argument("--block-resources", action="store_true",
+                        help="Abort image, font, media and analytics requests (see BLOCKING).")
+    parser.add_argument("--no-cache", action="store_true", help="Neither read nor write the result cache.")
+    parser.add_argument("--refresh", action="store_true", help="Ignore cached results but store the new ones.")
+    parser.add_argument("--cache-path", type=str, default=DEFAULT_CACHE_PATH, help="SQLite file for the result cache.")
+    parser.add_argument("--cache-ttl", type=float, default=DEFAULT_TTL / 3600, help="Hours a cached result stays valid.")
+    parser.add_argument("--cache-max-mb", type=float, default=DEFAULT_MAX_BYTES / 2**20,
+                        help="Total cache size before least recently used results are evicted.")
+    parser.add_argument("--no-refstore", action="store_true", help="Do not reuse or record reference metadata across runs.")
+    parser.add_argument("--refstore-path", type=str, default=DEFAULT_REFSTORE_PATH, help="SQLite file for the reference store.")
+    parser.add_argument("--parser", choices=["auto"] + BACKENDS, default="auto",
+                        help="HTML parser backend used to extract the answer (auto picks the fastest installed).")
+    parser.add_argument("--format", choices=FORMATS, action="append",
+                        help="Output format; repeat for several (default: docx). jsonl and parquet collect the whole run in one file.")
+    parser.add_argument("--output-dir", type=str, default=".", help="Directory the output files are written to.")
+    parser.add_argument("--export-workers", type=int, default=0,
+                        help="Processes that parse and build documents in batch mode, keeping the browser loop responsive (0: none).")
+    parser.add_argument("--storage-state", type=str,
+                        help="Load cookies and localStorage from this file if it exists and save them back after the run.")
+    parser.add_argument("--user-data-dir", type=str, help="Run with a persistent browser profile in this directory.")
+    parser.add_argument("--runs-dir", type=str, default=DEFAULT_RUNS_DIR, help="Directory for per-prompt checkpoints.")
+    parser.add_argument("--no-checkpoint", action="store_true", help="Do not checkpoint snapshots and references.")
+    parser.add_argument("--resume", action="store_true",
+                        help="Rebuild outputs from checkpoints without a browser: the given prompts, or every run in "
+                             "--runs-dir that was not exported yet.")
+    parser.add_argument("--reparse", action="store_true",
+                        help="Like --resume, but also rebuild runs whose outputs were already exported.")
+    parser.add_argument("--prune-runs", type=float, metavar="DAYS",
+                        help="Delete checkpointed runs not updated for DAYS days (on its own or before a run).")
+    parser.add_argument("--harvest-missing", action="store_true",
+                        help="With --resume, first reopen the saved pages to scrape only the references still missing.")
+    parser.add_argument("--fetch-images", action="store_true",
+                        help="Download the answer's images into the asset store and embed them in docx/markdown output.")
+    parser.add_argument("--assets-dir", type=str, default=DEFAULT_ASSET_DIR, help="Directory of the content-addressed image store.")
+    parser.add_argument("--image-parallel", type=int, default=IMAGES["max_parallel"], help="Concurrent image downloads.")
+    parser.add_argument("--record", type=str, metavar="DIR",
+                        help="Save this run's network traffic (HAR with bodies) and final DOM to DIR for --replay.")
+    parser.add_argument("--replay", type=str, metavar="DIR",
+                        help="Run offline against a recording: requests are served from its HAR, the prompt and site URL come from it.")
+    parser.add_argument("--replay-speed", type=float, default=20,
+                        help="With --replay, divide idle windows and pauses by this factor.")
+    parser.add_argument("--selector-cache", type=str, default=DEFAULT_SELECTOR_CACHE_PATH,
+                        help="JSON file remembering which fallback selectors match each site build ('' keeps them in memory only).")
+    parser.add_argument("--log-level", choices=LOG_LEVELS, default="INFO", help="Console verbosity (DEBUG lists every inserted element).")
+    parser.add_argument("--metrics-log", type=str, help="Append JSON metric lines (spans and a run summary) to this file, or '-' for stderr.")
+    parser.add_argument("--metrics-textfile", type=str, help="Write the run's metrics in Prometheus text format to this file.")
+    return parser
+
+def main(argv=None, prog=None):
+    global BOHRIUM_URL
+    parser = build_parser(prog)
+    args = parser.parse_args(argv)
+    args.resume = args.resume or args.reparse
+    metrics.setup_logging(args.log_level, args.metrics_log)
+    OUTPUT["parser_backend"] = args.parser
+    OUTPUT["formats"] = args.format or ["docx"]
+    OUTPUT["output_dir"] = args.output_dir
+    OUTPUT["export_workers"] = args.export_workers
+    RESOLVER.path = args.selector_cache or None
+    SESSION["storage_state"] = args.storage_state
+    SESSION["user_data_dir"] = args.user_data_dir
+    OUTPUT["runs_dir"] = None if args.no_checkpoint else args.runs_dir
+    IMAGES["dir"] = args.assets_dir
+    IMAGES["max_parallel"] = args.image_parallel
+    SCHEDULE["rate_per_minute"] = args.rate
+    SCHEDULE["burst"] = args.burst
+    SCHEDULE["adaptive"] = not args.fixed_concurrency
+    SCHEDULE["retries"] = not args.no_retry
+    SCHEDULE["breaker_cooldown"] = args.breaker_cooldown
+    if args.replay:
+        try:
+            recorded = recording.load_meta(args.replay)
+        except (OSError, ValueError) as e:
+            parser.error(f"cannot read recording in {args.replay}: {e}")
+        if args.prompts_file or args.resume or args.record:
+            parser.error("--replay runs the single recorded prompt")
+        args.prompt = args.prompt or recorded["prompt"]
+        # A cache hit or a stored reference would skip the traffic being replayed.
+        args.no_cache = args.no_refstore = True
+        BOHRIUM_URL = recorded["site_url"]
+        REPLAY["replay_dir"] = args.replay
+        recording.compress_timings(TIMINGS, args.replay_speed)
+        log.info(f"[*] Replaying '{args.prompt}' from {args.replay} at {args.replay_speed:g}x.")
+    if args.record:
+        if args.prompts_file or args.resume:
+            parser.error("--record saves a single-prompt run")
+        if args.user_data_dir:
+            parser.error("--record needs a fresh context, so it cannot be combined with --user-data-dir")
+        REPLAY["record_dir"] = args.record
+    if args.prune_runs is not None:
+        removed = prune_checkpoints(args.runs_dir, args.prune_runs * 86400)
+        log.info(f"[*] Pruned {removed} checkpointed runs older than {args.prune_runs:g} days from {args.runs_dir}.")
+        if not args.prompt and not args.prompts_file and not args.resume:
+            return
+    if not args.prompt and not args.prompts_file and not args.resume:
+        parser.error("either a prompt or --prompts-file is required")
+    if args.resume and args.no_checkpoint:
+        parser.error("--resume reads checkpoints, so it cannot be combined with --no-checkpoint")
+    cache = None
+    refstore = None
+    assets = None
+    try:
+        if not args.no_cache:
+            cache = ResultCache(args.cache_path, ttl=args.cache_ttl * 3600, max_bytes=int(args.cache_max_mb * 2**20))
+        if not args.no_refstore:
+            refstore = ReferenceStore(args.refstore_path)
+        if args.fetch_images:
+            assets = AssetStore(IMAGES["dir"])
+        if args.resume:
+            prompts = read_prompts_file(args.prompts_file) if args.prompts_file else []
+            if args.prompt:
+                prompts.insert(0, args.prompt)
+            checkpoints = find_checkpoints(args.runs_dir, prompts)
+            log.info(f"[*] Found {len(checkpoints)} checkpointed runs in {args.runs_dir}.")
+            if not prompts and not args.reparse:
+                pending = [checkpoint for checkpoint in checkpoints if checkpoint.load().get("stage") != "exported"]
+                if len(pending) < len(checkpoints):
+                    log.info(f"[*] Skipping {len(checkpoints) - len(pending)} runs already exported (--reparse rebuilds them).")
+                checkpoints = pending
+            if args.harvest_missing:
+                asyncio.run(harvest_missing_references(checkpoints, args.headless, refstore))
+            reparse_checkpoints(checkpoints, refstore, assets)
+        elif args.prompts_file:
+            prompts = read_prompts_file(args.prompts_file)
+            if args.prompt:
+                prompts.insert(0, args.prompt)
+            asyncio.run(run_batch(prompts, args.headless, args.concurrency, args.timeout, args.capture,
+                                  args.block_resources, cache, args.refresh, refstore, assets))
+        else:
+            asyncio.run(run_bohrium_search(args.prompt, args.headless, args.capture, args.block_resources,
+                                           cache, args.refresh, refstore, assets))
+        if cache:
+            log.info(f"[*] {cache.format_stats()}")
+        if refstore:
+            log.info(f"[*] {refstore.format_stats()}")
+        if assets:
+            log.info(f"[*] {assets.format_stats()}")
+        log.info(f"[*] {metrics.format_summary()}")
+    except Exception as e:
+        log.error(f"[ERROR] An error occurred while running the script: {e}")
+    finally:
+        metrics.finish_run(args.metrics_textfile)
+        if cache:
+            cache.close()
+        if refstore:
+            refstore.close()
+        if assets:
+            assets.close()
+
+if __name__ == "__main__":
+    main()
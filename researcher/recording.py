@@ -0,0 +1,48 @@
+import json
+import os
+import time
+from researcher.checkpoint import atomic_write
+from researcher.metrics import log
+
+HAR_FILE = "session.har"
+DOM_FILE = "dom.html"
+META_FILE = "recording.json"
+
+# Waits divided by the replay speed. A recording answers as fast as it is read,
+# so only the idle windows and pauses matter; timeouts are left alone.
+COMPRESSIBLE_TIMINGS = ("idle_ms", "slice_ms", "post_reload_idle_ms", "reference_settle_ms",
+                        "reference_max_settle_ms", "linger_ms")
+
+def context_options(record_dir):
+    """new_context() options that write the session's traffic, bodies included, to record_dir."""
+    os.makedirs(record_dir, exist_ok=True)
+    return {"record_har_path": os.path.join(record_dir, HAR_FILE), "record_har_content": "embed",
+            "record_har_mode": "full"}
+
+async def start_replay(context, replay_dir):
+    """Serves every request of the context from the recording; requests it lacks are aborted."""
+    await context.route_from_har(os.path.join(replay_dir, HAR_FILE), not_found="abort")
+
+def load_meta(replay_dir):
+    with open(os.path.join(replay_dir, META_FILE), encoding="utf-8") as f:
+        return json.load(f)
+
+async def save_dom(page, record_dir, prompt_text, site_url, timings, output=None):
+    """Stores the final page DOM and what is needed to replay the session (the HAR is written on context close)."""
+    try:
+        atomic_write(os.path.join(record_dir, DOM_FILE), await page.content())
+        atomic_write(os.path.join(record_dir, META_FILE), json.dumps({
+            "prompt": prompt_text,
+            "site_url": site_url,
+            "page_url": page.url,
+            "timings": dict(timings),
+            "output": output,
+            "recorded_at": time.time(),
+        }, ensure_ascii=False, indent=1))
+        log.info(f"[*] Recorded session to {record_dir}")
+    except Exception as e:
+        log.warning(f"[WARNING] Failed to save the recorded DOM: {e}")
+
+def compress_timings(timings, speed):
+    for key in COMPRESSIBLE_TIMINGS:
+        timings[key] = max(1, int(timings[key] / speed))
@@ -0,0 +1,108 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import time
+from researcher.extraction import get_text, iter_descendants, parse_html
+
+DEFAULT_REFSTORE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "researcher-1", "references.sqlite3")
+
+DOI_PATTERN = re.compile(r'10\.\d{4,9}/[^\s"<>\]]+')
+
+def find_doi(text):
+    match = DOI_PATTERN.search(text or "")
+    return match.group(0).rstrip(".,;)").lower() if match else ""
+
+def _fold(text):
+    return " ".join(re.sub(r"[^\w\s]", " ", (text or "").casefold()).split())
+
+def reference_identity(ref):
+    """Stable key for a reference: its DOI when known, else a hash of title, journal and date."""
+    doi = find_doi(ref.get("doi", ""))
+    if doi:
+        return f"doi:{doi}"
+    if not ref.get("title"):
+        return None
+    digest = hashlib.sha1("|".join(_fold(ref.get(f, "")) for f in ("title", "journal", "date")).encode("utf-8"))
+    return f"sha1:{digest.hexdigest()}"
+
+def citation_identities(html_content, backend="auto"):
+    """Maps cited numbers to identities using DOIs attached to the [n] markers in the answer:
+    on the marker's own element or on the link around it."""
+    identities = {}
+    if "10." not in html_content:
+        return identities
+    for node in iter_descendants(parse_html(html_content, backend)):
+        doi = find_doi(" ".join(node.attrs.values()))
+        if not doi:
+            continue
+        markers = [node] if node.tag != "a" else [node] + list(iter_descendants(node))
+        for marker in markers:
+            match = re.fullmatch(r"\[(\d+)\]", get_text(marker))
+            if match:
+                identities.setdefault(match.group(1), f"doi:{doi}")
+                break
+    return identities
+
+class ReferenceStore:
+    """SQLite store of reference metadata shared across runs."""
+
+    def __init__(self, path=DEFAULT_REFSTORE_PATH):
+        self.path = path
+        self.stats = {"resolved": 0, "upserted": 0}
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.db = sqlite3.connect(path)
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS refs (
+                identity TEXT PRIMARY KEY,
+                doi TEXT NOT NULL,
+                title TEXT NOT NULL,
+                authors TEXT NOT NULL,
+                date TEXT NOT NULL,
+                journal TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            )""")
+        self.db.commit()
+
+    def lookup(self, identities):
+        identities = [i for i in set(identities) if i]
+        found = {}
+        for start in range(0, len(identities), 500):
+            chunk = identities[start:start + 500]
+            rows = self.db.execute(
+                f"SELECT identity, doi, title, authors, date, journal FROM refs WHERE identity IN ({','.join('?' * len(chunk))})",
+                chunk)
+            for identity, doi, title, authors, date, journal in rows:
+                found[identity] = {"doi": doi, "title": title, "authors": json.loads(authors), "date": date, "journal": journal}
+        return found
+
+    def resolve(self, number_identities):
+        """Returns {number: reference} for the numbers whose identity is already stored."""
+        records = self.lookup(number_identities.values())
+        resolved = {num: records[identity] for num, identity in number_identities.items() if identity in records}
+        self.stats["resolved"] += len(resolved)
+        return resolved
+
+    def upsert_many(self, refs):
+        rows = []
+        for ref in refs:
+            identity = reference_identity(ref)
+            if identity:
+                rows.append((identity, find_doi(ref.get("doi", "")), ref.get("title", ""), json.dumps(ref.get("authors", [])),
+                             ref.get("date", ""), ref.get("journal", ""), time.time()))
+        self.db.executemany("""
+            INSERT INTO refs VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(identity) DO UPDATE SET
+                doi = excluded.doi, title = excluded.title, authors = excluded.authors,
+                date = excluded.date, journal = excluded.journal, updated_at = excluded.updated_at""", rows)
+        self.db.commit()
+        self.stats["upserted"] += len(rows)
+
+    def format_stats(self):
+        return f"Reference store: {self.stats['resolved']} resolved without scraping, {self.stats['upserted']} upserted."
+
+    def close(self):
+        self.db.close()
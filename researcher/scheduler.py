@@ -0,0 +1,283 @@
+import asyncio
+import collections
+import contextlib
+import random
+import time
+from researcher.metrics import emit, incr, log
+
+PHASES = ("navigate", "submit", "wait", "references", "parse")
+
+# Per failure phase: attempts in total, and the backoff before retry n, drawn
+# uniformly from [0, min(cap, base * 2 ** (n - 1))] seconds ("full jitter", so
+# queries that failed together do not come back together). A parse failure is
+# the same on every attempt, so it is not retried.
+RETRY_POLICY = {
+    "navigate": {"attempts": 4, "base": 5, "cap": 120},
+    "submit": {"attempts": 3, "base": 5, "cap": 60},
+    "wait": {"attempts": 3, "base": 20, "cap": 300},
+    "references": {"attempts": 2, "base": 10, "cap": 60},
+    "parse": {"attempts": 1, "base": 0, "cap": 0},
+}
+
+class PhaseError(Exception):
+    """A query failed in one of PHASES. retry_after is the delay the site asked for, if any."""
+
+    def __init__(self, phase, cause, retry_after=None):
+        super().__init__(f"{phase}: {cause}")
+        self.phase = phase
+        self.cause = cause
+        self.retry_after = retry_after
+
+class SiteError(Exception):
+    """The site answered with an error status (429 and 5xx mean it is throttling or overloaded)."""
+
+    def __init__(self, status, retry_after=None):
+        super().__init__(f"HTTP {status}")
+        self.status = status
+        self.retry_after = retry_after
+
+def parse_retry_after(value):
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
+
+@contextlib.contextmanager
+def failure_phase(phase):
+    """Re-raises anything that fails inside the block as a PhaseError of `phase`."""
+    try:
+        yield
+    except PhaseError:
+        raise
+    except Exception as e:
+        raise PhaseError(phase, e, getattr(e, "retry_after", None)) from e
+
+def backoff_delay(phase, attempt, policy=RETRY_POLICY, retry_after=None):
+    """Seconds to wait before attempt + 1 after `attempt` failed in `phase`."""
+    rule = policy[phase]
+    delay = random.uniform(0, min(rule["cap"], rule["base"] * 2 ** (attempt - 1)))
+    return max(delay, retry_after or 0)
+
+class TokenBucket:
+    """Paces submissions to `rate` per minute on average, letting up to `burst` through at once."""
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate / 60
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        if not self.rate:
+            return
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+class CircuitBreaker:
+    """Opens when at least `threshold` of the last `window` outcomes (and min_samples of them)
+    are failures. While open every worker waits; after `cooldown` seconds a single query
+    goes through, closing the circuit if it succeeds and reopening it for twice as long
+    (up to max_cooldown) if it fails."""
+
+    def __init__(self, threshold=0.5, window=20, min_samples=6, cooldown=60, max_cooldown=900):
+        self.threshold = threshold
+        self.min_samples = min_samples
+        self.base_cooldown = cooldown
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.outcomes = collections.deque(maxlen=window)
+        self.state = "closed"
+        self.opened_at = 0.0
+        self.probing = False
+        self.opens = 0
+        self.changed = asyncio.Event()
+
+    async def wait(self):
+        """Returns once this query may go ahead; True when it is the half-open probe."""
+        while self.state != "closed":
+            remaining = self.opened_at + self.cooldown - time.monotonic()
+            if remaining <= 0 and not self.probing:
+                self.probing = True
+                self.state = "half-open"
+                log.info("[*] Circuit half-open: sending one probe query.")
+                return True
+            self.changed.clear()
+            try:
+                await asyncio.wait_for(self.changed.wait(), timeout=max(0.05, remaining) if remaining > 0 else None)
+            except asyncio.TimeoutError:
+                pass
+        return False
+
+    def record(self, ok, probe=False):
+        if probe:
+            self.probing = False
+            if ok:
+                self.state = "closed"
+                self.cooldown = self.base_cooldown
+                self.outcomes.clear()
+                log.info("[✓] Circuit closed: the probe query succeeded.")
+            else:
+                self.cooldown = min(self.max_cooldown, self.cooldown * 2)
+                self._open("the probe query failed")
+            self.changed.set()
+            return
+        self.outcomes.append(ok)
+        failures = self.outcomes.count(False)
+        if (self.state == "closed" and len(self.outcomes) >= self.min_samples
+                and failures >= self.threshold * len(self.outcomes)):
+            self._open(f"{failures} of the last {len(self.outcomes)} queries failed")
+
+    def release_probe(self):
+        """The probe ended without saying anything about the site; let the next query probe."""
+        self.probing = False
+        self.state = "open"
+        self.changed.set()
+
+    def _open(self, reason):
+        self.state = "open"
+        self.opened_at = time.monotonic()
+        self.opens += 1
+        incr("circuit_opens")
+        emit("circuit_open", reason=reason, cooldown=self.cooldown)
+        log.warning(f"[!] Circuit open: {reason}; pausing all workers for {self.cooldown:.0f}s.")
+
+class AdaptiveLimit:
+    """Concurrency limit adjusted by AIMD: +1 after a full window of fast successes at the
+    current limit, halved on a failure or a query slower than slow_factor times the fastest
+    typical latency seen. Decreases are spaced by the latency of a query, so failures of
+    queries that were already running count once."""
+
+    def __init__(self, initial, minimum=1, maximum=None, slow_factor=2.0):
+        self.maximum = max(1, maximum or initial)
+        self.minimum = max(1, min(minimum, self.maximum))
+        self.limit = float(max(self.minimum, min(initial, self.maximum)))
+        self.slow_factor = slow_factor
+        self.active = 0
+        self.latency = None
+        self.baseline = None
+        self.last_decrease = 0.0
+        self.condition = asyncio.Condition()
+
+    async def acquire(self):
+        async with self.condition:
+            await self.condition.wait_for(lambda: self.active < int(self.limit))
+            self.active += 1
+
+    async def release(self):
+        async with self.condition:
+            self.active -= 1
+            self.condition.notify_all()
+
+    def on_success(self, seconds):
+        # Exponentially weighted latency; the baseline is the lowest it has been.
+        self.latency = seconds if self.latency is None else 0.8 * self.latency + 0.2 * seconds
+        self.baseline = self.latency if self.baseline is None else min(self.baseline, self.latency)
+        if seconds > self.slow_factor * self.baseline:
+            self.decrease(f"latency {seconds:.1f}s vs {self.baseline:.1f}s typical")
+        elif self.limit < self.maximum:
+            self._set(min(self.maximum, self.limit + 1 / int(self.limit)), "increase")
+
+    def on_failure(self):
+        self.decrease("failure")
+
+    def decrease(self, reason):
+        now = time.monotonic()
+        if now - self.last_decrease < (self.latency or 0):
+            return
+        self.last_decrease = now
+        before = int(self.limit)
+        self._set(max(self.minimum, self.limit / 2), "decrease")
+        if int(self.limit) < before:
+            log.info(f"[*] Concurrency {before} -> {int(self.limit)} ({reason}).")
+
+    def _set(self, limit, direction):
+        if int(limit) != int(self.limit):
+            incr(f"concurrency_{direction}s")
+            emit("concurrency", limit=int(limit), direction=direction, latency=self.latency)
+        self.limit = limit
+        if direction == "increase":
+            asyncio.ensure_future(self._wake())
+
+    async def _wake(self):
+        async with self.condition:
+            self.condition.notify_all()
+
+class Scheduler:
+    """Runs queries through the circuit breaker, the adaptive limit (starting at `concurrency`,
+    its ceiling) and the rate limiter, retrying PhaseErrors according to the policy for their phase.
+
+    attempt(prompt_text) runs one query and returns its outcome, raising PhaseError on
+    failure; anything else it raises is not retried.
+    """
+
+    def __init__(self, rate=0, burst=1, concurrency=3, min_concurrency=1, policy=RETRY_POLICY, breaker=None,
+                 adaptive=True):
+        self.bucket = TokenBucket(rate, burst)
+        self.limit = AdaptiveLimit(concurrency, min_concurrency if adaptive else concurrency, concurrency)
+        self.adaptive = adaptive
+        self.policy = policy
+        self.breaker = breaker or CircuitBreaker()
+        self.stats = {"queries": 0, "attempts": 0, "retries": 0, "succeeded": 0, "failed": 0,
+                      "failures_by_phase": {phase: 0 for phase in PHASES}}
+
+    async def run(self, prompt_text, attempt):
+        """Runs the prompt until it succeeds or its phase runs out of attempts; returns the
+        outcome, or raises the last PhaseError."""
+        self.stats["queries"] += 1
+        tries = 0
+        while True:
+            tries += 1
+            probe = await self.breaker.wait()
+            await self.limit.acquire()
+            try:
+                await self.bucket.acquire()
+                self.stats["attempts"] += 1
+                start = time.monotonic()
+                try:
+                    outcome = await attempt(prompt_text)
+                except PhaseError as e:
+                    error = e
+                except BaseException:
+                    if probe:
+                        self.breaker.release_probe()
+                    raise
+                else:
+                    if self.adaptive:
+                        self.limit.on_success(time.monotonic() - start)
+                    self.breaker.record(True, probe)
+                    self.stats["succeeded"] += 1
+                    return outcome
+            finally:
+                await self.limit.release()
+            self.stats["failures_by_phase"][error.phase] += 1
+            incr(f"failures_{error.phase}")
+            # Parse failures are ours, not the site's; they say nothing about its health.
+            if error.phase != "parse":
+                if self.adaptive:
+                    self.limit.on_failure()
+                self.breaker.record(False, probe)
+            elif probe:
+                self.breaker.record(True, probe)
+            if tries >= self.policy[error.phase]["attempts"]:
+                self.stats["failed"] += 1
+                raise error
+            delay = backoff_delay(error.phase, tries, self.policy, error.retry_after)
+            self.stats["retries"] += 1
+            incr("retries")
+            log.warning(f"[!] '{prompt_text}' failed ({error}); retry {tries}/{self.policy[error.phase]['attempts'] - 1} "
+                        f"in {delay:.0f}s.")
+            await asyncio.sleep(delay)
+
+    def format_stats(self):
+        phases = ", ".join(f"{phase}: {count}" for phase, count in self.stats["failures_by_phase"].items() if count)
+        return (f"Scheduler: {self.stats['succeeded']}/{self.stats['queries']} succeeded in {self.stats['attempts']} "
+                f"attempts ({self.stats['retries']} retries; failures by phase: {phases or 'none'}), "
+                f"circuit opened {self.breaker.opens} times, final concurrency {int(self.limit.limit)}.")
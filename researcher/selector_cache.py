@@ -0,0 +1,174 @@
+import json
+import os
+import time
+from researcher.checkpoint import atomic_write
+from researcher.metrics import emit, incr, log, set_info
+
+DEFAULT_SELECTOR_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "researcher-1", "selectors.json")
+
+# Builds remembered in the cache file; the least recently used are dropped first.
+MAX_BUILDS = 8
+
+# Identifies the deployed site build by its host and the URLs of its scripts and
+# stylesheets, which carry content hashes that change with every release.
+BUILD_JS = """
+() => {
+    const assets = [...document.querySelectorAll('script[src], link[rel="stylesheet"][href]')]
+        .map((node) => node.getAttribute('src') || node.getAttribute('href')).sort();
+    const text = location.host + '|' + assets.join('|');
+    let h = 0x811c9dc5;
+    for (let i = 0; i < text.length; i++) h = Math.imul(h ^ text.charCodeAt(i), 0x01000193);
+    return (h >>> 0).toString(16).padStart(8, '0');
+}
+"""
+
+# For each candidate list, finds the outermost nodes the whole list matches (as the
+# snapshot and harvest scripts do) and keeps, in order, only the candidates that
+# match one of those nodes not already matched by an earlier kept candidate. The
+# kept candidates select exactly the same blocks with a shorter combined query.
+PROBE_JS = """
+({roles}) => {
+    const result = {};
+    for (const [role, candidates] of Object.entries(roles)) {
+        const combined = candidates.join(',');
+        const roots = [...document.querySelectorAll(combined)]
+            .filter((node) => !(node.parentElement && node.parentElement.closest(combined)));
+        const covered = new Set();
+        const winners = [];
+        const counts = candidates.map((selector) => {
+            const hits = roots.filter((node) => node.matches(selector));
+            if (hits.some((node) => !covered.has(node))) {
+                winners.push(selector);
+                hits.forEach((node) => covered.add(node));
+            }
+            return hits.length;
+        });
+        result[role] = {winners, counts, roots: roots.length};
+    }
+    return result;
+}
+"""
+
+# Outermost blocks selected by the winners and by the full candidate list.
+ROOT_COUNT_JS = """
+({winners, candidates}) => {
+    const roots = (selector) => [...document.querySelectorAll(selector)]
+        .filter((node) => !(node.parentElement && node.parentElement.closest(selector))).length;
+    return {winners: roots(winners), candidates: roots(candidates)};
+}
+"""
+
+class SelectorResolver:
+    """Narrows fallback selector lists to the candidates that match on the current site build.
+
+    Roles are probed once a page shows their blocks; the winners are used for
+    every later query and remembered per build in a small JSON file, so the
+    next session starts with them. A probe only sees one answer, so callers
+    verify() the winners against the full list; when they select fewer blocks
+    the role is probed again, keeping the earlier winners as well.
+    """
+
+    def __init__(self, selectors, roles, path=DEFAULT_SELECTOR_CACHE_PATH):
+        self.selectors = selectors
+        self.roles = roles
+        self.path = path
+        self.builds = None
+        self.build = None
+        self.winners = {}
+        self.retired = {}
+        self.stats = {"probes": 0, "cache_hits": 0, "misses": 0}
+
+    def _load(self):
+        if self.builds is None:
+            self.builds = {}
+            if self.path and os.path.exists(self.path):
+                try:
+                    with open(self.path, encoding="utf-8") as f:
+                        self.builds = json.load(f)
+                except (OSError, ValueError) as e:
+                    log.warning(f"[WARNING] Ignoring unreadable selector cache {self.path}: {e}")
+        return self.builds
+
+    def _save(self):
+        if not self.path:
+            return
+        builds = self._load()
+        by_use = sorted(builds, key=lambda build: builds[build].get("last_used", 0))
+        for build in by_use[:-MAX_BUILDS]:
+            del builds[build]
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            atomic_write(self.path, json.dumps(builds, indent=1))
+        except OSError as e:
+            log.warning(f"[WARNING] Could not save selector cache: {e}")
+
+    def get(self, role):
+        """The selectors to query for `role`: its winners once known, else every candidate."""
+        return self.winners.get(role) or self.selectors[role]
+
+    def resolved(self, role):
+        return role in self.winners
+
+    async def load_build(self, page):
+        """Picks up the winners cached for the page's site build; call after navigating."""
+        build = await page.evaluate(BUILD_JS)
+        if build == self.build:
+            return
+        self.build = build
+        self.winners = {}
+        self.retired = {}
+        cached = self._load().get(build, {})
+        for role, winners in cached.items():
+            if role in self.roles and winners and all(w in self.selectors[role] for w in winners):
+                self.winners[role] = winners
+                self._record(role, winners)
+        if cached:
+            cached["last_used"] = time.time()
+            self._save()
+        if self.winners:
+            self.stats["cache_hits"] += 1
+            incr("selector_cache_hits")
+            log.info(f"[*] Using cached selectors for site build {build}: {', '.join(self.winners)}.")
+
+    async def ensure(self, page, role):
+        """Returns the winners for `role`, probing the page if they are not known yet."""
+        if role in self.winners:
+            return self.winners[role]
+        result = (await page.evaluate(PROBE_JS, {"roles": {role: self.selectors[role]}}))[role]
+        self.stats["probes"] += 1
+        incr("selector_probes")
+        if not result["winners"]:
+            return self.selectors[role]
+        # Winners found on earlier answers of this build still count.
+        kept = set(result["winners"]) | set(self.retired.pop(role, ()))
+        winners = [selector for selector in self.selectors[role] if selector in kept]
+        self.winners[role] = winners
+        if self.build:
+            self._load().setdefault(self.build, {}).update({role: winners, "last_used": time.time()})
+            self._save()
+        self._record(role, winners)
+        emit("selector_probe", role=role, build=self.build, winners=winners, counts=result["counts"],
+             blocks=result["roots"])
+        log.info(f"[*] {role} resolved to {' | '.join(winners)} ({result['roots']} blocks).")
+        return winners
+
+    async def verify(self, page, role):
+        """Drops the winners when they select fewer blocks than the full candidate list, so the
+        next query uses every candidate and the role is probed again. Returns True if dropped."""
+        if role not in self.winners:
+            return False
+        counts = await page.evaluate(ROOT_COUNT_JS, {"winners": ", ".join(self.winners[role]),
+                                                     "candidates": ", ".join(self.selectors[role])})
+        if counts["winners"] == counts["candidates"]:
+            return False
+        self.retired[role] = self.winners.pop(role)
+        self._load().get(self.build, {}).pop(role, None)
+        self._save()
+        self.stats["misses"] += 1
+        incr("selector_misses")
+        log.warning(f"[!] Cached {role} selectors match {counts['winners']} of {counts['candidates']} blocks; "
+                    "probing again.")
+        return True
+
+    def _record(self, role, winners):
+        set_info(f"selector_{role}", selector=" | ".join(winners), build=self.build or "")
@@ -0,0 +1,265 @@
+import asyncio
+import argparse
+import json
+import time
+from researcher.cache import DEFAULT_CACHE_PATH, ResultCache
+from researcher.refstore import DEFAULT_REFSTORE_PATH, ReferenceStore
+from researcher.assets import DEFAULT_ASSET_DIR, AssetStore
+from researcher.exporters import FORMATS, ExportSession
+from researcher import metrics
+from researcher.metrics import LOG_LEVELS, log, span
+from researcher.selector_cache import DEFAULT_SELECTOR_CACHE_PATH
+from researcher.progress import (RESOLVER, SESSION, export_cached_result, format_blocking_stats, install_request_blocking,
+                      merge_blocking_stats, open_context, open_search_page, search_on_page)
+
+class WarmPagePool:
+    """Keeps `size` pages navigated to Bohrium with the login modal dismissed."""
+
+    def __init__(self, browser, size, max_idle=600, block_resources=False):
+        self.browser = browser
+        self.size = size
+        self.max_idle = max_idle
+        self.block_resources = block_resources
+        # Stats of the contexts still open, folded into blocking_totals when they close.
+        self.blocking_stats = {}
+        self.blocking_totals = merge_blocking_stats([])
+        self.ready = asyncio.Queue()
+        self.warming = set()
+
+    def start(self):
+        for _ in range(self.size):
+            self._spawn()
+
+    def _spawn(self, delay=0):
+        task = asyncio.ensure_future(self._warm(delay))
+        self.warming.add(task)
+        task.add_done_callback(self.warming.discard)
+
+    async def _warm(self, delay):
+        await asyncio.sleep(delay)
+        context = None
+        try:
+            context = await open_context(self.browser)
+            if self.block_resources:
+                self.blocking_stats[context] = await install_request_blocking(context)
+                context.on("close", self._retire_blocking_stats)
+            page = await context.new_page()
+            with span("warm_page"):
+                await open_search_page(page)
+        except Exception as e:
+            log.warning(f"[WARNING] Failed to warm a page, retrying: {e}")
+            # Always reschedule, or the pool shrinks for good and acquire() waits forever.
+            self._spawn(delay=5)
+            if context:
+                try:
+                    await context.close()
+                except Exception:
+                    pass
+            return
+        self.ready.put_nowait((context, page, time.time()))
+        log.info(f"[*] Warm page ready ({self.ready.qsize()}/{self.size}).")
+
+    async def acquire(self):
+        """Takes a warm page and immediately starts warming its replacement."""
+        while True:
+            context, page, warmed_at = await self.ready.get()
+            self._spawn()
+            if not page.is_closed() and time.time() - warmed_at < self.max_idle:
+                return context, page
+            log.info("[*] Discarding stale warm page.")
+            await context.close()
+
+    async def close(self):
+        for task in list(self.warming):
+            task.cancel()
+        while not self.ready.empty():
+            context, _, _ = self.ready.get_nowait()
+            await context.close()
+
+    def _retire_blocking_stats(self, context):
+        stats = self.blocking_stats.pop(context, None)
+        if stats:
+            self.blocking_totals = merge_blocking_stats([self.blocking_totals, stats])
+
+    def merged_blocking_stats(self):
+        return merge_blocking_stats([self.blocking_totals, *self.blocking_stats.values()])
+
+    def status(self):
+        status = {"ready": self.ready.qsize(), "warming": len(self.warming), "size": self.size}
+        if self.block_resources:
+            status["blocking"] = self.merged_blocking_stats()
+        return status
+
+async def handle_search(pool, limiter, request, cache=None, refstore=None, exporter=None, assets=None):
+    prompt_text = (request.get("prompt") or "").strip()
+    if not prompt_text:
+        return 400, {"error": "missing 'prompt'"}
+    capture = request.get("capture", "dom")
+    if cache and not request.get("refresh"):
+        start_time = time.time()
+        filename = await export_cached_result(cache, prompt_text, exporter, assets)
+        if filename:
+            return 200, {"prompt": prompt_text, "filename": filename, "cached": True,
+                         "elapsed": round(time.time() - start_time, 2)}
+    async with limiter:
+        start_time = time.time()
+        context, page = await pool.acquire()
+        log.info(f"[*] Warm page acquired in {time.time() - start_time:.2f}s for '{prompt_text}'.")
+        try:
+            filename = await search_on_page(page, prompt_text, capture, navigate=False, cache=cache, refstore=refstore,
+                                            exporter=exporter, assets=assets)
+        except Exception as e:
+            log.error(f"[ERROR] Search failed for '{prompt_text}': {e}")
+            return 500, {"prompt": prompt_text, "error": str(e)}
+        finally:
+            await context.close()
+    elapsed = round(time.time() - start_time, 2)
+    if not filename:
+        return 500, {"prompt": prompt_text, "error": "no document produced", "elapsed": elapsed}
+    return 200, {"prompt": prompt_text, "filename": filename, "elapsed": elapsed}
+
+async def read_request(reader):
+    request_line = (await reader.readline()).decode("latin-1").strip()
+    if not request_line:
+        return None, None, None
+    method, path, _ = request_line.split(" ", 2)
+    headers = {}
+    while True:
+        line = (await reader.readline()).decode("latin-1").strip()
+        if not line:
+            break
+        name, _, value = line.partition(":")
+        headers[name.strip().lower()] = value.strip()
+    body = b""
+    if int(headers.get("content-length", 0)):
+        body = await reader.readexactly(int(headers["content-length"]))
+    return method, path, body
+
+async def write_response(writer, status, payload):
+    reasons = {200: "OK", 400: "Bad Request", 404: "Not Found", 500: "Internal Server Error"}
+    if isinstance(payload, str):
+        body, content_type = payload.encode("utf-8"), "text/plain; version=0.0.4"
+    else:
+        body, content_type = json.dumps(payload).encode("utf-8"), "application/json"
+    writer.write(f"HTTP/1.1 {status} {reasons.get(status, 'OK')}\r\n"
+                 f"Content-Type: {content_type}\r\nContent-Length: {len(body)}\r\n"
+                 "Connection: close\r\n\r\n".encode("latin-1") + body)
+    await writer.drain()
+    writer.close()
+
+def make_handler(pool, limiter, cache=None, refstore=None, exporter=None, assets=None):
+    async def handle(reader, writer):
+        try:
+            method, path, body = await read_request(reader)
+            if method == "GET" and path == "/health":
+                status, payload = 200, pool.status()
+                if cache:
+                    payload["cache"] = cache.stats
+                if refstore:
+                    payload["refstore"] = refstore.stats
+                if assets:
+                    payload["assets"] = assets.stats
+            elif method == "GET" and path == "/metrics":
+                status, payload = 200, metrics.METRICS.to_prometheus()
+            elif method == "POST" and path == "/search":
+                try:
+                    request = json.loads(body or b"{}")
+                except ValueError:
+                    status, payload = 400, {"error": "body must be JSON"}
+                else:
+                    status, payload = await handle_search(pool, limiter, request, cache, refstore, exporter, assets)
+            elif method is None:
+                writer.close()
+                return
+            else:
+                status, payload = 404, {"error": f"no route for {method} {path}"}
+            await write_response(writer, status, payload)
+        except Exception as e:
+            log.error(f"[ERROR] Failed to handle request: {e}")
+            writer.close()
+    return handle
+
+async def run_service(headless, pool_size, host, port, unix_socket=None, block_resources=False, cache=None,
+                      refstore=None, exporter=None, assets=None):
+    from playwright.async_api import async_playwright
+
+    async with async_playwright() as p:
+        log.info("[*] Launching browser...")
+        browser = await p.chromium.launch(headless=headless)
+        pool = WarmPagePool(browser, pool_size, block_resources=block_resources)
+        pool.start()
+        handler = make_handler(pool, asyncio.Semaphore(pool_size), cache, refstore, exporter, assets)
+        if unix_socket:
+            server = await asyncio.start_unix_server(handler, path=unix_socket)
+            log.info(f"[*] Listening on unix socket {unix_socket}")
+        else:
+            server = await asyncio.start_server(handler, host, port)
+            log.info(f"[*] Listening on http://{host}:{port}")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            if block_resources:
+                log.info(f"[*] {format_blocking_stats(pool.merged_blocking_stats())}")
+            log.info("[*] Closing browser...")
+            await pool.close()
+            await browser.close()
+
+def build_parser(prog=None):
+    parser = argparse.ArgumentParser(prog=prog, description="Keep a warm Bohrium browser and serve searches over a local API.")
+    parser.add_argument("--headless", action="store_true", help="Run the browser in headless mode.")
+    parser.add_argument("--pool-size", type=int, default=2, help="Number of warm pages kept ready (and concurrent searches).")
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="Address to listen on.")
+    parser.add_argument("--port", type=int, default=8765, help="Port to listen on.")
+    parser.add_argument("--unix-socket", type=str, help="Listen on this Unix socket path instead of TCP.")
+    parser.add_argument("--block-resources", action="store_true", help="Abort image, font, media and analytics requests.")
+    parser.add_argument("--no-cache", action="store_true", help="Neither read nor write the result cache.")
+    parser.add_argument("--cache-path", type=str, default=DEFAULT_CACHE_PATH, help="SQLite file for the result cache.")
+    parser.add_argument("--no-refstore", action="store_true", help="Do not reuse or record reference metadata across runs.")
+    parser.add_argument("--refstore-path", type=str, default=DEFAULT_REFSTORE_PATH, help="SQLite file for the reference store.")
+    parser.add_argument("--format", choices=FORMATS, action="append",
+                        help="Output format; repeat for several (default: docx). jsonl and parquet collect every search in one file.")
+    parser.add_argument("--output-dir", type=str, default=".", help="Directory the output files are written to.")
+    parser.add_argument("--export-workers", type=int, default=0,
+                        help="Processes that parse and build documents, keeping the warm pages responsive (0: none).")
+    parser.add_argument("--storage-state", type=str, help="Load cookies and localStorage for every warm page from this file.")
+    parser.add_argument("--fetch-images", action="store_true", help="Download answer images and embed them in docx/markdown output.")
+    parser.add_argument("--assets-dir", type=str, default=DEFAULT_ASSET_DIR, help="Directory of the content-addressed image store.")
+    parser.add_argument("--selector-cache", type=str, default=DEFAULT_SELECTOR_CACHE_PATH,
+                        help="JSON file remembering which fallback selectors match each site build ('' keeps them in memory only).")
+    parser.add_argument("--log-level", choices=LOG_LEVELS, default="INFO", help="Console verbosity.")
+    parser.add_argument("--metrics-log", type=str, help="Append JSON metric lines to this file, or '-' for stderr.")
+    parser.add_argument("--metrics-textfile", type=str, help="Write the Prometheus metrics to this file on shutdown.")
+    return parser
+
+def main(argv=None, prog=None):
+    parser = build_parser(prog)
+    args = parser.parse_args(argv)
+    metrics.setup_logging(args.log_level, args.metrics_log)
+    SESSION["storage_state"] = args.storage_state
+    RESOLVER.path = args.selector_cache or None
+    metrics.install_protocol_counter()
+    cache = None if args.no_cache else ResultCache(args.cache_path)
+    refstore = None if args.no_refstore else ReferenceStore(args.refstore_path)
+    exporter = ExportSession(args.format or ["docx"], args.output_dir, args.export_workers)
+    assets = AssetStore(args.assets_dir) if args.fetch_images else None
+    try:
+        asyncio.run(run_service(args.headless, args.pool_size, args.host, args.port, args.unix_socket,
+                                args.block_resources, cache, refstore, exporter, assets))
+    except KeyboardInterrupt:
+        log.info("[*] Service stopped.")
+    finally:
+        if cache:
+            log.info(f"[*] {cache.format_stats()}")
+            cache.close()
+        if refstore:
+            log.info(f"[*] {refstore.format_stats()}")
+            refstore.close()
+        if assets:
+            log.info(f"[*] {assets.format_stats()}")
+            assets.close()
+        exporter.close()
+        metrics.finish_run(args.metrics_textfile)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import time
+from datetime import datetime
+from researcher.cache import DEFAULT_CACHE_PATH, ResultCache
+from researcher.refstore import DEFAULT_REFSTORE_PATH, ReferenceStore
+from researcher.assets import DEFAULT_ASSET_DIR, AssetStore
+from researcher.exporters import FORMATS
+from researcher.extraction import BACKENDS
+from researcher.jobqueue import DEFAULT_LEASE, DEFAULT_MAX_ATTEMPTS, DEFAULT_QUEUE_PATH, JobQueue, worker_name
+from researcher import metrics
+from researcher.metrics import LOG_LEVELS, METRICS, incr, log, snapshot_delta
+from researcher.progress import IMAGES, OUTPUT, SESSION, read_prompts_file, search_prompt
+from researcher.scheduler import RETRY_POLICY, PhaseError
+
+async def run_job(queue, job, worker, args, cache, refstore, assets):
+    """Runs one claimed job, renewing its lease while the search runs, and records the outcome."""
+    log.info(f"[*] Job {job['id']} (attempt {job['attempts']}/{job['max_attempts']}, priority {job['priority']}): "
+             f"'{job['prompt']}'")
+    before = METRICS.snapshot()
+    search = asyncio.ensure_future(search_prompt(job["prompt"], args.headless, args.capture, args.block_resources,
+                                                 cache, False, refstore, assets, raise_errors=True))
+    lost = False
+    filename, error, retry = None, None, True
+    try:
+        while not search.done():
+            await asyncio.wait({search}, timeout=queue.lease / 3)
+            if not search.done() and not await asyncio.to_thread(queue.heartbeat, job["id"], worker):
+                log.error(f"[ERROR] Lost the lease on job {job['id']}; abandoning it to its new worker.")
+                lost = True
+                search.cancel()
+        outcome = await search
+        if outcome["paths"]:
+            filename = outcome["paths"][0]
+        elif not outcome["result"]["html"]:
+            error = "wait: no answer content"
+        else:
+            error, retry = "parse: no document produced", False
+    except asyncio.CancelledError:
+        if not lost:
+            queue.fail(job["id"], worker, "worker interrupted", snapshot_delta(before, METRICS.snapshot()))
+            raise
+    except PhaseError as e:
+        # The error names its phase ("wait: ..."); failures that would repeat are not retried.
+        error, retry = str(e), RETRY_POLICY[e.phase]["attempts"] > 1
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    if lost:
+        incr("jobs_abandoned")
+        return
+    usage = snapshot_delta(before, METRICS.snapshot())
+    if filename:
+        queue.complete(job["id"], worker, filename, usage)
+        incr("jobs_done")
+        log.info(f"[✓] Job {job['id']} done in {usage['seconds']:.0f}s: {filename}")
+    else:
+        queue.fail(job["id"], worker, error, usage, retry)
+        incr("jobs_failed")
+        log.error(f"[ERROR] Job {job['id']} failed: {error}")
+
+async def work(queue, worker, args, cache, refstore, assets):
+    finished = 0
+    while not args.max_jobs or finished < args.max_jobs:
+        job = queue.claim(worker)
+        if not job:
+            if args.exit_when_empty:
+                log.info("[*] No jobs due; worker exiting.")
+                break
+            await asyncio.sleep(args.poll)
+            continue
+        await run_job(queue, job, worker, args, cache, refstore, assets)
+        finished += 1
+    log.info(f"[*] Worker {worker} finished {finished} jobs.")
+
+def worker_main(args, index=None):
+    """One worker process: configures progress.py from the flags and works the queue."""
+    textfile = args.metrics_textfile
+    if textfile and index is not None:
+        root, ext = os.path.splitext(textfile)
+        textfile = f"{root}.{index}{ext}"
+    metrics.setup_logging(args.log_level, args.metrics_log)
+    OUTPUT["parser_backend"] = args.parser
+    OUTPUT["formats"] = args.format or ["docx"]
+    OUTPUT["output_dir"] = args.output_dir
+    OUTPUT["runs_dir"] = None if args.no_checkpoint else OUTPUT["runs_dir"]
+    SESSION["storage_state"] = args.storage_state
+    IMAGES["dir"] = args.assets_dir
+    queue = JobQueue(args.queue, lease=args.lease)
+    cache = None if args.no_cache else ResultCache(args.cache_path)
+    refstore = None if args.no_refstore else ReferenceStore(args.refstore_path)
+    assets = AssetStore(IMAGES["dir"]) if args.fetch_images else None
+    try:
+        asyncio.run(work(queue, worker_name(), args, cache, refstore, assets))
+    except KeyboardInterrupt:
+        log.info("[*] Worker stopped.")
+    finally:
+        metrics.finish_run(textfile)
+        for store in (queue, cache, refstore, assets):
+            if store:
+                store.close()
+
+def format_age(seconds):
+    if seconds is None:
+        return "-"
+    if seconds < 120:
+        return f"{seconds:.0f}s"
+    if seconds < 7200:
+        return f"{seconds / 60:.0f}m"
+    return f"{seconds / 3600:.1f}h"
+
+def print_status(status):
+    counts = status["counts"]
+    log.info(f"[*] Queue: {counts['queued']} queued, {counts['leased']} running, {counts['done']} done, "
+             f"{counts['failed']} failed (oldest queued {format_age(status['oldest_queued_age'])}).")
+    average = f", {status['avg_seconds']:.0f}s per job" if status["avg_seconds"] else ""
+    log.info(f"[*] Throughput: {status['done_in_window']} jobs in the last {format_age(status['window'])} "
+             f"({status['per_hour']:.1f}/h{average}).")
+    now = time.time()
+    for job in status["workers"]:
+        log.info(f"    [ ] {job['worker']}: '{job['prompt']}' for {format_age(now - job['started_at'])} "
+                 f"(attempt {job['attempts']}, lease {format_age(job['lease_until'] - now)} left)")
+    for job in status["recent_failures"]:
+        log.info(f"    [-] '{job['prompt']}' after {job['attempts']} attempts: {job['error']}")
+
+def build_parser(prog=None):
+    parser = argparse.ArgumentParser(prog=prog, description="Queue prompts and work through them with any number of worker processes.")
+    parser.add_argument("--queue", type=str, default=DEFAULT_QUEUE_PATH,
+                        help="SQLite queue file; hosts may share it only on a filesystem with working locks (see README).")
+    parser.add_argument("--log-level", choices=LOG_LEVELS, default="INFO", help="Console verbosity.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    enqueue = commands.add_parser("enqueue", help="Add prompts to the queue (prompts already queued or done are skipped).")
+    enqueue.add_argument("prompt", type=str, nargs="*", help="Prompts to add.")
+    enqueue.add_argument("--prompts-file", type=str, help="Add every prompt in this file (one per line).")
+    enqueue.add_argument("--priority", type=int, default=0, help="Higher priorities are claimed first.")
+    enqueue.add_argument("--max-attempts", type=int, default=DEFAULT_MAX_ATTEMPTS, help="Attempts before a job is marked failed.")
+
+    work_parser = commands.add_parser("work", help="Claim and run jobs until stopped.")
+    work_parser.add_argument("--processes", type=int, default=1, help="Worker processes to start on this host.")
+    work_parser.add_argument("--lease", type=int, default=DEFAULT_LEASE,
+                             help="Seconds a claim stays valid without a heartbeat (renewed every third of it).")
+    work_parser.add_argument("--poll", type=float, default=5, help="Seconds between checks of an empty queue.")
+    work_parser.add_argument("--max-jobs", type=int, default=0, help="Stop each worker after this many jobs (0: no limit).")
+    work_parser.add_argument("--exit-when-empty", action="store_true", help="Stop once no job is due.")
+    work_parser.add_argument("--headless", action="store_true", help="Run the browser in headless mode.")
+    work_parser.add_argument("--capture", choices=["dom", "network"], default="dom", help="How the answer is read (see progress.py).")
+    work_parser.add_argument("--block-resources", action="store_true", help="Abort image, font, media and analytics requests.")
+    work_parser.add_argument("--parser", choices=["auto"] + BACKENDS, default="auto", help="HTML parser backend.")
+    work_parser.add_argument("--format", choices=FORMATS, action="append", help="Output format; repeat for several (default: docx).")
+    work_parser.add_argument("--output-dir", type=str, default=".", help="Directory the output files are written to.")
+    work_parser.add_argument("--storage-state", type=str, help="Load cookies and localStorage from this file.")
+    work_parser.add_argument("--no-checkpoint", action="store_true", help="Do not checkpoint snapshots and references.")
+    work_parser.add_argument("--no-cache", action="store_true", help="Neither read nor write the result cache.")
+    work_parser.add_argument("--cache-path", type=str, default=DEFAULT_CACHE_PATH, help="SQLite file for the result cache.")
+    work_parser.add_argument("--no-refstore", action="store_true", help="Do not reuse or record reference metadata.")
+    work_parser.add_argument("--refstore-path", type=str, default=DEFAULT_REFSTORE_PATH, help="SQLite file for the reference store.")
+    work_parser.add_argument("--fetch-images", action="store_true", help="Download and embed the answer's images.")
+    work_parser.add_argument("--assets-dir", type=str, default=DEFAULT_ASSET_DIR, help="Directory of the image store.")
+    work_parser.add_argument("--metrics-log", type=str, help="Append JSON metric lines to this file, or '-' for stderr.")
+    work_parser.add_argument("--metrics-textfile", type=str,
+                             help="Write Prometheus metrics here when a worker stops (one file per process with --processes).")
+
+    status_parser = commands.add_parser("status", help="Show queue depth, running jobs and throughput.")
+    status_parser.add_argument("--window", type=float, default=1, help="Hours of history for the throughput figure.")
+    status_parser.add_argument("--json", action="store_true", help="Print the status as JSON.")
+
+    requeue = commands.add_parser("requeue", help="Give failed jobs a fresh set of attempts.")
+    requeue.add_argument("--done", action="store_true", help="Also run finished jobs again.")
+
+    return parser
+
+def main(argv=None, prog=None):
+    parser = build_parser(prog)
+    args = parser.parse_args(argv)
+    metrics.setup_logging(args.log_level)
+    if args.command == "work":
+        if args.processes > 1:
+            context = multiprocessing.get_context("spawn")
+            processes = [context.Process(target=worker_main, args=(args, index)) for index in range(args.processes)]
+            for process in processes:
+                process.start()
+            log.info(f"[*] Started {len(processes)} worker processes on {args.queue}.")
+            try:
+                for process in processes:
+                    process.join()
+            except KeyboardInterrupt:
+                for process in processes:
+                    process.join()
+        else:
+            worker_main(args)
+    else:
+        queue = JobQueue(args.queue)
+        try:
+            if args.command == "enqueue":
+                prompts = read_prompts_file(args.prompts_file) if args.prompts_file else []
+                prompts = args.prompt + prompts
+                if not prompts:
+                    parser.error("enqueue needs prompts or --prompts-file")
+                added = queue.enqueue(prompts, args.priority, args.max_attempts)
+                log.info(f"[✓] Queued {added} prompts ({len(prompts) - added} already in the queue).")
+            elif args.command == "status":
+                status = queue.status(window=args.window * 3600)
+                if args.json:
+                    print(json.dumps(status, indent=2, default=str))
+                else:
+                    log.info(f"[*] {args.queue} at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+                    print_status(status)
+            elif args.command == "requeue":
+                states = ("failed", "done") if args.done else ("failed",)
+                log.info(f"[✓] Requeued {queue.requeue(states)} jobs.")
+        finally:
+            queue.close()
+
+if __name__ == "__main__":
+    main()
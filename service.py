@@ -0,0 +1,5 @@
+# Moved to researcher/service.py; this keeps `python service.py ...` working.
+from researcher.service import main
+
+if __name__ == "__main__":
+    main()
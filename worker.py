@@ -0,0 +1,5 @@
+# Moved to researcher/worker.py; this keeps `python worker.py ...` working.
+from researcher.worker import main
+
+if __name__ == "__main__":
+    main()